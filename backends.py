@@ -0,0 +1,394 @@
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from datetime import time
+
+from instrumentation import count_io, get_logger, span
+
+log = get_logger("backends")
+
+
+@contextmanager
+def excel_transaction(app, enabled=True):
+    """Suspend screen updating and automatic calculation of an Excel app, recalculate once on exit."""
+    if not enabled:
+        yield
+        return
+    screen_updating = app.screen_updating
+    calculation = app.calculation
+    app.screen_updating = False
+    app.calculation = 'manual'
+    try:
+        yield
+    finally:
+        with span("recalc"):
+            count_io("calculate")
+            app.calculate()
+        app.calculation = calculation
+        app.screen_updating = screen_updating
+
+
+def initialize_com():
+    """xlwings can only be used from threads that initialized COM, which is required on Windows only."""
+    try:
+        import pythoncom
+    except ImportError:
+        return
+    pythoncom.CoInitialize()
+
+
+class ExcelSession:
+    """A hidden Excel instance that is kept running and reused across operations.
+
+    Template workbooks stay open between operations, the instance is restarted when the Excel process died.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._books = dict()  # path -> (book, mtime of the file when it was opened)
+
+    def is_alive(self):
+        if self._app is None:
+            return False
+        try:
+            len(self._app.books)
+            return True
+        except Exception:
+            return False
+
+    def start(self):
+        initialize_com()
+        import xlwings as xw
+        self._app = xw.App(visible=False, add_book=False)
+        self._app.display_alerts = False
+        self._books = dict()
+
+    def app(self):
+        initialize_com()
+        if not self.is_alive():
+            if self._app is not None:
+                log.warning("Excel is not responding, restarting")
+            self.shutdown()
+            self.start()
+        return self._app
+
+    def book(self, path):
+        app = self.app()
+        mtime = os.path.getmtime(path)
+        if path in self._books:
+            book, opened_mtime = self._books[path]
+            if opened_mtime == mtime:
+                return book
+            self.release(path)
+        book = app.books.open(path)
+        self._books[path] = (book, mtime)
+        return book
+
+    def release(self, path):
+        book, _ = self._books.pop(path, (None, None))
+        if book is not None:
+            try:
+                book.close()
+            except Exception:
+                pass
+
+    def shutdown(self):
+        if self._app is not None:
+            try:
+                self._app.quit()
+            except Exception:
+                try:
+                    self._app.kill()
+                except Exception:
+                    pass
+        self._app = None
+        self._books = dict()
+
+
+class WorkbookBackend:
+    """Access to the worktime record template.
+
+    Addresses are A1 strings. A single cell reads/writes a scalar, a range ('A1:B2') reads a list of rows
+    and multi-cell writes take a list of rows anchored at the top-left cell of the address.
+    """
+    name = None
+    computes_formulas = False
+
+    def __init__(self, transaction_mode=True, session=None):
+        self.transaction_mode = transaction_mode
+        self.session = session
+
+    def open(self, path):
+        raise NotImplementedError
+
+    def read(self, sheet, address):
+        raise NotImplementedError
+
+    def write(self, sheet, address, values):
+        raise NotImplementedError
+
+    def read_computed(self, sheet, address):
+        raise NotImplementedError
+
+    def save_as(self, path):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """Close without keeping any state around, e.g. after the workbook was modified or saved under another name."""
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+
+class XlwingsBackend(WorkbookBackend):
+    """Drives a real Excel instance through xlwings, formulas are recalculated by Excel.
+
+    With an ExcelSession the instance and the template workbook are reused, otherwise Excel is quit on close.
+    """
+    name = 'excel'
+    computes_formulas = True
+
+    def __init__(self, transaction_mode=True, session=None):
+        super().__init__(transaction_mode, session)
+        self._path = None
+        self._book = None
+
+    def open(self, path):
+        count_io("open")
+        self._path = path
+        if self.session is not None:
+            self._book = self.session.book(path)
+        else:
+            initialize_com()
+            import xlwings as xw
+            self._book = xw.Book(path)
+
+    def read(self, sheet, address):
+        count_io("read")
+        rng = self._book.sheets[sheet].range(address)
+        if ':' in address:
+            return rng.options(ndim=2).value
+        return rng.value
+
+    def write(self, sheet, address, values):
+        count_io("write")
+        self._book.sheets[sheet].range(address).value = values
+
+    def read_computed(self, sheet, address):
+        return self.read(sheet, address)
+
+    def save_as(self, path):
+        count_io("save")
+        self._book.save(path)
+
+    def close(self):
+        if self._book is not None and self.session is None:
+            self._book.app.quit()
+        self._book = None
+
+    def discard(self):
+        if self.session is not None:
+            self.session.release(self._path)
+        self.close()
+
+    def transaction(self):
+        return excel_transaction(self._book.app, self.transaction_mode)
+
+
+class OpenpyxlBackend(WorkbookBackend):
+    """Edits the .xlsx file directly without a spreadsheet application.
+
+    Formulas are not evaluated: read_computed returns the results cached by the application that saved the file last.
+    Written values are converted the way Excel converts values assigned to cells, see excel_value.
+    """
+    name = 'openpyxl'
+    computes_formulas = False
+
+    def __init__(self, transaction_mode=True, session=None):
+        super().__init__(transaction_mode, session)
+        self._path = None
+        self._book = None
+        self._cached = None
+
+    def open(self, path):
+        import openpyxl
+        count_io("open")
+        self._path = path
+        self._book = openpyxl.load_workbook(path)
+        self._cached = None
+
+    @staticmethod
+    def _cells(worksheet, address):
+        if ':' in address:
+            return [[cell.value for cell in row] for row in worksheet[address]]
+        return worksheet[address].value
+
+    def read(self, sheet, address):
+        count_io("read")
+        return self._cells(self._book[sheet], address)
+
+    @staticmethod
+    def _write_cell(cell, value):
+        value = excel_value(value)
+        general = cell.number_format == 'General'
+        cell.value = value
+        if general and isinstance(value, time):
+            # the format Excel gives a time typed into a cell
+            cell.number_format = 'h:mm'
+
+    def write(self, sheet, address, values):
+        count_io("write")
+        worksheet = self._book[sheet]
+        anchor = worksheet[address.split(':')[0]]
+        if not isinstance(values, (list, tuple)):
+            self._write_cell(anchor, values)
+            return
+        for r, row in enumerate(values):
+            for c, value in enumerate(row):
+                self._write_cell(worksheet.cell(row=anchor.row + r, column=anchor.column + c), value)
+
+    def read_computed(self, sheet, address):
+        count_io("read")
+        if self._cached is None:
+            import openpyxl
+            self._cached = openpyxl.load_workbook(self._path, data_only=True, read_only=True)
+        worksheet = self._cached[sheet]
+        if ':' in address:
+            return [list(row) for row in worksheet.iter_rows(*_bounds(address), values_only=True)]
+        return next(worksheet.iter_rows(*_bounds(f'{address}:{address}'), values_only=True))[0]
+
+    def save_as(self, path):
+        count_io("save")
+        self._book.save(path)
+
+    def close(self):
+        if self._cached is not None:
+            self._cached.close()
+        self._book = None
+        self._cached = None
+
+
+class MemoryBackend(WorkbookBackend):
+    """A workbook held in dicts, a stand-in for the template to measure and check generations without a file.
+
+    open starts from a copy of templates[path], a dict of sheet -> {(row, column): value}, or from an empty workbook.
+    Saved workbooks are kept in saved by path. Every call is counted in io, also across runs. Formulas are not
+    evaluated: before read_computed reads, calculate(workbook) is called if given, to compute what the template would.
+    """
+    name = 'memory'
+    computes_formulas = False
+
+    def __init__(self, transaction_mode=True, session=None, templates=None, calculate=None):
+        super().__init__(transaction_mode, session)
+        self.templates = templates if templates is not None else dict()
+        self.calculate = calculate
+        self.saved = dict()
+        self.io = Counter()
+        self._book = None
+
+    def open(self, path):
+        count_io("open")
+        self.io["open"] += 1
+        template = self.templates.get(path, dict())
+        self._book = {sheet: dict(cells) for sheet, cells in template.items()}
+
+    def _cells(self, sheet, address):
+        cells = self._book.get(sheet, dict())
+        if ':' in address:
+            first_row, first_column, last_row, last_column = _cell_range(address)
+            return [[cells.get((row, column)) for column in range(first_column, last_column + 1)]
+                    for row in range(first_row, last_row + 1)]
+        return cells.get(_cell(address))
+
+    def read(self, sheet, address):
+        count_io("read")
+        self.io["read"] += 1
+        return self._cells(sheet, address)
+
+    def write(self, sheet, address, values):
+        count_io("write")
+        self.io["write"] += 1
+        cells = self._book.setdefault(sheet, dict())
+        row, column = _cell(address.split(':')[0])
+        if not isinstance(values, (list, tuple)):
+            cells[(row, column)] = values
+            return
+        for r, values_of_row in enumerate(values):
+            for c, value in enumerate(values_of_row):
+                cells[(row + r, column + c)] = value
+
+    def read_computed(self, sheet, address):
+        count_io("read")
+        self.io["read"] += 1
+        if self.calculate is not None:
+            self.calculate(self._book)
+        return self._cells(sheet, address)
+
+    def save_as(self, path):
+        count_io("save")
+        self.io["save"] += 1
+        self.saved[path] = {sheet: dict(cells) for sheet, cells in self._book.items()}
+
+    def close(self):
+        self._book = None
+
+
+_TIME = re.compile(r'(\d{1,2}):(\d{2})(?::(\d{2}))?')
+_NUMBER = re.compile(r'-?\d+(\.\d+)?')
+
+
+def excel_value(value):
+    """A value as Excel stores it when it is assigned to a cell: 'H:MM' and 'H:MM:SS' strings of a time of day become
+    times, strings of numbers become numbers and everything else is kept."""
+    if not isinstance(value, str):
+        return value
+    match = _TIME.fullmatch(value)
+    if match is not None:
+        hour, minute, second = (int(part or 0) for part in match.groups())
+        if hour < 24 and minute < 60 and second < 60:
+            return time(hour, minute, second)
+        return value
+    match = _NUMBER.fullmatch(value)
+    if match is not None:
+        return float(value) if match.group(1) else int(value)
+    return value
+
+
+def _cell(address):
+    """Convert 'B12' into (row, column), both starting at 1."""
+    letters = address.rstrip('0123456789')
+    column = 0
+    for letter in letters.upper():
+        column = column * 26 + ord(letter) - ord('A') + 1
+    return int(address[len(letters):]), column
+
+
+def _cell_range(address):
+    """Convert 'A1:D4' into (first row, first column, last row, last column)."""
+    first, last = address.split(':')
+    return (*_cell(first), *_cell(last))
+
+
+def _bounds(address):
+    """Convert 'A1:D4' into the (min_row, max_row, min_col, max_col) arguments of iter_rows."""
+    from openpyxl.utils.cell import range_boundaries
+    min_col, min_row, max_col, max_row = range_boundaries(address)
+    return min_row, max_row, min_col, max_col
+
+
+BACKENDS = {
+    XlwingsBackend.name: XlwingsBackend,
+    OpenpyxlBackend.name: OpenpyxlBackend,
+}
+
+
+def create_backend(name, **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown workbook backend '{name}', choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,107 @@
+import json
+from dataclasses import dataclass, field
+
+OCD_TYPE = 'OCD'
+
+
+def minutes_from_hm(h, m):
+    """Balance in minutes from hours and minutes that both carry its sign, -0:30 is (0, -30).
+
+    Negative hours with positive minutes, as the balance was entered before the minutes had a sign, are negative as a
+    whole: (-1, 30) is -1:30.
+    """
+    if h < 0 < m:
+        m = -m
+    return h * 60 + m
+
+
+def hm_from_minutes(minutes):
+    """(h, m) of a balance in minutes, both with the sign of the balance: -30 is (0, -30), -90 is (-1, -30)."""
+    h, m = divmod(abs(minutes), 60)
+    return (-h, -m) if minutes < 0 else (h, m)
+
+
+def parse_hm(value):
+    """Parse an 'h:m' balance cell into minutes, a leading '-' is the sign of the whole value."""
+    value = value.strip()
+    sign = -1 if value.startswith("-") else 1
+    h, m = value.lstrip("+-").split(":")
+    return sign * (int(h) * 60 + int(m))
+
+
+@dataclass
+class BalanceRules:
+    """How the worktime record turns a month into a balance.
+
+    credited_actions maps an absence (index into ACTIONS) to the fraction of the daily target it is credited with,
+    counted_types are the worktime types that are added to the balance, OCD time is weighted by ocd_factor.
+    """
+    daily_target_minutes: int = 480
+    credited_actions: dict = field(default_factory=lambda: {2: 1.0, 3: 0.5, 4: 1.0, 5: 1.0, 6: 0.0})
+    counted_types: frozenset = frozenset({"Office Hours", "Remote Work", "Overtime (time compensated)"})
+    ocd_factor: float = 0.0
+
+    @classmethod
+    def from_settings(cls, daily_target_minutes, ocd_factor, credited_actions, counted_types):
+        """Rules from their settings, credited_actions and counted_types in the JSON encoding of settings()."""
+        return cls(daily_target_minutes=daily_target_minutes,
+                   credited_actions={int(action): float(fraction) for action, fraction in json.loads(credited_actions).items()},
+                   counted_types=frozenset(json.loads(counted_types)),
+                   ocd_factor=ocd_factor)
+
+    def settings(self):
+        """The creditedActions and countedTypes settings of the rules."""
+        return {"creditedActions": json.dumps({str(action): fraction for action, fraction in sorted(self.credited_actions.items())}),
+                "countedTypes": json.dumps(sorted(self.counted_types))}
+
+
+@dataclass
+class MonthBalance:
+    carried: int
+    worked: int
+    ocd: int
+    credited: int
+    target: int
+
+    @property
+    def balance(self):
+        return self.carried + self.worked + self.ocd + self.credited - self.target
+
+    def hm(self):
+        return hm_from_minutes(self.balance)
+
+
+def entry_minutes(start_day, start_minute, end_day, end_minute, days_in_month):
+    """Duration of an entry, entries ending on a smaller day of month reach into the next month.
+
+    An entry ending before it starts on the same day, e.g. a last worktime whose addition wrapped past midnight,
+    counts nothing.
+    """
+    days = end_day - start_day
+    if days < 0:
+        days += days_in_month
+    return max(0, days * 24 * 60 + end_minute - start_minute)
+
+
+def compute_balance(carried, actions, entries, days_in_month, rules=None):
+    """Compute the balance at the end of the month.
+
+    carried is the balance in minutes at the start of the month, actions the action of every working day and
+    entries the generated worktime rows as (type, start day, start minute, end day, end minute).
+    """
+    if rules is None:
+        rules = BalanceRules()
+    worked = 0
+    ocd = 0
+    for work_type, start_day, start_minute, end_day, end_minute in entries:
+        duration = entry_minutes(start_day, start_minute, end_day, end_minute, days_in_month)
+        if work_type == OCD_TYPE:
+            ocd += duration
+        elif work_type in rules.counted_types:
+            worked += duration
+    credited = sum(rules.credited_actions.get(action, 0.0) for action in actions) * rules.daily_target_minutes
+    return MonthBalance(carried=carried,
+                        worked=worked,
+                        ocd=round(ocd * rules.ocd_factor),
+                        credited=round(credited),
+                        target=len(actions) * rules.daily_target_minutes)
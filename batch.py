@@ -0,0 +1,91 @@
+import atexit
+import logging
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backends import ExcelSession, XlwingsBackend, create_backend
+from generator import GenerationCancelled, plan_balance, plan_days, save_record
+from instrumentation import Run, get_logger, setup_logging, span
+
+log = get_logger("batch")
+
+# backend settings of a worker process, set up by _init_worker
+_backend_name = None
+_backend_options = None
+_session = None
+
+
+def month_range(month, year, count):
+    """The count consecutive (month, year) pairs starting with month.year."""
+    months = []
+    for i in range(count):
+        y, m = divmod(month - 1 + i, 12)
+        months.append((m + 1, year + y))
+    return months
+
+
+def load_month(store, base, month, year):
+    """Snapshot of a month from its saved workdays and OCD events, everything else is taken from base."""
+    workdays = store.load_workdays(month, year)
+    if workdays is None:
+        raise ValueError(f"No worktimes saved for {month}.{year}, update that month first")
+    return dataclasses.replace(base, month=month, year=year, workdays=tuple(workdays),
+                               ocd=tuple(store.load_ocd(month, year)))
+
+
+def _init_worker(backend_name, backend_options, log_directory):
+    global _backend_name, _backend_options, _session
+    # the parent process rotates the run log and reports to the console
+    setup_logging(log_directory, logging.WARNING, rotate=False)
+    _backend_name = backend_name
+    _backend_options = backend_options
+    if backend_name == XlwingsBackend.name:
+        # one Excel instance per worker process, reused for all the months it writes
+        _session = ExcelSession()
+        atexit.register(_session.shutdown)
+
+
+def _write_month(snapshot, plan, month_balance):
+    backend = create_backend(_backend_name, session=_session, **_backend_options)
+    with Run(log, "write month", month=snapshot.month, year=snapshot.year, backend=backend.name):
+        with span("open"):
+            backend.open(snapshot.template_file)
+        try:
+            return save_record(snapshot, backend, plan, month_balance)
+        finally:
+            backend.discard()
+
+
+def generate_batch(snapshots, backend_name, backend_options=None, max_workers=None, is_cancelled=None,
+                   log_directory=None):
+    """Generate the records of consecutive months in worker processes, yielding a GenerationResult per saved record.
+
+    Only the balance of the first snapshot is used, every following month carries the balance computed for the
+    month before, also on backends that calculate the balance in the record: a result that is not verified marks
+    where the chain starts to differ from the records. Months are planned here one after the other and handed to the workers as soon as their carried
+    balance is known, so records are written in parallel while the chain is still being planned.
+    The workers log their runs to the run log in log_directory.
+    """
+    if backend_options is None:
+        backend_options = dict()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(backend_name, backend_options, log_directory)) as pool:
+        futures = []
+        carried = None
+        for snapshot in snapshots:
+            if is_cancelled is not None and is_cancelled():
+                break
+            if carried is not None:
+                snapshot = dataclasses.replace(snapshot, balance=carried)
+            with span(f"plan {snapshot.month}.{snapshot.year}", log):
+                plan = plan_days(snapshot)
+                month_balance = plan_balance(snapshot, plan.rows)
+            carried = month_balance.balance
+            futures.append(pool.submit(_write_month, snapshot, plan, month_balance))
+
+        for future in as_completed(futures):
+            if is_cancelled is not None and is_cancelled():
+                for pending in futures:
+                    pending.cancel()
+                raise GenerationCancelled()
+            yield future.result()
@@ -0,0 +1,301 @@
+"""Micro benchmarks of the hot paths, run with wtr-cli bench NAME.
+
+Every benchmark prints its timings and returns 1 when one of them is over its budget, so it can gate a build. The
+fixtures, golden digests and budgets are shared with the test suite in tests/, which checks them with pytest.
+"""
+import json
+import random
+import hashlib
+import time
+import tracemalloc
+from calendar import monthrange
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from backends import MemoryBackend
+from generator import (PLAN_DAYOFMONTH_COL, PLAN_DAYTYPE_COL, PLAN_SHEET, PLAN_STARTING_ROW, PLAN_WEEKDAY_COL,
+                       WORKTIME_SHEET, WORKTIME_STARTING_ROW, MonthSnapshot, column_offset, distribute_minutes,
+                       generate_record, read_working_days)
+from intervals import Interval, OcdEvent
+
+# (working days, max per day) cases of the distribute benchmark, up to far more days than a month has
+DISTRIBUTE_CASES = [(5, 30), (23, 60), (23, 5), (100, 60), (1000, 60), (1000, 1)]
+DISTRIBUTE_REPEAT = 200
+# Budget of a single distribute_minutes call in seconds: a base plus a share per day, about twice the time measured
+# on a development machine, far below the quadratic time of legacy_distribute_minutes
+DISTRIBUTE_BUDGET_BASE = 20e-6
+DISTRIBUTE_BUDGET_PER_DAY = 5e-6
+
+# Day selections before each round of edits of the selection benchmark, and the edits per round. The first round
+# selects a single day, it is the cost of an edit to compare the others with
+SELECTION_ROUNDS = [1, 100, 200, 500]
+SELECTION_EDITS = 50
+# Budgets per edit: updateTotal calls (an insert signals once, a moving edit twice) and seconds
+SELECTION_UPDATES_BUDGET = 2
+SELECTION_EDIT_BUDGET = 0.002
+# How many times as long an edit may take in a later round as in the first one, where the tests check the time: a
+# cost growing with the selections exceeds it by far, noise of a loaded machine does not
+SELECTION_SLOWDOWN = 10
+
+
+def legacy_distribute_minutes(size, total_min, total_max, max_value, rng=random):
+    """distribute_minutes before the single pass sampler: random draws fixed up by a retry loop, kept to compare."""
+    total = rng.randint(total_min, total_max)
+    result = [0] * size
+    for i in range(size):
+        max_val = min(max_value, total - sum(result) - (size - i - 1))
+        if max_val > 0:
+            result[i] = rng.randint(0, max_val)
+    while sum(result) != total:
+        diff = total - sum(result)
+        index = rng.randint(0, size - 1)
+        adjustment = min(diff, max_value - result[index])
+        result[index] += adjustment
+    return result
+
+
+def distribute_budget(size):
+    """Budget of a distribute_minutes call for size days, in seconds."""
+    return DISTRIBUTE_BUDGET_BASE + size * DISTRIBUTE_BUDGET_PER_DAY
+
+
+def time_calls(function, repeat):
+    """Seconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_distribute():
+    rng = random.Random(0)
+    over_budget = False
+    for size, max_value in DISTRIBUTE_CASES:
+        # the largest totals leave the retry loop the fewest days to fix up
+        total_max = size * max_value
+        total_min = total_max * 3 // 4
+        values = distribute_minutes(size, total_min, total_max, max_value, rng)
+        if not total_min <= sum(values) <= total_max or max(values) > max_value:
+            print(f"{size} days, max {max_value}: wrong distribution {values}")
+            over_budget = True
+        sampler = time_calls(lambda: distribute_minutes(size, total_min, total_max, max_value, rng), DISTRIBUTE_REPEAT)
+        legacy = time_calls(lambda: legacy_distribute_minutes(size, total_min, total_max, max_value, rng),
+                            DISTRIBUTE_REPEAT)
+        over_budget |= sampler > distribute_budget(size)
+        print(f"{size:5} days, max {max_value:3}: {sampler * 1e6:8.1f}us, legacy {legacy * 1e6:10.1f}us "
+              f"(budget {distribute_budget(size) * 1e6:.0f}us)")
+    return 1 if over_budget else 0
+
+
+@contextmanager
+def counted_update_total():
+    """Count the calls of MainWindow.updateTotal into the single item of the yielded list, in windows created inside."""
+    import main
+    updates = [0]
+    update_total = main.MainWindow.updateTotal
+
+    def counted(self):
+        updates[0] += 1
+        update_total(self)
+
+    main.MainWindow.updateTotal = counted
+    try:
+        yield updates
+    finally:
+        main.MainWindow.updateTotal = update_total
+
+
+def selection_window():
+    """(application, main window) in Qt's test mode, so the store and settings of the user are not touched, the
+    window showing a month of 30 workdays. The window lives as long as the application is referenced."""
+    from PyQt6.QtCore import QStandardPaths
+    from PyQt6.QtWidgets import QApplication
+    from config import APP_NAME
+    from generator import WEEKDAYS
+    import main
+
+    QStandardPaths.setTestModeEnabled(True)
+    app = QApplication.instance() or QApplication([])
+    app.setApplicationName(APP_NAME)
+    window = main.MainWindow(backend='openpyxl')
+    window.setWorkdays([{"dayOfMonth": day, "dayOfWeek": WEEKDAYS[(day - 1) % 5]} for day in range(1, 31)], 1, 2000)
+    return app, window
+
+
+def measure_selections(window, updates):
+    """Select days up to the count of every round of SELECTION_ROUNDS and edit the worktimes of the selected day.
+
+    Yields (selections, seconds per edit, updateTotal calls per edit) per round, updates as of counted_update_total.
+    """
+    from PyQt6.QtCore import QItemSelectionModel
+    selection = window.workingDaysList.selectionModel
+    selections = 0
+    for target in SELECTION_ROUNDS:
+        while selections < target:
+            selections += 1
+            index = window.workDaysModel.index(selections % len(window.workDaysModel))
+            selection().setCurrentIndex(index, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        model = window.customWorktimesModel
+        updates[0] = 0
+        start = time.perf_counter()
+        for i in range(SELECTION_EDITS):
+            model.addItem(Interval(i, i + 1, 0))
+            # move the first row to the end
+            model.modifyItem(model.index(0), Interval(1000 + i, 1001 + i, 0))
+        elapsed = (time.perf_counter() - start) / (2 * SELECTION_EDITS)
+        yield selections, elapsed, updates[0] / (2 * SELECTION_EDITS)
+
+
+def bench_selection():
+    """Edit the worktimes of a day after more and more day selections, the cost of an edit has to stay the same."""
+    over_budget = False
+    with counted_update_total() as updates:
+        app, window = selection_window()
+        try:
+            for selections, elapsed, per_edit in measure_selections(window, updates):
+                over_budget |= per_edit > SELECTION_UPDATES_BUDGET or elapsed > SELECTION_EDIT_BUDGET
+                print(f"after {selections:4} selections: {elapsed * 1e6:7.1f}us and {per_edit:.1f} updateTotal calls "
+                      f"per edit (budget {SELECTION_EDIT_BUDGET * 1e6:.0f}us, {SELECTION_UPDATES_BUDGET})")
+        finally:
+            window.close()
+    return 1 if over_budget else 0
+
+
+# Fixtures of the generate benchmark, all generated from a template held in memory
+TEMPLATE = "LastName_FirstName_template.xlsx"
+USUALS = {str(weekday): [Interval(8 * 60, 12 * 60, 0).to_json(), Interval(12 * 60 + 30, 16 * 60 + 30, 1).to_json()]
+          for weekday in range(5)}
+GENERATE_REPEAT = 5
+# scenario -> (months as (month, year), OCD every night, seed)
+GENERATE_SCENARIOS = {
+    "28 days": ([(2, 2023)], False, 1),
+    "29 days": ([(2, 2024)], False, 2),
+    "30 days": ([(4, 2024)], False, 3),
+    "31 days": ([(1, 2024)], False, 4),
+    "dense ocd": ([(3, 2024)], True, 5),
+    "3 years": ([(month, year) for year in (2022, 2023, 2024) for month in range(1, 13)], False, 6),
+}
+# scenario -> (seconds, spreadsheet calls, peak KiB of allocations), the calls are exact: 4 to read the working days
+# and 9 to generate a month, whose absences are two runs of the absence column
+GENERATE_BUDGETS = {
+    "28 days": (0.005, 13, 256),
+    "29 days": (0.005, 13, 256),
+    "30 days": (0.005, 13, 256),
+    "31 days": (0.005, 13, 256),
+    "dense ocd": (0.008, 13, 512),
+    "3 years": (0.15, 468, 2048),
+}
+# scenario -> digest of the rows written into the Enter Working Time sheet, see worktime_digest
+GENERATE_GOLDEN = {
+    "28 days": "e69c2db48cc6d657",
+    "29 days": "c0f1a936fa945fff",
+    "30 days": "fd39692253e89e2d",
+    "31 days": "0c6eedf0fa74c4a5",
+    "dense ocd": "7b313152b86c0451",
+    "3 years": "bf21f9e71f6b4f99",
+}
+
+
+def plan_formulas(book):
+    """What the formulas of the monthly plan compute from the month and year in C5:C6: weekends are days off."""
+    cells = book.setdefault(PLAN_SHEET, dict())
+    month, year = cells.get((5, 3)), cells.get((6, 3))
+    days_in_month = monthrange(year, month)[1]
+    for day in range(1, 32):
+        row = PLAN_STARTING_ROW + day - 1
+        in_month = day <= days_in_month
+        weekday = date(year, month, day).strftime("%A") if in_month else None
+        cells[(row, column_offset(PLAN_DAYOFMONTH_COL) + 1)] = day if in_month else None
+        cells[(row, column_offset(PLAN_WEEKDAY_COL) + 1)] = weekday
+        cells[(row, column_offset(PLAN_DAYTYPE_COL) + 1)] = (
+            None if not in_month else "Weekend" if weekday in ("Saturday", "Sunday") else "Working day")
+
+
+def fixture_workdays(working_days):
+    """Workdays of a month with every kind of day: mostly usual times, some custom times and absences."""
+    workdays = []
+    for i, working_day in enumerate(working_days):
+        workday = dict(working_day, action=0, worktimes=[])
+        if i % 11 == 3:
+            workday['action'] = 2
+        elif i % 7 == 5:
+            workday['action'] = 1
+            workday['worktimes'] = [Interval(7 * 60, 11 * 60, 1).to_json(), Interval(13 * 60, 18 * 60, 0).to_json()]
+        workdays.append(workday)
+    return tuple(workdays)
+
+
+def fixture_ocd(month, year):
+    """An OCD event every night of the month, from 18:00 until 7:00 on the next day."""
+    events = []
+    for day in range(1, monthrange(year, month)[1] + 1):
+        start = datetime(year, month, day, 18)
+        end = datetime.fromordinal(start.toordinal() + 1).replace(hour=7)
+        events.append(OcdEvent(int(start.timestamp()), int(end.timestamp()), "night").to_json())
+    return tuple(events)
+
+
+def worktime_digest(book, digest):
+    """Add the rows of the Enter Working Time sheet of a saved workbook to a hash."""
+    rows = dict()
+    for (row, column), value in book.get(WORKTIME_SHEET, dict()).items():
+        if row >= WORKTIME_STARTING_ROW:
+            rows.setdefault(row, dict())[column] = value
+    digest.update(json.dumps([sorted(rows[row].items()) for row in sorted(rows)]).encode())
+
+
+def run_scenario(months, dense_ocd, seed, backend=None):
+    """Read the working days of every month and generate its record, carrying the balance like generate_batch.
+
+    backend opens TEMPLATE, by default a MemoryBackend computing plan_formulas. Returns the backend, the records
+    it saved are in the order of the months.
+    """
+    if backend is None:
+        backend = MemoryBackend(calculate=plan_formulas)
+    balance = 0
+    for i, (month, year) in enumerate(months):
+        working_days = read_working_days(backend, TEMPLATE, month, year)
+        snapshot = MonthSnapshot(month=month, year=year, template_file=TEMPLATE, working_path="records",
+                                 first_name="First", last_name="Last", group_name="Group",
+                                 balance=balance, total_min=120, total_max=240,
+                                 max_per_day=30, workdays=fixture_workdays(working_days), usuals=USUALS,
+                                 ocd=fixture_ocd(month, year) if dense_ocd else (), seed=seed * 1000 + i)
+        result = generate_record(snapshot, backend)
+        balance = result.next_balance()
+    return backend
+
+
+def bench_generate():
+    """Generate the records of synthetic months from a template in memory, to time the generator without files.
+
+    The rows written have to match the golden digests of the scenario, the spreadsheet calls their budget exactly.
+    """
+    over_budget = False
+    for name, (months, dense_ocd, seed) in GENERATE_SCENARIOS.items():
+        elapsed = min(time_calls(lambda: run_scenario(months, dense_ocd, seed), 1) for _ in range(GENERATE_REPEAT))
+        tracemalloc.start()
+        try:
+            backend = run_scenario(months, dense_ocd, seed)
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+        calls = sum(backend.io.values())
+        digest = hashlib.sha256()
+        for book in backend.saved.values():
+            worktime_digest(book, digest)
+        digest = digest.hexdigest()[:16]
+        golden = GENERATE_GOLDEN.get(name)
+        time_budget, calls_budget, peak_budget = GENERATE_BUDGETS[name]
+        failed = elapsed > time_budget or calls != calls_budget or peak > peak_budget or digest != golden
+        over_budget |= failed
+        print(f"{name:>10}: {elapsed * 1e3:7.2f}ms, {calls:4} calls, {peak:7.0f}KiB peak, rows {digest}"
+              f"{' (golden ' + str(golden) + ')' if digest != golden else ''} "
+              f"(budget {time_budget * 1e3:.0f}ms, {calls_budget}, {peak_budget}KiB)")
+    return 1 if over_budget else 0
+
+
+BENCHMARKS = {
+    "distribute": bench_distribute,
+    "generate": bench_generate,
+    "selection": bench_selection,
+}
@@ -0,0 +1,22 @@
+"""Compile the Qt Designer forms into ui_<name>.py modules, so the application does not parse XML at startup.
+
+Run by main.spec before bundling, run it by hand after editing a .ui file to use the compiled forms from source.
+"""
+import os
+import sys
+
+from PyQt6.uic import compileUi
+
+FORMS = ["wt", "worktime", "ocd", "overview"]
+
+
+def compile_forms(directory):
+    for name in FORMS:
+        with open(os.path.join(directory, f"{name}.ui"), 'r', encoding='utf-8') as ui_file, \
+                open(os.path.join(directory, f"ui_{name}.py"), 'w', encoding='utf-8') as py_file:
+            compileUi(ui_file, py_file)
+        print(f"Compiled {name}.ui")
+
+
+if __name__ == '__main__':
+    compile_forms(sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__)))
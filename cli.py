@@ -0,0 +1,343 @@
+"""Headless entry point: update workdays, generate records, dump state and import/export the configuration.
+
+Only the modules a command needs are imported, the GUI and the Excel bridge are never loaded unless asked for.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from config import APP_VERSION
+
+# Wall time budgets in seconds from process start to the first output
+STARTUP_BUDGETS = {"cli": 1.0, "gui": 3.0}
+
+# Benchmarks of the bench command, see bench.py, and the ones that run the main window
+BENCHMARKS = ("distribute", "generate", "selection")
+GUI_BENCHMARKS = ("selection",)
+
+
+def target(args, settings):
+    return args.month or settings["targetMonth"], args.year or settings["targetYear"]
+
+
+def template(args, settings):
+    from generator import find_template
+    template_file = find_template(args.working_path or settings["workingPath"])
+    if template_file is None:
+        raise SystemExit("No templates found")
+    return template_file
+
+
+def backend_factory(args, settings):
+    from backends import create_backend
+    name = args.backend or settings["backend"]
+    return lambda: create_backend(name, transaction_mode=settings["transactionMode"])
+
+
+def balance_rules(settings):
+    from balance import BalanceRules
+    try:
+        return BalanceRules.from_settings(settings["dailyTargetMinutes"], settings["ocdFactor"],
+                                          settings["creditedActions"], settings["countedTypes"])
+    except (ValueError, AttributeError) as e:
+        raise SystemExit(f"Invalid balance rules in the settings: {e}")
+
+
+def base_snapshot(args, settings, store, template_file, month, year):
+    from generator import MonthSnapshot
+    balance = store.load_balance().get(f"{month}.{year}", 0)
+    return MonthSnapshot(month=month,
+                         year=year,
+                         template_file=template_file,
+                         working_path=os.path.dirname(template_file),
+                         first_name=settings["firstName"],
+                         last_name=settings["lastName"],
+                         group_name=settings["groupName"],
+                         balance=balance,
+                         total_min=settings["totalMin"],
+                         total_max=settings["totalMax"],
+                         max_per_day=settings["maxPerDay"],
+                         workdays=tuple(),
+                         usuals=store.load_usuals(),
+                         ocd=tuple(),
+                         rules=balance_rules(settings),
+                         verify_balance=settings["verifyBalance"],
+                         addition_shape=settings["additionShape"])
+
+
+def update_command(args, settings):
+    from config import config_path
+    from generator import TemplateNotRecalculated, read_working_days
+    from models import Workdays
+    from store import open_store
+    from workday_cache import WorkdayCache
+    from workcalendar import HOLIDAYS_FILENAME, WorkCalendar, compare_working_days, load_rules
+    store = open_store()
+    month, year = target(args, settings)
+    use_calendar = settings["workingDaysSource"] == "calendar"
+    if use_calendar or args.check:
+        try:
+            calendar = WorkCalendar(load_rules(settings["holidayRegion"], config_path(HOLIDAYS_FILENAME)))
+        except ValueError as e:
+            raise SystemExit(str(e))
+    if use_calendar and not (args.check or settings["checkCalendar"]):
+        working_days = calendar.working_days(month, year)
+    else:
+        template_file = template(args, settings)
+        cache = WorkdayCache(config_path('workdays-cache.json'))
+        working_days = cache.get(template_file, month, year)
+        if working_days is None:
+            try:
+                working_days = read_working_days(backend_factory(args, settings)(), template_file, month, year)
+            except TemplateNotRecalculated as e:
+                if args.check or not use_calendar:
+                    raise SystemExit(str(e))
+                print(f"{e}, using the calendar", file=sys.stderr)
+            else:
+                cache.put(template_file, month, year, working_days)
+        cache.close()
+        if working_days is None:
+            working_days = calendar.working_days(month, year)
+        elif use_calendar or args.check:
+            # the template wins where they differ
+            differences = compare_working_days(calendar.working_days(month, year), working_days)
+            for difference in differences:
+                print(f"{month}.{year}: {difference}", file=sys.stderr)
+            if args.check and differences:
+                raise SystemExit(f"The calendar differs from the template in {month}.{year}")
+    try:
+        workdays = Workdays(working_days, store.load_workdays(month, year), month, year)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    store.save_workdays(month, year, workdays.getData())
+    print(f"{len(workdays)} working days in {month}.{year}")
+
+
+def generate_command(args, settings):
+    from batch import load_month, month_range
+    from intervals import format_hm
+    from store import open_store
+    store = open_store()
+    month, year = target(args, settings)
+    template_file = template(args, settings)
+    base = base_snapshot(args, settings, store, template_file, month, year)
+    try:
+        snapshots = [load_month(store, base, m, y) for m, y in month_range(month, year, args.months)]
+    except ValueError as e:
+        raise SystemExit(str(e))
+    from overlaps import build_index
+    overlaps = build_index(store)
+    for m, y in month_range(month, year, args.months):
+        for a, b in overlaps.month_conflicts(m, y):
+            print(f"Overlapping entries: {a.describe()} and {b.describe()}", file=sys.stderr)
+    if args.seed is not None:
+        import dataclasses
+        snapshots = [dataclasses.replace(s, seed=args.seed + i) for i, s in enumerate(snapshots)]
+    if args.patch and len(snapshots) > 1:
+        raise SystemExit("Only a single month can be patched")
+    if len(snapshots) == 1:
+        from generator import MonthPlan, generate_record
+        record = store.load_generated(month, year) if args.patch else None
+        results = [generate_record(snapshots[0], backend_factory(args, settings)(),
+                                   progress=lambda phase, percent: print(f"{percent:3}% {phase}"),
+                                   previous=MonthPlan.from_json(record) if record is not None else None)]
+    else:
+        from batch import generate_batch
+        from config import config_dir
+        results = generate_batch(snapshots, args.backend or settings["backend"],
+                                 dict(transaction_mode=settings["transactionMode"]), log_directory=config_dir())
+    for result in results:
+        store.save_balance({result.balance_key: result.next_balance()})
+        store.save_generated(result.plan.month, result.plan.year, result.plan.to_json())
+        print(f"Saved {result.filename}, balance {format_hm(result.next_balance())}")
+        if not result.verified:
+            print(f"Calculated balance {format_hm(result.balance.balance)} differs from the worktime record "
+                  f"({result.record_balance}), the balance of the record is kept", file=sys.stderr)
+
+
+def simulate_command(args, settings):
+    import dataclasses
+    from batch import load_month, month_range
+    from store import open_store
+    try:
+        from simulation import describe, simulate
+    except ImportError:
+        raise SystemExit("The simulation needs NumPy")
+    store = open_store()
+    month, year = target(args, settings)
+    base = base_snapshot(args, settings, store, "", month, year)
+    overrides = {name: value for name, value in (("total_min", args.total_min), ("total_max", args.total_max),
+                                                 ("max_per_day", args.max_per_day)) if value is not None}
+    base = dataclasses.replace(base, **overrides)
+    try:
+        snapshots = [load_month(store, base, m, y) for m, y in month_range(month, year, args.months)]
+    except ValueError as e:
+        raise SystemExit(str(e))
+    start = time.perf_counter()
+    simulations = simulate(snapshots, runs=args.runs, seed=args.seed)
+    for simulation in simulations:
+        print(describe(simulation))
+    print(f"{args.runs} runs in {time.perf_counter() - start:.3f}s")
+
+
+def dump_command(args, settings):
+    from store import open_store
+    store = open_store()
+    month, year = target(args, settings)
+    state = {
+        "settings": settings,
+        "balance": store.load_balance(),
+        "usuals": store.load_usuals(),
+        "workdays": store.load_workdays(month, year),
+        "ocd": store.load_ocd(month, year),
+    }
+    json.dump(state, sys.stdout, indent=2)
+    print()
+
+
+def export_command(args, settings):
+    from store import open_store
+    store = open_store()
+    bundle = {
+        "settings": settings,
+        "balance": store.load_balance(),
+        "usuals": store.load_usuals(),
+        "worktimes": {f"{month}-{year}": store.load_workdays(month, year) for month, year in store.workday_months()},
+        "ocd": {f"{month}-{year}": store.load_ocd(month, year) for month, year in store.ocd_months()},
+    }
+    with open(args.file, 'w') as f:
+        json.dump(bundle, f, indent=2)
+    print(f"Exported to {args.file}")
+
+
+def import_command(args, settings):
+    from config import save_settings
+    from store import open_store
+    store = open_store()
+    with open(args.file, 'r') as f:
+        bundle = json.load(f)
+    save_settings(bundle.get("settings", dict()))
+    store.save_balance(bundle.get("balance", dict()))
+    store.save_usuals(bundle.get("usuals", dict()))
+    for month_year, data in bundle.get("worktimes", dict()).items():
+        month, year = map(int, month_year.split("-"))
+        store.save_workdays(month, year, data)
+    for month_year, data in bundle.get("ocd", dict()).items():
+        month, year = map(int, month_year.split("-"))
+        store.save_ocd(month, year, data)
+    print(f"Imported {args.file}")
+
+
+def frozen():
+    """True in the wtr-cli executable, which has neither the sources nor the GUI modules."""
+    return getattr(sys, 'frozen', False)
+
+
+def startup_time(name):
+    """Seconds from process start to the first output of the CLI or the GUI, run from the sources."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    probes = {
+        "cli": [sys.executable, os.path.join(here, 'cli.py'), '--version'],
+        "gui": [sys.executable, '-c', 'import main; print(main.__name__)'],
+    }
+    import subprocess
+    start = time.perf_counter()
+    subprocess.run(probes[name], cwd=here, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def startup_command(args, settings):
+    """Check the startup time of the CLI and the GUI against STARTUP_BUDGETS, see also tests/test_startup.py."""
+    if frozen():
+        raise SystemExit("The startup check runs the sources, use python cli.py startup")
+    over_budget = False
+    for name, budget in STARTUP_BUDGETS.items():
+        elapsed = startup_time(name)
+        over_budget |= elapsed > budget
+        print(f"{name}: {elapsed:.3f}s (budget {budget:.1f}s)")
+    return 1 if over_budget else 0
+
+
+def bench_command(args, settings):
+    if args.name in GUI_BENCHMARKS and frozen():
+        raise SystemExit(f"The {args.name} benchmark needs the GUI, use python cli.py bench {args.name}")
+    import bench
+    return bench.BENCHMARKS[args.name]()
+
+
+def main(argv=None):
+    from backends import BACKENDS
+    parser = argparse.ArgumentParser(prog='wtr-cli', description=__doc__.splitlines()[0])
+    parser.add_argument('--version', action='version', version=APP_VERSION)
+    parser.add_argument('--verbose', action='store_true', help='log every step to stderr')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def month_arguments(command):
+        command.add_argument('--month', type=int, help='target month, defaults to the target month setting')
+        command.add_argument('--year', type=int, help='target year, defaults to the target year setting')
+
+    def template_arguments(command):
+        command.add_argument('--working-path', help='folder of the template, defaults to the working path setting')
+        command.add_argument('--backend', choices=sorted(BACKENDS), help='workbook backend, overrides the backend setting')
+
+    command = commands.add_parser('update', help='read the working days of a month and save them')
+    month_arguments(command)
+    template_arguments(command)
+    command.add_argument('--check', action='store_true',
+                         help='compare the working days of the calendar with the template, fail if they differ')
+    command.set_defaults(func=update_command)
+
+    command = commands.add_parser('generate', help='generate the worktime record of a month')
+    month_arguments(command)
+    template_arguments(command)
+    command.add_argument('--months', type=int, default=1, help='number of consecutive months to generate')
+    command.add_argument('--seed', type=int, help='seed of the random numbers, for repeatable records')
+    command.add_argument('--patch', action='store_true',
+                         help='only rewrite the rows of the days that changed since the record was generated')
+    command.set_defaults(func=generate_command)
+
+    command = commands.add_parser('simulate', help='show the spread of the records a generation would produce')
+    month_arguments(command)
+    command.add_argument('--months', type=int, default=1, help='number of consecutive months to simulate')
+    command.add_argument('--runs', type=int, default=10000, help='number of simulated generations')
+    command.add_argument('--seed', type=int, help='seed of the random numbers, for repeatable results')
+    command.add_argument('--total-min', type=int, help='overrides the total min setting, in minutes')
+    command.add_argument('--total-max', type=int, help='overrides the total max setting, in minutes')
+    command.add_argument('--max-per-day', type=int, help='overrides the max per day setting, in minutes')
+    command.set_defaults(func=simulate_command)
+
+    command = commands.add_parser('dump', help='print the saved state of a month as JSON')
+    month_arguments(command)
+    command.set_defaults(func=dump_command)
+
+    command = commands.add_parser('export', help='export the whole configuration into a single file')
+    command.add_argument('file')
+    command.set_defaults(func=export_command)
+
+    command = commands.add_parser('import', help='import a configuration exported before')
+    command.add_argument('file')
+    command.set_defaults(func=import_command)
+
+    command = commands.add_parser('startup', help='check the startup time of the CLI and the GUI')
+    command.set_defaults(func=startup_command)
+
+    command = commands.add_parser('bench', help='time the hot paths against their budgets')
+    command.add_argument('name', choices=sorted(BENCHMARKS), help='benchmark to run')
+    command.set_defaults(func=bench_command)
+
+    args = parser.parse_args(argv)
+    settings = dict()
+    if args.command not in ('startup', 'bench'):
+        import logging
+        from config import config_dir, load_settings
+        from instrumentation import setup_logging
+        # the output of the commands goes to stdout, the runs to the run log
+        setup_logging(config_dir(), logging.DEBUG if args.verbose else logging.WARNING)
+        settings = load_settings()
+    return args.func(args, settings)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
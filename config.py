@@ -0,0 +1,59 @@
+import os
+
+APP_NAME = "wtr"
+APP_VERSION = "1.0.0"
+
+# Keys of Settings.ini and their defaults
+SETTINGS = {
+    "firstName": "John",
+    "lastName": "Doe",
+    "groupName": "Black Magic",
+    "targetMonth": 9,
+    "targetYear": 2024,
+    "workingPath": "",
+    "randomizeMornings": 0,
+    "totalMin": 0,
+    "totalMax": 0,
+    "maxPerDay": 0,
+    "transactionMode": True,
+    "backend": "excel",
+    "prewarmExcel": True,
+    "dailyTargetMinutes": 480,
+    "ocdFactor": 0.0,
+    "creditedActions": '{"2": 1.0, "3": 0.5, "4": 1.0, "5": 1.0, "6": 0.0}',
+    "countedTypes": '["Office Hours", "Overtime (time compensated)", "Remote Work"]',
+    "verifyBalance": True,
+    "additionShape": "uniform",
+    "workingDaysSource": "calendar",
+    "holidayRegion": "none",
+    "checkCalendar": True,
+}
+
+
+def config_dir():
+    from PyQt6.QtCore import QCoreApplication, QStandardPaths
+    if QCoreApplication.instance() is None:
+        # headless use, the GUI names its QApplication
+        QCoreApplication.setApplicationName(APP_NAME)
+    path = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppConfigLocation)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def config_path(config_fn):
+    return os.path.join(config_dir(), config_fn)
+
+
+def load_settings():
+    from PyQt6.QtCore import QSettings
+    settings = QSettings(config_path("Settings.ini"), QSettings.Format.IniFormat)
+    return {key: settings.value(key, default, type=type(default)) for key, default in SETTINGS.items()}
+
+
+def save_settings(values):
+    from PyQt6.QtCore import QSettings
+    settings = QSettings(config_path("Settings.ini"), QSettings.Format.IniFormat)
+    for key, value in values.items():
+        if key in SETTINGS:
+            settings.setValue(key, value)
+    settings.sync()
@@ -0,0 +1,623 @@
+import os
+import glob
+import json
+import random
+import hashlib
+from calendar import monthrange
+from dataclasses import asdict, dataclass, field
+from datetime import date
+
+from balance import BalanceRules, compute_balance, hm_from_minutes, parse_hm
+from instrumentation import Run, get_logger, span
+from intervals import Interval, OcdEvent, format_minutes
+
+log = get_logger("generator")
+
+# Structure constants
+PLAN_DAYTYPE_COL = 'D'
+PLAN_ABSENCE_COL = 'B'
+PLAN_DAYOFMONTH_COL = 'A'
+PLAN_WEEKDAY_COL = 'C'
+PLAN_STARTING_ROW = 13
+PLAN_SHEET = 'Monthly Plan and Absences'
+PROFILE_SHEET = 'My Profile'
+WORKTIME_SHEET = 'Enter Working Time'
+RECORD_SHEET = 'Work Time Record'
+WORKTIME_TYPE_COL = 'C'
+WORKTIME_START_DAY_COL = 'D'
+WORKTIME_START_TIME_COL = 'E'
+WORKTIME_END_DAY_COL = 'F'
+WORKTIME_END_TIME_COL = 'G'
+WORKTIME_COMMENTS_COL = 'J'
+WORKTIME_STARTING_ROW = 10
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+WORKTYPES = ["Office Hours", "Remote Work", "Overtime (paid)", "Overtime (time compensated)"]
+
+ACTIONS = ["Working usual times", "Working custom times", "Vacation", "Half Day Vacation", "Sick", "Shift Compensation", "Flexible Time Comp."]
+
+# Jitter config (± minutes) applied to all usual worktime items
+RANDOM_OFFSET_MINUTES = 30
+
+# How the monthly addition is spread over the usual days, see addition_weights
+ADDITION_SHAPES = ["uniform", "front-loaded", "weekday"]
+# Relative addition per weekday for the weekday shape
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 0.5]
+
+MINUTES_PER_DAY = 24 * 60
+LATEST_MINUTE = 23 * 60 + 59
+
+# Phases reported while generating a record, in order
+PHASES = ["open", "plan", "worktimes", "save", "balance"]
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class TemplateNotRecalculated(Exception):
+    """The backend cannot recalculate the monthly plan of the template for another month than it was saved for."""
+    pass
+
+
+def addition_weights(shape, weekdays):
+    """Relative addition of each usual day for one of ADDITION_SHAPES, weekdays are indexes into WEEKDAYS."""
+    if shape == "uniform":
+        return [1.0] * len(weekdays)
+    if shape == "front-loaded":
+        return [float(len(weekdays) - i) for i in range(len(weekdays))]
+    if shape == "weekday":
+        return [WEEKDAY_WEIGHTS[d] for d in weekdays]
+    raise ValueError(f"Unknown addition shape {shape}")
+
+
+def distribute_minutes(size, total_min, total_max, max_value, rng=random, weights=None):
+    """Split a random total between total_min and total_max into size values of at most max_value each.
+
+    Single pass: every value is drawn from the window that still lets the remaining values reach the total exactly,
+    centered on its weighted share of the remainder (equal shares without weights).
+    """
+    if total_min > total_max:
+        raise ValueError("total_min cannot be greater than total_max.")
+
+    total = rng.randint(total_min, total_max)
+    log.debug("monthly addition: %d min", total)
+
+    if size * max_value < total:
+        raise ValueError("It's not possible to distribute the total minutes within working days")
+
+    if weights is None:
+        weights = [1.0] * size
+    # weight of the values from i to the end
+    remaining_weights = [0.0] * size
+    acc = 0.0
+    for i in reversed(range(size)):
+        acc += weights[i]
+        remaining_weights[i] = acc
+
+    result = []
+    remaining = total
+    for i in range(size):
+        left = size - i - 1
+        lo = max(0, remaining - left * max_value)
+        hi = min(max_value, remaining)
+        if remaining_weights[i] > 0:
+            share = remaining * weights[i] / remaining_weights[i]
+        else:
+            share = remaining / (left + 1)
+        center = min(max(round(share), lo), hi)
+        spread = min(center - lo, hi - center)
+        value = center + rng.randint(-spread, spread)
+        result.append(value)
+        remaining -= value
+    return result
+
+
+def contiguous_blocks(first_row, columns, rows):
+    """Split row data into (anchor cell, 2D block) pairs, one per run of adjacent spreadsheet columns."""
+    order = sorted(range(len(columns)), key=lambda i: columns[i])
+    groups = []
+    for i in order:
+        if groups and ord(columns[i]) == ord(columns[groups[-1][-1]]) + 1:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return [(f'{columns[g[0]]}{first_row}', [[row[i] for i in g] for row in rows]) for g in groups]
+
+
+def column_offset(column, first_column='A'):
+    return ord(column) - ord(first_column)
+
+
+def parse_working_days(plan):
+    """Extract the working days from the rows of the monthly plan block (columns A..D)."""
+    working_days = []
+    for row in plan:
+        day_type = row[column_offset(PLAN_DAYTYPE_COL)]
+        week_day = row[column_offset(PLAN_WEEKDAY_COL)]
+        if day_type == 'Working day':
+            working_days.append({"dayOfMonth": int(row[column_offset(PLAN_DAYOFMONTH_COL)]),
+                                 "dayOfWeek": week_day})
+    return working_days
+
+
+def find_template(working_path):
+    search_pattern = os.path.join(working_path, 'LastName_FirstName_*.xlsx')
+    with span("template discovery", log):
+        matching_files = glob.glob(search_pattern)
+    if len(matching_files) != 1:
+        return None
+    return matching_files[0]
+
+
+def record_filename(last_name, first_name, year, month):
+    return f'{last_name}_{first_name}_WorkTimeRecord_{year}-{month:02}.xlsx'
+
+
+def next_month_key(month, year):
+    d = date(year + month // 12, month % 12 + 1, 1)
+    return f"{d.month}.{d.year}"
+
+
+@dataclass(frozen=True)
+class MonthSnapshot:
+    """Everything needed to generate the record of a month, copied from the models in their saved formats.
+
+    workdays is Workdays.getData(), usuals WeekdayUsualsList.getUsuals() and ocd OnCallDutyList.getEvents(), all in the
+    JSON encoding of intervals.py. balance is the balance carried into the month in signed minutes.
+    """
+    month: int
+    year: int
+    template_file: str
+    working_path: str
+    first_name: str
+    last_name: str
+    group_name: str
+    balance: int
+    total_min: int
+    total_max: int
+    max_per_day: int
+    workdays: tuple
+    usuals: dict
+    ocd: tuple
+    rules: BalanceRules = field(default_factory=BalanceRules)
+    verify_balance: bool = True
+    addition_shape: str = "uniform"
+    seed: int = None
+
+
+@dataclass
+class DayPlan:
+    """What was generated for a day: the digest of its inputs, its sorted rows and, for a usual day, the jitter delta
+    and the addition it got. first_row is where its rows are in the Enter Working Time sheet, as an offset from
+    WORKTIME_STARTING_ROW, see place_days."""
+    digest: str
+    rows: list
+    delta: int = 0
+    addition: int = 0
+    first_row: int = None
+
+
+@dataclass
+class MonthPlan:
+    """The generated days of a month and the absence column of the plan, filename is the record they were saved to.
+
+    The JSON encoding is the one of Store.save_generated.
+    """
+    month: int
+    year: int
+    days: dict  # day of month -> DayPlan
+    absences: list
+    filename: str = None
+
+    @property
+    def rows(self):
+        """Rows of all days in order."""
+        return [row for day in sorted(self.days) for row in self.days[day].rows]
+
+    def sheet_rows(self):
+        """Rows of the Enter Working Time sheet by their offset from WORKTIME_STARTING_ROW, None where no day has one."""
+        sheet = [None] * max((plan.first_row + len(plan.rows) for plan in self.days.values()), default=0)
+        for plan in self.days.values():
+            sheet[plan.first_row:plan.first_row + len(plan.rows)] = plan.rows
+        return sheet
+
+    def to_json(self):
+        return {'month': self.month, 'year': self.year, 'filename': self.filename, 'absences': self.absences,
+                'days': [dict(asdict(plan), dayOfMonth=day) for day, plan in sorted(self.days.items())]}
+
+    @classmethod
+    def from_json(cls, data):
+        days = {d['dayOfMonth']: DayPlan(d['digest'], d['rows'], d['delta'], d['addition'], d.get('first_row'))
+                for d in data['days']}
+        if any(plan.first_row is None for plan in days.values()):
+            # saved before the rows had places of their own, they were written one day after the other
+            for plan in days.values():
+                plan.first_row = None
+            place_days(days)
+        return cls(data['month'], data['year'], days, data['absences'], data['filename'])
+
+
+@dataclass
+class GenerationResult:
+    """A saved record. balance is the MonthBalance computed from the plan, record_balance the balance the spreadsheet
+    application calculated in the record, None on backends that do not compute formulas."""
+    filename: str
+    balance_key: str
+    balance: object
+    record_balance: str = None
+    plan: MonthPlan = None
+    verify_balance: bool = True
+
+    @property
+    def verified(self):
+        """False if the two balances differ and the snapshot asked to verify them."""
+        return not self.verify_balance or self.record_balance is None or \
+            parse_hm(self.record_balance) == self.balance.balance
+
+    def next_balance(self):
+        """Balance of the next month in minutes: the one of the record where it was calculated, else the computed one."""
+        if self.record_balance is not None:
+            return parse_hm(self.record_balance)
+        return self.balance.balance
+
+
+def jitter_range(usuals):
+    """Range of the shared delta that keeps all usual intervals of a day within 00:00..23:59, None if there is none."""
+    # choose a delta that keeps ALL intervals within 00:00..23:59 *without clamping*,
+    # thereby preserving both durations (>= usuals) and gaps (no overlaps introduced)
+    J = RANDOM_OFFSET_MINUTES
+    # Feasible delta so that start >= 0 and end <= LATEST_MINUTE for ALL intervals
+    lower_bound = -min(u.start for u in usuals)              # delta >= -min(start)
+    upper_bound = LATEST_MINUTE - max(u.end for u in usuals)  # delta <= LATEST_MINUTE - max(end)
+    # Intersect with ±J
+    lo = max(-J, lower_bound)
+    hi = min(J, upper_bound)
+    if lo > hi:
+        return None
+    return lo, hi
+
+
+def jitter_usuals(usuals, day_of_month, rng=random):
+    """Shift all usual intervals of a day by a single random delta."""
+    if RANDOM_OFFSET_MINUTES <= 0:
+        return usuals
+    # randomize all usual intervals together by a single ±RANDOM_OFFSET_MINUTES delta
+    delta_range = jitter_range(usuals)
+    if delta_range is None:
+        # No feasible jitter range; fall back to zero shift
+        shared_delta = 0
+        delta_range = (0, 0)
+    else:
+        shared_delta = rng.randint(*delta_range)
+    log.debug("random offset for all usuals on day %d: %d min (range %d..%d)", day_of_month, shared_delta, *delta_range)
+    return [u.shifted(shared_delta) for u in usuals]
+
+
+def usual_intervals(snapshot, workday):
+    """The usual worktimes of the weekday of a workday, sorted."""
+    day_of_week_index = WEEKDAYS.index(workday["dayOfWeek"])
+    usuals = sorted(Interval.from_json(u) for u in snapshot.usuals.get(str(day_of_week_index), []))
+    if len(usuals) == 0:
+        raise Exception(f"No usuals found for {workday['dayOfWeek']}, terminating process")
+    return usuals
+
+
+def ocd_rows(snapshot):
+    """Rows of the OCD events of a snapshot, by the day of month they start on."""
+    ocd_by_day = dict()
+    for o in map(OcdEvent.from_json, snapshot.ocd):
+        start = o.start_datetime()
+        end = o.end_datetime()
+        ocd_by_day.setdefault(start.day, []).append(
+            {'type': 'OCD', 'start_day': start.day, 'start': start.hour * 60 + start.minute,
+             'end_day': end.day, 'end': end.hour * 60 + end.minute})
+    return ocd_by_day
+
+
+def day_digest(snapshot, workday, ocd):
+    """Hash of everything the rows of a day are generated from: its action, its worktimes or the usuals of its
+    weekday, and the rows of the OCD events starting on it."""
+    if workday is None:
+        inputs = None
+    elif workday['action'] == 0:
+        inputs = [0, usual_intervals(snapshot, workday)]
+    elif workday['action'] == 1:
+        inputs = [1, [Interval.from_json(w) for w in workday['worktimes']]]
+    else:
+        inputs = [workday['action']]
+    return hashlib.sha256(json.dumps([inputs, ocd], sort_keys=True).encode()).hexdigest()
+
+
+def place_days(days, previous=None):
+    """Set the first_row of every DayPlan of days that has none.
+
+    A day keeps the place of its plan in previous while its rows fit into it. Other days take the first free rows
+    that fit them, after the rows of the days that kept their place, so the rows of one day never move the rows of
+    another. Without previous the days follow each other in order.
+    """
+    used = set()
+    for day, plan in days.items():
+        if plan.first_row is None and previous is not None and day in previous.days:
+            before = previous.days[day]
+            if len(plan.rows) <= len(before.rows):
+                plan.first_row = before.first_row
+        if plan.first_row is not None:
+            used.update(range(plan.first_row, plan.first_row + len(plan.rows)))
+    for day in sorted(days):
+        plan = days[day]
+        if plan.first_row is not None:
+            continue
+        first_row = 0
+        while any(row in used for row in range(first_row, first_row + len(plan.rows))):
+            first_row += 1
+        plan.first_row = first_row
+        used.update(range(first_row, first_row + len(plan.rows)))
+
+
+def plan_days(snapshot, rng=None, previous=None):
+    """Plan the days of the month of a snapshot, see plan_month.
+
+    With the MonthPlan previous generated before, days whose digest did not change keep their plan. The usual days
+    that changed are jittered again and share the additions the other days no longer have, as far as they can take
+    them, so the total addition of the month stays what it was. If no usual day changed, the additions are spread
+    anew over all usual days, which keep their jitter. Rows are placed by place_days.
+    """
+    if rng is None:
+        rng = random if snapshot.seed is None else random.Random(snapshot.seed)
+    days_in_month = monthrange(snapshot.year, snapshot.month)[1]
+    workdays = {w['dayOfMonth']: w for w in snapshot.workdays}
+    ocd_by_day = ocd_rows(snapshot)
+
+    digests = {day: day_digest(snapshot, workdays.get(day), ocd_by_day.get(day, []))
+               for day in sorted(set(workdays) | set(ocd_by_day))}
+    kept = dict()
+    if previous is not None:
+        kept = {day: previous.days[day] for day, digest in digests.items()
+                if day in previous.days and previous.days[day].digest == digest}
+    usual_days = [day for day in sorted(workdays) if workdays[day]['action'] == 0 and day not in kept]
+
+    additions = dict()
+    if previous is not None and snapshot.max_per_day > 0 and not usual_days and \
+            sum(p.addition for p in previous.days.values()) > sum(p.addition for p in kept.values()):
+        # no changed usual day can take the additions of the days that changed
+        usual_days = [day for day in sorted(workdays) if workdays[day]['action'] == 0]
+    if snapshot.max_per_day > 0 and (previous is None or usual_days):
+        if previous is None:
+            total_min, total_max = snapshot.total_min, snapshot.total_max
+        else:
+            missing = sum(p.addition for p in previous.days.values()) - \
+                sum(p.addition for day, p in kept.items() if day not in usual_days)
+            total_min = total_max = min(max(missing, 0), len(usual_days) * snapshot.max_per_day)
+        distributed_minutes = distribute_minutes(len(usual_days), total_min, total_max, snapshot.max_per_day, rng,
+                                                 addition_weights(snapshot.addition_shape,
+                                                                  [WEEKDAYS.index(workdays[d]['dayOfWeek']) for d in usual_days]))
+        log.debug("additions per usual day: %s", distributed_minutes)
+        additions = dict(zip(usual_days, distributed_minutes))
+
+    days = dict()
+    absences = [[None] for _ in range(days_in_month)]
+    for day_of_month in range(1, days_in_month + 1):
+        workday = workdays.get(day_of_month)
+        if workday is not None and workday['action'] >= 2:
+            # neither work nor ocd is possible here
+            absences[day_of_month - 1][0] = ACTIONS[workday['action']]
+        if day_of_month not in digests:
+            continue
+        if day_of_month in kept and day_of_month not in additions:
+            days[day_of_month] = kept[day_of_month]
+            continue
+
+        plan = DayPlan(digests[day_of_month], [])
+        if workday is not None and workday['action'] == 0:  # usuals
+            usuals = usual_intervals(snapshot, workday)
+            if day_of_month in kept:
+                # a kept day that gets a new addition
+                jittered = [u.shifted(kept[day_of_month].delta) for u in usuals]
+            else:
+                jittered = jitter_usuals(usuals, day_of_month, rng)
+            plan.delta = jittered[0].start - usuals[0].start
+
+            # add some more hours
+            if day_of_month in additions:
+                plan.addition = additions[day_of_month]
+                jittered[-1] = jittered[-1]._replace(end=(jittered[-1].end + plan.addition) % MINUTES_PER_DAY)
+                log.debug("eod addition for day %d: %d", day_of_month, plan.addition)
+
+            for start, end, work_type in jittered:
+                plan.rows.append({'type': WORKTYPES[work_type], 'start_day': day_of_month, 'start': start,
+                                  'end_day': day_of_month, 'end': end})
+        elif workday is not None and workday['action'] == 1:  # custom times
+            for c in map(Interval.from_json, workday['worktimes']):
+                plan.rows.append({'type': WORKTYPES[c.type], 'start_day': day_of_month, 'start': c.start,
+                                  'end_day': day_of_month, 'end': c.end})
+
+        # check if there is OCD on that day
+        plan.rows.extend(ocd_by_day.get(day_of_month, []))
+        plan.rows.sort(key=lambda o: o["start"])
+        days[day_of_month] = plan
+
+    place_days(days, previous)
+    return MonthPlan(snapshot.month, snapshot.year, days, absences)
+
+
+def plan_month(snapshot, rng=None):
+    """Turn a snapshot into the sorted rows of the Enter Working Time sheet and the absence column of the plan.
+
+    Rows are dicts of type name, start/end day of month and start/end minute of the day. Random numbers are drawn
+    from rng, by default from one seeded with the seed of the snapshot, if it has one.
+    """
+    plan = plan_days(snapshot, rng)
+    return plan.rows, plan.absences
+
+
+def read_working_days(backend, template_file, month, year, progress=None):
+    with Run(log, "read working days", month=month, year=year, backend=backend.name):
+        if progress is not None:
+            progress("open", 0)
+        with span("open"):
+            backend.open(template_file)
+        try:
+            if progress is not None:
+                progress("plan", 50)
+            # Change the target month and year
+            with span("write"):
+                backend.write(PLAN_SHEET, 'C5:C6', [[month], [year]])
+            if not backend.computes_formulas:
+                with span("recalc"):
+                    calculated = backend.read_computed(PLAN_SHEET, 'C5:C6')
+                if calculated != [[month], [year]]:
+                    raise TemplateNotRecalculated(f"The {backend.name} backend cannot recalculate the monthly plan, "
+                                    f"the template was last calculated for {calculated[0][0]}.{calculated[1][0]}")
+            with span("read"):
+                plan = backend.read_computed(PLAN_SHEET, f'A{PLAN_STARTING_ROW}:D{PLAN_STARTING_ROW + 30}')
+            return parse_working_days(plan)
+        finally:
+            backend.close()
+
+
+def worktime_values(rows):
+    """Cells of rows in the order of the worktime columns, empty ones for a None row."""
+    return [[None] * 5 if d is None else
+            [d["type"], d["start_day"], d["end_day"], format_minutes(d["start"]), format_minutes(d["end"])] for d in rows]
+
+
+def changed_rows(old, new, width):
+    """(offset, rows) runs of the rows of new that differ from old, rows that are in old only are cleared."""
+    runs = []
+    for i in range(max(len(old), len(new))):
+        row = new[i] if i < len(new) else [None] * width
+        if i < len(old) and old[i] == row:
+            continue
+        if runs and runs[-1][0] + len(runs[-1][1]) == i:
+            runs[-1][1].append(row)
+        else:
+            runs.append((i, [row]))
+    return runs
+
+
+def write_record(backend, snapshot, plan, previous=None):
+    """Write a plan into the opened workbook.
+
+    With the plan previous already written into it, only the rows of Enter Working Time that differ are written and
+    the absences only if they changed. The rows of a day are where place_days put them, so only the rows of days
+    that changed differ. The absence column is written in runs of the absence days, the template's cells of the
+    other days are left as they are.
+    """
+    columns = [WORKTIME_TYPE_COL, WORKTIME_START_DAY_COL, WORKTIME_END_DAY_COL, WORKTIME_START_TIME_COL, WORKTIME_END_TIME_COL]
+    values = worktime_values(plan.sheet_rows())
+    if previous is None:
+        runs = [(0, values)] if values else []
+    else:
+        runs = changed_rows(worktime_values(previous.sheet_rows()), values, len(columns))
+
+    with backend.transaction():
+        # Change the target month
+        backend.write(PLAN_SHEET, 'C5:C6', [[snapshot.month], [snapshot.year]])
+
+        # Write Balance, the minutes carry its sign as well so that -0:30 stays negative
+        balance_h, balance_m = hm_from_minutes(snapshot.balance)
+        backend.write(PLAN_SHEET, 'E10', balance_h)
+        backend.write(PLAN_SHEET, 'G10', balance_m)
+
+        # Profile
+        backend.write(PROFILE_SHEET, 'C3:C4', [[f'{snapshot.first_name} {snapshot.last_name}'], [snapshot.group_name]])
+
+        old_absences = [[None]] * len(plan.absences) if previous is None else previous.absences
+        for offset, cells in changed_rows(old_absences, plan.absences, 1):
+            backend.write(PLAN_SHEET, f'{PLAN_ABSENCE_COL}{PLAN_STARTING_ROW + offset}', cells)
+        for offset, rows in runs:
+            for address, block in contiguous_blocks(WORKTIME_STARTING_ROW + offset, columns, rows):
+                backend.write(WORKTIME_SHEET, address, block)
+
+
+def read_record_balance(backend):
+    """Balance of the Work Time Record sheet as calculated by the spreadsheet application, None if not found."""
+    for row in backend.read_computed(RECORD_SHEET, 'T1:W49'):
+        cell_value = row[0]
+        if isinstance(cell_value, str) and "balance" in cell_value:
+            return row[3]
+    return None
+
+
+def plan_balance(snapshot, rows):
+    """Balance at the end of the month of the snapshot, given its planned rows."""
+    days_in_month = monthrange(snapshot.year, snapshot.month)[1]
+    entries = [(d["type"], d["start_day"], d["start"], d["end_day"], d["end"]) for d in rows]
+    month_balance = compute_balance(snapshot.balance,
+                                    [w["action"] for w in snapshot.workdays],
+                                    entries, days_in_month, snapshot.rules)
+    log.debug("balance: %s", month_balance)
+    return month_balance
+
+
+def save_record(snapshot, backend, plan, month_balance, phase=None, previous=None):
+    """Write a MonthPlan into the opened template, or into the record previous was written to, and save it as the
+    worktime record of the month."""
+    if phase is None:
+        phase = lambda name: None
+
+    phase("worktimes")
+    with span("write"):
+        write_record(backend, snapshot, plan, previous)
+
+    phase("save")
+    # Save the workbook with a new name
+    fn = record_filename(snapshot.last_name, snapshot.first_name, snapshot.year, snapshot.month)
+    with span("save"):
+        backend.save_as(os.path.join(snapshot.working_path, fn))
+
+    phase("balance")
+    plan.filename = fn
+    result = GenerationResult(fn, next_month_key(snapshot.month, snapshot.year), month_balance, plan=plan,
+                              verify_balance=snapshot.verify_balance)
+    if backend.computes_formulas:
+        with span("balance scan"):
+            result.record_balance = read_record_balance(backend)
+    return result
+
+
+def generate_record(snapshot, backend, progress=None, is_cancelled=None, previous=None):
+    """Fill the template with the month of the snapshot and save it as the worktime record of that month.
+
+    progress(phase, percent) is called before every phase of PHASES, is_cancelled() is checked in between and
+    raises GenerationCancelled before anything is saved. The MonthPlan of the result is the one to pass as previous
+    to regenerate the record.
+
+    With previous, the record it was saved to is patched instead: days whose inputs did not change keep their rows
+    and only the rows that differ are written, see plan_days. Without that record the template is filled.
+    """
+    def phase(name):
+        if is_cancelled is not None and is_cancelled() and name != "balance":
+            raise GenerationCancelled()
+        if progress is not None:
+            progress(name, int(100 * PHASES.index(name) / len(PHASES)))
+
+    record_file = None
+    if previous is not None and previous.filename is not None:
+        record_file = os.path.join(snapshot.working_path, previous.filename)
+        if not os.path.exists(record_file):
+            log.info("%s is gone, generating %d.%d from the template", previous.filename, snapshot.month, snapshot.year)
+            record_file = previous = None
+    else:
+        previous = None
+
+    with Run(log, "generate" if previous is None else "regenerate", month=snapshot.month, year=snapshot.year,
+             backend=backend.name) as run:
+        phase("open")
+        with span("open"):
+            backend.open(record_file or snapshot.template_file)
+        try:
+            phase("plan")
+            with span("plan"):
+                plan = plan_days(snapshot, previous=previous)
+                month_balance = plan_balance(snapshot, plan.rows)
+            run.fields["rows"] = len(plan.rows)
+            if previous is not None:
+                run.fields["changed_days"] = sum(1 for day, p in plan.days.items() if previous.days.get(day) is not p)
+            result = save_record(snapshot, backend, plan, month_balance, phase, previous)
+            if progress is not None:
+                progress("balance", 100)
+            return result
+        finally:
+            # the workbook now refers to the saved record (or is half written), the template is reopened for the next run
+            backend.discard()
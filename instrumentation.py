@@ -0,0 +1,136 @@
+"""Logging, phase timing and spreadsheet I/O counting.
+
+Every module logs to a logger named after its subsystem below "wtr" (wtr.gui, wtr.generator, wtr.backends, ...).
+setup_logging sends the records to stderr and to a rotating JSON-lines run log in the config dir, one object per
+line with the time, host, process, logger, level, message and the fields of the record, ready to be collected
+from several machines.
+
+A Run times an operation like a generation: the spans inside it add up per phase, the backends count their
+spreadsheet calls into it, and a single record with the totals is logged when it ends.
+"""
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+LOGGER_NAME = 'wtr'
+RUN_LOG_FILENAME = 'wtr-run.jsonl'
+RUN_LOG_MAX_BYTES = 1024 * 1024
+RUN_LOG_BACKUPS = 5
+# Status of a run that raised one of these exceptions, they are expected and logged without a traceback
+RUN_STATUS = {"GenerationCancelled": "cancelled", "TemplateNotRecalculated": "stale template"}
+
+_local = threading.local()
+
+
+def get_logger(subsystem):
+    return logging.getLogger(f"{LOGGER_NAME}.{subsystem}")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    host = socket.gethostname()
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "host": self.host,
+            "pid": record.process,
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", dict()))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(directory=None, level=logging.INFO, rotate=True):
+    """Log to stderr at level and, with a directory, everything from INFO on to the run log. Only the first call counts.
+
+    Processes sharing the run log with another one pass rotate=False, only a single process may rotate it.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if logger.handlers:
+        return logger
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(level)
+    console.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(console)
+    if directory is not None:
+        run_log = RotatingFileHandler(os.path.join(directory, RUN_LOG_FILENAME),
+                                      maxBytes=RUN_LOG_MAX_BYTES if rotate else 0,
+                                      backupCount=RUN_LOG_BACKUPS, encoding='utf-8', delay=True)
+        run_log.setLevel(logging.INFO)
+        run_log.setFormatter(JsonLinesFormatter())
+        logger.addHandler(run_log)
+    return logger
+
+
+class Run:
+    """A timed operation of the current thread, used as a context manager.
+
+    fields are logged with the summary, the block may add more. The summary is logged at INFO, or at WARNING when the
+    block raised, with the traceback unless the exception is in RUN_STATUS.
+    """
+
+    def __init__(self, logger, name, **fields):
+        self.logger = logger
+        self.name = name
+        self.fields = fields
+        self.phases = dict()  # phase -> milliseconds
+        self.io = Counter()  # spreadsheet call -> count
+        self._start = None
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = getattr(_local, "run", None)
+        _local.run = self
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.run = self._outer
+        ms = (time.perf_counter() - self._start) * 1000
+        status = "ok" if exc_type is None else RUN_STATUS.get(exc_type.__name__, "failed")
+        fields = dict(self.fields, run=self.name, status=status, ms=round(ms, 1),
+                      phases={name: round(value, 1) for name, value in self.phases.items()},
+                      io=dict(self.io), io_calls=sum(self.io.values()))
+        self.logger.log(logging.INFO if status in ("ok", "cancelled") else logging.WARNING,
+                        "%s %s in %.0f ms, %d spreadsheet calls", self.name, status, ms, fields["io_calls"],
+                        extra={"fields": fields}, exc_info=status == "failed")
+        return False
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def span(name, logger=None):
+    """Time a phase into the current run, outside of a run it is logged as a record of its own."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        run = current_run()
+        if run is not None:
+            run.phases[name] = run.phases.get(name, 0.0) + ms
+            run.logger.debug("%s: %s took %.1f ms", run.name, name, ms)
+        else:
+            (logger or get_logger("span")).info("%s took %.1f ms", name, ms,
+                                                extra={"fields": {"span": name, "ms": round(ms, 1)}})
+
+
+def count_io(call):
+    """Count a spreadsheet call of a backend into the current run."""
+    run = current_run()
+    if run is not None:
+        run.io[call] += 1
@@ -0,0 +1,70 @@
+"""Immutable worktime and OCD values shared by the models, the store and the generator.
+
+Intervals hold minutes since midnight and OCD events seconds since the epoch. Qt types are only built from them
+where a view or dialog needs one. The JSON encoding is {"start", "end", "type"} with plain minutes for intervals and
+{"start", "end", "comments"} with epoch seconds for events; the {"h", "m"} and {"hour", "min"} times written by
+earlier versions are still read.
+"""
+from datetime import datetime
+from typing import NamedTuple
+
+
+def minutes(value):
+    """Minutes since midnight of a time in any of the JSON shapes."""
+    if isinstance(value, int):
+        return value
+    if 'h' in value:
+        return value['h'] * 60 + value['m']
+    return value['hour'] * 60 + value['min']
+
+
+def format_minutes(value):
+    return f"{value // 60:02}:{value % 60:02}"
+
+
+def format_hm(minutes):
+    """A duration or balance as h:mm, negative ones with a sign."""
+    sign = "-" if minutes < 0 else ""
+    h, m = divmod(abs(minutes), 60)
+    return f"{sign}{h}:{m:02}"
+
+
+class Interval(NamedTuple):
+    """A worktime of a single day, type is the index into WORKTYPES. Orders by start."""
+    start: int
+    end: int
+    type: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(minutes(data['start']), minutes(data['end']), data['type'])
+
+    def to_json(self):
+        return {'start': self.start, 'end': self.end, 'type': self.type}
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def shifted(self, delta):
+        return Interval(self.start + delta, self.end + delta, self.type)
+
+
+class OcdEvent(NamedTuple):
+    """An on call duty event, start and end in seconds since the epoch. Orders by start."""
+    start: int
+    end: int
+    comments: str = ''
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['start'], data['end'], data.get('comments', ''))
+
+    def to_json(self):
+        return {'start': self.start, 'end': self.end, 'comments': self.comments}
+
+    def start_datetime(self):
+        return datetime.fromtimestamp(self.start)
+
+    def end_datetime(self):
+        return datetime.fromtimestamp(self.end)
@@ -0,0 +1,94 @@
+"""Append-only journal of edits that are not folded into the store yet.
+
+Every edit is appended as one JSON line naming a Store write method and its arguments. The methods replace a
+whole row set (a day's worktimes, a month's OCD events, ...), so replaying an entry twice is harmless and a
+journal left behind by a crash can simply be compacted again on the next start.
+
+A compaction first moves the journal aside and starts an empty one, edits appended meanwhile go to the new journal.
+So compact may run on another thread than append, with a store connection of that thread.
+"""
+import os
+import json
+import threading
+
+from balance import minutes_from_hm
+from instrumentation import get_logger
+
+JOURNAL_FILENAME = 'journal.jsonl'
+
+log = get_logger("journal")
+
+# Store methods an entry may name
+OPERATIONS = {"save_workdays", "save_worktimes", "set_action", "save_ocd", "save_usuals", "set_balance",
+              "save_generated"}
+
+
+class Journal:
+    def __init__(self, path):
+        self._path = path
+        # the entries being applied by compact, left behind if that failed
+        self._compacting = path + '.compacting'
+        # guards the file append writes to, and makes compactions wait for each other
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def append(self, op, *args):
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown journal operation {op}")
+        line = json.dumps({"op": op, "args": args}) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    @staticmethod
+    def _read(path):
+        entries = []
+        if not os.path.exists(path):
+            return entries
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # torn last line of an interrupted append
+                    log.warning("Skipping incomplete journal entry %r", line)
+                    break
+        return entries
+
+    def entries(self):
+        """Entries not in the store yet, oldest first."""
+        return self._read(self._compacting) + self._read(self._path)
+
+    def compact(self, store):
+        """Apply the journal to store in one transaction, then replace it by an empty one. Returns the entry count."""
+        with self._compact_lock:
+            count = 0
+            if os.path.exists(self._compacting):
+                # left by a compaction that failed, older than everything in the journal
+                count += self._apply(store)
+            with self._lock:
+                if os.path.getsize(self._path) == 0:
+                    return count
+                # the file has to be closed before it can be moved on Windows
+                self._file.close()
+                os.replace(self._path, self._compacting)
+                self._file = open(self._path, 'a', encoding='utf-8')
+            return count + self._apply(store)
+
+    def _apply(self, store):
+        entries = self._read(self._compacting)
+        with store.transaction():
+            for entry in entries:
+                args = entry["args"]
+                if entry["op"] == "set_balance" and len(args) == 4:
+                    # journaled as hours and minutes before the ledger was kept in minutes
+                    args = [*args[:2], minutes_from_hm(*args[2:])]
+                if entry["op"] in OPERATIONS:
+                    getattr(store, entry["op"])(*args)
+        os.remove(self._compacting)
+        return len(entries)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -1,39 +1,41 @@
 import sys
 import os
-import glob
-import json
-from calendar import monthrange
-import xlwings as xw
-import random
-import copy
+import logging
+import argparse
+import importlib
+import threading
+import dataclasses
+import sqlite3
+import multiprocessing
+from datetime import date
 from PyQt6 import uic
-from PyQt6.QtCore import QSettings, QStringListModel, QAbstractListModel, QModelIndex, Qt, QDateTime, QTime, \
-    QItemSelectionModel, QDate, QSignalBlocker, QStandardPaths
+from PyQt6.QtCore import QSettings, QStringListModel, Qt, QDateTime, QTime, \
+    QItemSelectionModel, QSignalBlocker, QStandardPaths, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from PyQt6.QtWidgets import (QMainWindow, QDialog ,QPushButton, QApplication, QTimeEdit,
                              QMessageBox, QLineEdit, QLabel, QComboBox, QDateTimeEdit,
                              QCheckBox, QFileDialog, QSpinBox, QFileDialog,
-                             QRadioButton, QGroupBox, QListView)
-
-# Structure constants
-PLAN_DAYTYPE_COL = 'D'
-PLAN_ABSENCE_COL = 'B'
-PLAN_DAYOFMONTH_COL = 'A'
-PLAN_WEEKDAY_COL = 'C'
-PLAN_STARTING_ROW = 13
-WORKTIME_TYPE_COL = 'C'
-WORKTIME_START_DAY_COL = 'D'
-WORKTIME_START_TIME_COL = 'E'
-WORKTIME_END_DAY_COL = 'F'
-WORKTIME_END_TIME_COL = 'G'
-WORKTIME_COMMENTS_COL = 'J'
-WORKTIME_STARTING_ROW = 10
-WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-WORKTYPES = ["Office Hours", "Remote Work", "Overtime (paid)", "Overtime (time compensated)"]
-
-ACTIONS = ["Working usual times", "Working custom times", "Vacation", "Half Day Vacation", "Sick", "Shift Compensation", "Flexible Time Comp."]
-
-# Jitter config (± minutes) applied to all usual worktime items
-RANDOM_OFFSET_MINUTES = 30
+                             QRadioButton, QGroupBox, QListView, QProgressBar, QInputDialog, QTableView)
+from config import APP_NAME, APP_VERSION, config_dir, config_path
+from instrumentation import get_logger, setup_logging, span
+from models import WeekdayUsualsList, WorktimeListModel, OnCallDutyList, Workdays
+from backends import BACKENDS, ExcelSession, XlwingsBackend, create_backend
+from workday_cache import WorkdayCache
+from workcalendar import HOLIDAYS_FILENAME, WorkCalendar, compare_working_days, load_rules
+from store import Store, open_store
+from journal import JOURNAL_FILENAME, Journal
+from balance import BalanceRules, hm_from_minutes, minutes_from_hm
+from intervals import Interval, OcdEvent, format_hm
+from overlaps import build_index, day_period
+from overview import YearOverviewModel, summarize_month
+from generator import (ACTIONS, WEEKDAYS, WORKTYPES, GenerationCancelled, MonthPlan, MonthSnapshot,
+                       TemplateNotRecalculated, find_template, generate_record, read_working_days)
+
+log = get_logger("gui")
+
+# Quiet time after the last edit before the journal is folded into the store
+JOURNAL_COMPACT_DELAY_MS = 2000
+# Quiet time after the last change before the expected outcome of a generation is simulated again
+SIMULATION_DELAY_MS = 300
 
 
 def resource_path(relative_path):
@@ -45,371 +47,106 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
-def config_path(config_fn):
-    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppConfigLocation), config_fn)
-
-
-# Helper to clamp QTime within valid day range (00:00..23:59)
-def clamp_qtime(t: QTime) -> QTime:
-    """Clamp QTime to the range 00:00..23:59 to avoid wrapping across days when applying offsets."""
-    base = QTime(0, 0)
-    secs = base.secsTo(t)
-    if secs < 0:
-        secs = 0
-    max_secs = 23 * 3600 + 59 * 60
-    if secs > max_secs:
-        secs = max_secs
-    return base.addSecs(secs)
-
-class WeekdayUsualsList(QAbstractListModel):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self._work_times = dict()  # 0 = Monday, 1 = Tuesday, etc
-        self._weekday = None
-
-    def set_weekday(self, weekday):
-        self.beginResetModel()
-        self._weekday = str(weekday)
-        if self._weekday not in self._work_times:
-            print(f"{self._weekday} is not a there{self._work_times}")
-            self._work_times[self._weekday] = list()
-        self.endResetModel()
-
-    def get_total(self):
-        total_seconds = 0
-        if self._weekday is not None:
-            for t in self._work_times[self._weekday]:
-                delta = t["start"].secsTo(t["end"])
-                total_seconds += delta
-        return total_seconds
-
-
-    def __iter__(self):
-        return iter(self._work_times[self._weekday])
-
-    def __getitem__(self, i):
-        return self._work_times[self._weekday][i]
-
-    def __len__(self):
-        if self._weekday is None:
-            return 0
-        return len(self._work_times[self._weekday])
-
-    def rowCount(self, parent=None):
-        if self._weekday is None:
-            return 0
-        return len(self._work_times[self._weekday])
-
-    def data(self, index, role):
-        data = self._work_times[self._weekday][index.row()]
-        if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
-            return f"{data['start'].toString('HH:mm')} - {data['end'].toString('HH:mm')} {WORKTYPES[data['type']]}"
-        elif role == Qt.ItemDataRole.UserRole:
-            return data
-
-    def removeRow(self, index):
-        self.beginRemoveRows(QModelIndex(), index, index)
-        del self._work_times[self._weekday][index]
-        self.endRemoveRows()
-
-    def find(self, day_of_week_index):
-        return self._work_times[str(day_of_week_index)]
-
-    def add_work_time(self, work_time):
-        index = QModelIndex()
-        self.beginInsertRows(index, self.rowCount(index), self.rowCount(index))
-        self._work_times[self._weekday].append(work_time)
-        self._work_times[self._weekday].sort(key=lambda x: x["start"], reverse=False)
-        self.endInsertRows()
-
-    def modify_work_time(self, index, work_time):
-        self.beginResetModel()
-        self._work_times[self._weekday][index.row()] = work_time
-        self._work_times[self._weekday].sort(key=lambda x: x["start"], reverse=False)
-        self.endResetModel()
-
-    def getUsuals(self):
-        print("getUsuals")
-        transformed_data = {}
-        for key, value_list in self._work_times.items():
-            transformed_value_list = []
-            for time_dict in value_list:
-                transformed_time_dict = {
-                    'start': {'hour': time_dict['start'].hour(), 'min': time_dict['start'].minute()},
-                    'end': {'hour': time_dict['end'].hour(), 'min': time_dict['end'].minute()},
-                    'type': time_dict['type']
-                }
-                transformed_value_list.append(transformed_time_dict)
-            transformed_data[key] = transformed_value_list
-        return transformed_data
-
-    def setUsuals(self, data):
-        self.beginResetModel()
-        self._work_times = {}
-        print("setUsuals")
-        for key, value_list in data.items():
-            original_value_list = []
-            for time_dict in value_list:
-                original_time_dict = {
-                    'start': QTime(time_dict['start']['hour'], time_dict['start']['min']),
-                    'end': QTime(time_dict['end']['hour'], time_dict['end']['min']),
-                    'type': time_dict['type']
-                }
-                original_value_list.append(original_time_dict)
-            original_value_list.sort(key=lambda x: x["start"], reverse=False)
-            self._work_times[key] = original_value_list
-        self.endResetModel()
-
-
-class WorktimeListModel(QAbstractListModel):
-    def __init__(self, work_times=None, parent=None):
-        super().__init__(parent)
-        if work_times is None:
-            self._work_times = list()
-        else:
-            self._work_times = [{
-                'start': QTime(x['start']['h'], x['start']['m']),
-                'end': QTime(x['end']['h'], x['end']['m']),
-                'type': x['type']
-            } for x in work_times]
-
-    def __iter__(self):
-        return iter(self._work_times)
-
-    def __getitem__(self, i):
-        return self._work_times[i]
-
-    def __len__(self):
-        return len(self._work_times)
-
-    def rowCount(self, parent=None):
-        return len(self._work_times)
-
-    def data(self, index, role):
-        if 0 <= index.row() < len(self._work_times):
-            data = self._work_times[index.row()]
-            if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
-                return f"{data['start'].toString('HH:mm')} - {data['end'].toString('HH:mm')} {WORKTYPES[data['type']]}"
-            elif role == Qt.ItemDataRole.UserRole:
-                return data
-        else:
-            print("Something went wrong")
-
-    def get_total(self):
-        total_seconds = 0
-        for t in self._work_times:
-            delta = t["start"].secsTo(t["end"])
-            total_seconds += delta
-        return total_seconds
-
-    def removeRow(self, index):
-        self.beginRemoveRows(QModelIndex(), index, index)
-        del self._work_times[index]
-        self.endRemoveRows()
-
-    def getData(self):
-        items = [{
-                    'start': dict({'h': x['start'].hour(), 'm': x['start'].minute()}),
-                    'end': dict({'h': x['end'].hour(), 'm': x['end'].minute()}),
-                    'type': x['type']
-                  } for x in self._work_times]
-        return items
-
-    def getWorkTimes(self):
-        return self._work_times
-
-    def addItem(self, data):
-        index = QModelIndex()
-        self.beginInsertRows(index, self.rowCount(index), self.rowCount(index))
-        self._work_times.append(data)
-        self._work_times.sort(key=lambda x: x["start"], reverse=False)
-        self.endInsertRows()
-
-    def modifyItem(self, index, data):
-        self.beginResetModel()
-        self._work_times[index.row()] = data
-        self._work_times.sort(key=lambda x: x["start"], reverse=False)
-        self.endResetModel()
-
-class OnCallDutyList(QAbstractListModel):
-
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self._events = list()
-
-    def __iter__(self):
-        return iter(self._events)
-
-    def __getitem__(self, i):
-        return self._events[i]
-
-    def __len__(self):
-        return len(self._events)
-
-    def rowCount(self, parent=None):
-        return len(self._events)
-
-    def data(self, index, role):
-        event = self._events[index.row()]
-        if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
-            return f"{event['start'].toString('dd.MM HH:mm')} - {event['end'].toString('dd.MM HH:mm')}\t{event['comments']}"
-        elif role == Qt.ItemDataRole.UserRole:
-            return event
-
-    def removeRow(self, index):
-        self.beginRemoveRows(QModelIndex(), index, index)
-        del self._events[index]
-        self.endRemoveRows()
-
-    def find(self, day_of_month):
-        return [item for item in self._events if item["start"].date().day() == day_of_month] or None
-
-    def clear(self):
-        self.beginResetModel()
-        self._events.clear()
-        self.endResetModel()
-
-    def addEvent(self, event):
-        index = QModelIndex()
-        self.beginInsertRows(index, self.rowCount(index), self.rowCount(index))
-        self._events.append(event)
-        self._events.sort(key=lambda x: x["start"], reverse=False)
-        self.endInsertRows()
-
-    def modifyEvent(self, index, data):
-        self.beginResetModel()
-        self._events[index.row()] = data
-        self._events.sort(key=lambda x: x["start"], reverse=False)
-        self.endResetModel()
-
-    def setEvents(self, data):
-        self.beginResetModel()
-        self._events = [{'start': QDateTime.fromSecsSinceEpoch(item['start']), 'end': QDateTime.fromSecsSinceEpoch(item['end']), 'comments': item['comments']} for item in
-                 data]
-        self._events.sort(key=lambda x: x["start"], reverse=False)
-        self.endResetModel()
-
-    def getEvents(self):
-        items = [{'start': item['start'].toSecsSinceEpoch(), 'end': item['end'].toSecsSinceEpoch(), 'comments': item['comments']} for item in
-                 self._events]
-        return items
-
-
-class Workdays(QAbstractListModel):
-
-    def __init__(self, workdays_spreadsheet, workdays_saved, month, year, parent=None):
-        super().__init__(parent)
-        self._workdays = list()
-        for i, value in enumerate(workdays_spreadsheet):
-            if workdays_saved is None:
-                dict_item = {
-                    "dayOfMonth": value["dayOfMonth"],
-                    "dayOfWeek": value["dayOfWeek"],
-                    "action": 0,  # working...vacation, sick, etc
-                    "worktimes": WorktimeListModel()
-                }
-            else:
-                value_from_saved = next((item for item in workdays_saved if item.get('dayOfMonth') == value["dayOfMonth"]), None)
-                if value_from_saved is None or value["dayOfWeek"] != value_from_saved["dayOfWeek"]:
-                    print("Something went wrong")
-                    exit(1)
-                dict_item = {
-                    "dayOfMonth": value["dayOfMonth"],
-                    "dayOfWeek": value["dayOfWeek"],
-                    "action": value_from_saved['action'],  # working...vacation, sick, etc
-                    "worktimes": WorktimeListModel(value_from_saved['worktimes'])
-                }
-            self._workdays.append(dict_item)
-
-        self._month = month
-        self._year = year
-
-    def __iter__(self):
-        return iter(self._workdays)
-
-    def __getitem__(self, i):
-        return self._workdays[i]
-
-    def __len__(self):
-        return len(self._workdays)
-
-    def rowCount(self, parent=None):
-        return len(self._workdays)
-
-    def data(self, index, role):
-        day = self._workdays[index.row()]
-        if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
-            return f"{day['dayOfMonth']}\t{day['dayOfWeek']}"
-        elif role == Qt.ItemDataRole.UserRole:
-            return day
-
-    def setAction(self, index, action):
-        self._workdays[index.row()]["action"] = action
-        print(self._workdays[index.row()])
-
-    def getWorktimeList(self, index):
-        return self._workdays[index.row()]["worktimes"]
-
-    def find(self, day_of_month):
-        return next((item for item in self._workdays if item["dayOfMonth"] == day_of_month), None)
-
-    def numberOfUsuals(self):
-        return sum(1 for item in self._workdays if item["action"] == 0)
-
-    def getData(self):
-        items = [
-            {
-                'dayOfMonth': x['dayOfMonth'],
-                'dayOfWeek': x['dayOfWeek'],
-                'action': x['action'],
-                'worktimes': x['worktimes'].getData()
-            } for x in self._workdays]
-        return items
+
+def setup_ui(widget, name):
+    """Set up widget from the form compiled by build_ui.py, or from name.ui when it was not compiled."""
+    try:
+        module = importlib.import_module(f"ui_{name}")
+    except ImportError:
+        uic.loadUi(resource_path(f"{name}.ui"), widget)
+        return
+    form = next(cls for attr, cls in vars(module).items() if attr.startswith("Ui_"))()
+    form.setupUi(widget)
+    # like uic.loadUi, make the named child widgets attributes of widget
+    for attr, value in vars(form).items():
+        setattr(widget, attr, value)
+
+def set_view_model(view, model):
+    """Show model in view. setModel leaves the selection model of the previous model to the view, it is dropped here."""
+    selection_model = view.selectionModel()
+    view.setModel(model)
+    if selection_model is not None:
+        selection_model.deleteLater()
+
+
+def confirmConflicts(parent, conflicts):
+    """Ask whether to save despite overlapping entries, True if there are none."""
+    if not conflicts:
+        return True
+    reply = QMessageBox.question(parent, "Overlap", "Overlaps with:\n" + "\n".join(e.describe() for e in conflicts)
+                                 + "\n\nSave anyway?",
+                                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                 QMessageBox.StandardButton.No)
+    return reply == QMessageBox.StandardButton.Yes
+
 
 class WorkTimeDialog(QDialog):
     def __init__(self, parent=None, initialData=None):
         super(WorkTimeDialog, self).__init__(parent)
         # load ui
-        uic.loadUi(resource_path("worktime.ui"), self)
+        setup_ui(self, "worktime")
         self.startTimeEdit = self.findChild(QTimeEdit, "timeEditEventStart")
         self.endTimeEdit = self.findChild(QTimeEdit, "timeEditEventEnd")
         self.comboBoxWorkTypes = self.findChild(QComboBox, "comboBoxWorkTypes")
         self.comboBoxWorkTypes.addItems(WORKTYPES)
-
-        if initialData is not None:
-            self.startTimeEdit.setTime(initialData["start"])
-            self.endTimeEdit.setTime(initialData["end"])
-            self.comboBoxWorkTypes.setCurrentIndex(initialData["type"])
+        self.defaultStart = self.startTimeEdit.time()
+        self.defaultEnd = self.endTimeEdit.time()
+        # conflicts(worktime) returns the entries it would overlap, None to not check
+        self.conflicts = None
+        self.reset(initialData)
+
+    def reset(self, initialData=None):
+        """Show initialData, or the defaults of a new work time, when the dialog is reused."""
+        if initialData is None:
+            self.startTimeEdit.setTime(self.defaultStart)
+            self.endTimeEdit.setTime(self.defaultEnd)
+            self.comboBoxWorkTypes.setCurrentIndex(0)
+        else:
+            self.startTimeEdit.setTime(QTime(*divmod(initialData.start, 60)))
+            self.endTimeEdit.setTime(QTime(*divmod(initialData.end, 60)))
+            self.comboBoxWorkTypes.setCurrentIndex(initialData.type)
 
     def get_worktime(self):
-        return dict({"start": self.startTimeEdit.time(), "end": self.endTimeEdit.time(), "type": self.comboBoxWorkTypes.currentIndex()})
+        start = self.startTimeEdit.time()
+        end = self.endTimeEdit.time()
+        return Interval(start.hour() * 60 + start.minute(), end.hour() * 60 + end.minute(), self.comboBoxWorkTypes.currentIndex())
+
+    def accept(self):
+        if self.conflicts is None or confirmConflicts(self, self.conflicts(self.get_worktime())):
+            self.done(1)
 
 
 class OnCallDutyDialog(QDialog):
     def __init__(self, parent=None, initialData=None):
         super(OnCallDutyDialog, self).__init__(parent)
         # load ui
-        uic.loadUi(resource_path("ocd.ui"), self)
+        setup_ui(self, "ocd")
         self.startTimeEdit = self.findChild(QDateTimeEdit, "dateTimeEditEventStart")
         self.endTimeEdit = self.findChild(QDateTimeEdit, "dateTimeEditEventEnd")
         self.commentsEdit = self.findChild(QLineEdit, "lineEditComments")
         self.durationEdit = self.findChild(QLineEdit, "lineEditDuration")
         self.pushButtonCalcEventEnd = self.findChild(QPushButton, "pushButtonCalcEventEnd")
         self.pushButtonCalcEventEnd.clicked.connect(self.calculateEndTime)
-
+        self.defaultEnd = self.endTimeEdit.dateTime()
+        # conflicts(event) returns the entries it would overlap, None to not check
+        self.conflicts = None
+        self.reset(initialData)
+
+    def reset(self, initialData=None):
+        """Show initialData, or the defaults of a new event, when the dialog is reused."""
+        self.durationEdit.clear()
         if initialData is None:
             self.startTimeEdit.setDateTime(QDateTime.currentDateTime())
+            self.endTimeEdit.setDateTime(self.defaultEnd)
+            self.commentsEdit.clear()
         else:
-            self.startTimeEdit.setDateTime(initialData["start"])
-            self.endTimeEdit.setDateTime(initialData["end"])
-            self.commentsEdit.setText(initialData["comments"])
+            self.startTimeEdit.setDateTime(QDateTime.fromSecsSinceEpoch(initialData.start))
+            self.endTimeEdit.setDateTime(QDateTime.fromSecsSinceEpoch(initialData.end))
+            self.commentsEdit.setText(initialData.comments)
 
     def get_ocd(self):
-        ocd = dict()
-        ocd['start'] = self.startTimeEdit.dateTime()
-        ocd['end'] = self.endTimeEdit.dateTime()
-        ocd['comments'] = self.commentsEdit.text()
-        return ocd
+        return OcdEvent(self.startTimeEdit.dateTime().toSecsSinceEpoch(), self.endTimeEdit.dateTime().toSecsSinceEpoch(),
+                        self.commentsEdit.text())
 
     def calculateEndTime(self):
         startTime = self.startTimeEdit.dateTime()
@@ -421,7 +158,7 @@ class OnCallDutyDialog(QDialog):
 
     def inputCheck(self):
         if self.endTimeEdit.dateTime() > self.startTimeEdit.dateTime():
-            return True
+            return self.conflicts is None or confirmConflicts(self, self.conflicts(self.get_ocd()))
         else:
             QMessageBox.information(None, "Warning!", "End time must be greater than start time.")
             return False
@@ -432,43 +169,69 @@ class OnCallDutyDialog(QDialog):
             self.done(1)  # Only accept the dialog if all inputs are valid
 
 
-def distribute_minutes(size, total_min, total_max, max_value):
-    if total_min > total_max:
-        raise ValueError("total_min cannot be greater than total_max.")
+class YearOverviewDialog(QDialog):
+    """The days of a year at a glance, double-clicking a day opens it in the main window."""
+
+    def __init__(self, parent, load_month, year):
+        super(YearOverviewDialog, self).__init__(parent)
+        setup_ui(self, "overview")
+        self.model = YearOverviewModel(load_month, year, self)
+        self.spinBoxYear = self.findChild(QSpinBox, "spinBoxYear")
+        self.spinBoxYear.setValue(year)
+        self.spinBoxYear.valueChanged.connect(self.model.setYear)
+        self.findChild(QPushButton, "pushButtonPreviousYear").clicked.connect(lambda: self.spinBoxYear.stepBy(-1))
+        self.findChild(QPushButton, "pushButtonNextYear").clicked.connect(lambda: self.spinBoxYear.stepBy(1))
+        self.tableView = self.findChild(QTableView, "tableViewOverview")
+        self.tableView.setModel(self.model)
+        self.tableView.horizontalHeader().setDefaultSectionSize(44)
+        self.tableView.verticalHeader().setDefaultSectionSize(36)
+
 
-    total = random.randint(total_min, total_max)
-    print(f"total: {total}")
+class WorkerSignals(QObject):
+    progress = pyqtSignal(str, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
 
-    if size * max_value < total:
-        raise ValueError("It's not possible to distribute the total minutes within working days")
 
-    result = [0] * size
+class Worker(QRunnable):
+    """Runs fn(progress, is_cancelled) on a thread pool and reports the outcome through signals."""
 
-    for i in range(size):
-        # Calculate the max possible value to ensure total isn't exceeded
-        max_val = min(max_value, total - sum(result) - (size - i - 1))
-        if max_val > 0:
-            result[i] = random.randint(0, max_val)
+    def __init__(self, fn):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
 
-    # Adjust the final list to ensure the sum equals total
-    while sum(result) != total:
-        diff = total - sum(result)
-        index = random.randint(0, size - 1)
-        adjustment = min(diff, max_value - result[index])
-        result[index] += adjustment
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        try:
+            result = self.fn(self.signals.progress.emit, self._cancelled.is_set)
+        except GenerationCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            log.exception("Background task failed")
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
 
-    return result
 
 class MainWindow(QMainWindow):
 
-    def __init__(self,parent=None):
+    def __init__(self, parent=None, backend=None):
         super(MainWindow,self).__init__(parent)
-        uic.loadUi(resource_path("wt.ui"), self)
+        setup_ui(self, "wt")
 
-        if not os.path.isdir(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppConfigLocation)):
-            os.mkdir(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppConfigLocation))
+        os.makedirs(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppConfigLocation), exist_ok=True)
 
         self.balance = {}
+        # dialogs are created on first use and reused afterwards
+        self.workTimeDialog = None
+        self.onCallDutyDialog = None
+        self.yearOverviewDialog = None
 
         self.firstNameEdit = self.findChild(QLineEdit, "lineEditFirstName")
         self.lastNameEdit = self.findChild(QLineEdit, "lineEditLastName")
@@ -497,6 +260,35 @@ class MainWindow(QMainWindow):
 
         # Load resources, settings, etc
         self.loadSettings()
+        self.backendOverride = backend
+        self.excelSession = ExcelSession()
+        # a single long-lived thread, Excel must always be driven from the same thread
+        self.workerPool = QThreadPool(self)
+        self.workerPool.setMaxThreadCount(1)
+        self.workerPool.setExpiryTimeout(-1)
+        self.worker = None
+        self.prewarmWorker = None
+        self.workdayCache = WorkdayCache(config_path('workdays-cache.json'))
+        self.calendar = self.workCalendar()
+        self.store = open_store()
+        # OCD events and planned worktimes of all months, to find overlaps
+        self.overlaps = build_index(self.store)
+        # edits are journaled right away and folded into the store once they stop coming in
+        self.journal = Journal(config_path(JOURNAL_FILENAME))
+        self.compactTimer = QTimer(self)
+        self.compactTimer.setSingleShot(True)
+        self.compactTimer.setInterval(JOURNAL_COMPACT_DELAY_MS)
+        self.compactTimer.timeout.connect(self.compactJournalInBackground)
+        # the timed compactions run on a thread of their own, with a store connection of that thread
+        self.compactPool = QThreadPool(self)
+        self.compactPool.setMaxThreadCount(1)
+        self.compactPool.setExpiryTimeout(-1)
+        self.compactStore = None
+        self.compactWorker = None
+        self.simulateTimer = QTimer(self)
+        self.simulateTimer.setSingleShot(True)
+        self.simulateTimer.setInterval(SIMULATION_DELAY_MS)
+        self.simulateTimer.timeout.connect(self.simulateMonth)
         self.loadBalanceConfiguration()
         self.loadOCD()
 
@@ -506,6 +298,18 @@ class MainWindow(QMainWindow):
         self.spinBoxBalanceHours.valueChanged.connect(self.balanceChanged)
         self.spinBoxBalanceMinutes.valueChanged.connect(self.balanceChanged)
 
+        self.labelMonthSummary = self.findChild(QLabel, "labelMonthSummary")
+        self.spinBoxBalanceHours.valueChanged.connect(lambda: self.updateMonthSummary())
+        self.spinBoxBalanceMinutes.valueChanged.connect(lambda: self.updateMonthSummary())
+        for signal in (self.ocdModel.rowsInserted, self.ocdModel.rowsRemoved, self.ocdModel.dataChanged,
+                       self.ocdModel.modelReset):
+            signal.connect(lambda: self.updateMonthSummary())
+
+        self.labelSimulation = self.findChild(QLabel, "labelSimulation")
+        # every edit is journaled and schedules a simulation as well, the corrections are no edits
+        for spinBox in (self.spinBoxTotalMin, self.spinBoxTotalMax, self.spinBoxMaxPerDay):
+            spinBox.valueChanged.connect(lambda: self.simulateTimer.start())
+
         self.listViewActions = self.findChild(QListView, "listViewActions")
         self.listViewActions.setModel(self.absence_items)
         self.listViewActions.selectionModel().selectionChanged.connect(self.actionChanged)
@@ -517,6 +321,7 @@ class MainWindow(QMainWindow):
         self.usualsModel.modelReset.connect(self.updateUsualsTotal)
         self.usualsModel.rowsInserted.connect(self.updateUsualsTotal)
         self.usualsModel.rowsRemoved.connect(self.updateUsualsTotal)
+        self.usualsModel.dataChanged.connect(self.updateUsualsTotal)
 
         self.listViewWorktimes = self.findChild(QListView, "listViewWorktimes")
         self.listViewWorktimes.setModel(self.customWorktimesModel)
@@ -559,38 +364,89 @@ class MainWindow(QMainWindow):
         self.pushButtonCreateSpreadsheet = self.findChild(QPushButton, "pushButtonCreateSpreadsheet")
         self.pushButtonCreateSpreadsheet.clicked.connect(lambda: self.createSpreadsheet())
 
+        self.pushButtonBatchGenerate = self.findChild(QPushButton, "pushButtonBatchGenerate")
+        self.pushButtonBatchGenerate.clicked.connect(lambda: self.batchGenerate())
+
+        self.pushButtonRegenerate = self.findChild(QPushButton, "pushButtonRegenerate")
+        self.pushButtonRegenerate.clicked.connect(lambda: self.createSpreadsheet(patch=True))
+
+        self.pushButtonYearOverview = self.findChild(QPushButton, "pushButtonYearOverview")
+        self.pushButtonYearOverview.clicked.connect(lambda: self.showYearOverview())
+
+        self.progressBar = QProgressBar()
+        self.progressBar.setMaximumWidth(150)
+        self.progressBar.hide()
+        self.statusBar().addPermanentWidget(self.progressBar)
+        self.pushButtonCancel = QPushButton("Cancel")
+        self.pushButtonCancel.clicked.connect(lambda: self.cancelWorker())
+        self.pushButtonCancel.hide()
+        self.statusBar().addPermanentWidget(self.pushButtonCancel)
+
         self.statusBar().showMessage('Application is initialized')
 
+        if self.prewarmExcel and (self.backendOverride or self.backendName) == XlwingsBackend.name:
+            self.startExcel()
+
+
+    def worktimeDialog(self, initialData=None, conflicts=None):
+        """The work time dialog of this window, created on first use and reset for every following one."""
+        if self.workTimeDialog is None:
+            self.workTimeDialog = WorkTimeDialog(self, initialData)
+        else:
+            self.workTimeDialog.reset(initialData)
+        self.workTimeDialog.conflicts = conflicts
+        return self.workTimeDialog
+
+    def ocdDialog(self, initialData=None):
+        """The OCD dialog of this window, created on first use and reset for every following one."""
+        if self.onCallDutyDialog is None:
+            self.onCallDutyDialog = OnCallDutyDialog(self, initialData)
+        else:
+            self.onCallDutyDialog.reset(initialData)
+        key = ("ocd", self.targetMonthSpin.value(), self.targetYearSpin.value())
+        self.onCallDutyDialog.conflicts = lambda event: self.overlaps.overlapping(event.start, event.end,
+                                                                                  exclude=(key, initialData))
+        return self.onCallDutyDialog
+
+    def dayWorktimeConflicts(self, initialData=None):
+        """Conflict check of the worktimes of the selected day, initialData is the worktime being edited."""
+        day = self.workDaysModel.data(self.workingDaysList.selectionModel().currentIndex(), Qt.ItemDataRole.UserRole)
+        day_date = date(self.current_target_year, self.current_target_month, day["dayOfMonth"])
+        return lambda worktime: self.overlaps.overlapping(*day_period(day_date, worktime),
+                                                          exclude=(("day", day_date), initialData))
 
     def editWorktime(self, item=None):
         data = self.customWorktimesModel.data(item, role=Qt.ItemDataRole.UserRole)
-        dialog = WorkTimeDialog(self, data)
+        dialog = self.worktimeDialog(data, self.dayWorktimeConflicts(data))
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            print(f"Editing worktime: {dialog.get_worktime()}")
+            log.debug("Editing worktime: %s", dialog.get_worktime())
             self.customWorktimesModel.modifyItem(item, dialog.get_worktime())
+            self.saveDayWorktimes()
         else:
-            print("Editing worktime cancelled")
+            log.debug("Editing worktime cancelled")
 
     def editOCD(self, item=None):
         data = self.ocdModel.data(item, role=Qt.ItemDataRole.UserRole)
-        dialog = OnCallDutyDialog(self, data)
+        dialog = self.ocdDialog(data)
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            print(f"Editing OCD: {dialog.get_ocd()}")
+            log.debug("Editing OCD: %s", dialog.get_ocd())
             self.ocdModel.modifyEvent(item, dialog.get_ocd())
+            self.saveOCD()
         else:
-            print("Editing OCD cancelled")
+            log.debug("Editing OCD cancelled")
 
     def editUsual(self, item=None):
         data = self.usualsModel.data(item, role=Qt.ItemDataRole.UserRole)
-        dialog = WorkTimeDialog(self, data)
+        dialog = self.worktimeDialog(data)
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            print(f"Editing usuals: {dialog.get_worktime()}")
+            log.debug("Editing usuals: %s", dialog.get_worktime())
             self.usualsModel.modify_work_time(item, dialog.get_worktime())
+            self.saveUsuals()
         else:
-            print("Editing usuals cancelled")
+            log.debug("Editing usuals cancelled")
 
     def saveSetting(self):
-        print("Save settings")
+        log.debug("Save settings")
         self.settings.setValue("firstName", self.firstNameEdit.text())
         self.settings.setValue("lastName", self.lastNameEdit.text())
         self.settings.setValue("groupName", self.groupNameEdit.text())
@@ -601,12 +457,36 @@ class MainWindow(QMainWindow):
         self.settings.setValue("totalMin", self.spinBoxTotalMin.value())
         self.settings.setValue("totalMax", self.spinBoxTotalMax.value())
         self.settings.setValue("maxPerDay", self.spinBoxMaxPerDay.value())
+        self.settings.setValue("transactionMode", self.transactionMode)
+        self.settings.setValue("backend", self.backendName)
+        self.settings.setValue("prewarmExcel", self.prewarmExcel)
+        self.settings.setValue("dailyTargetMinutes", self.dailyTargetMinutes)
+        self.settings.setValue("ocdFactor", self.ocdFactor)
+        self.settings.setValue("creditedActions", self.creditedActions)
+        self.settings.setValue("countedTypes", self.countedTypes)
+        self.settings.setValue("verifyBalance", self.verifyBalance)
+        self.settings.setValue("additionShape", self.additionShape)
+        self.settings.setValue("workingDaysSource", self.workingDaysSource)
+        self.settings.setValue("holidayRegion", self.holidayRegion)
+        self.settings.setValue("checkCalendar", self.checkCalendar)
 
 
     def loadSettings(self):
         self.settings = QSettings(config_path("Settings.ini"), QSettings.Format.IniFormat)
+        self.transactionMode = True
+        self.backendName = 'excel'
+        self.prewarmExcel = True
+        self.dailyTargetMinutes = BalanceRules.daily_target_minutes
+        self.ocdFactor = BalanceRules.ocd_factor
+        self.creditedActions = BalanceRules().settings()["creditedActions"]
+        self.countedTypes = BalanceRules().settings()["countedTypes"]
+        self.verifyBalance = True
+        self.additionShape = "uniform"
+        self.workingDaysSource = "calendar"
+        self.holidayRegion = "none"
+        self.checkCalendar = True
         try:
-            print("Load settings...")
+            log.debug("Load settings")
             self.firstNameEdit.setText(self.settings.value("firstName", "John", type=str))
             self.lastNameEdit.setText(self.settings.value("lastName", "Doe", type=str))
             self.groupNameEdit.setText(self.settings.value("groupName", "Black Magic", type=str))
@@ -618,24 +498,32 @@ class MainWindow(QMainWindow):
             self.spinBoxTotalMin.setValue(self.settings.value("totalMin", 0, type=int))
             self.spinBoxTotalMax.setValue(self.settings.value("totalMax", 0, type=int))
             self.spinBoxMaxPerDay.setValue(self.settings.value("maxPerDay", 0, type=int))
+            self.transactionMode = self.settings.value("transactionMode", True, type=bool)
+            self.backendName = self.settings.value("backend", "excel", type=str)
+            self.prewarmExcel = self.settings.value("prewarmExcel", True, type=bool)
+            self.dailyTargetMinutes = self.settings.value("dailyTargetMinutes", BalanceRules.daily_target_minutes, type=int)
+            self.ocdFactor = self.settings.value("ocdFactor", BalanceRules.ocd_factor, type=float)
+            self.creditedActions = self.settings.value("creditedActions", self.creditedActions, type=str)
+            self.countedTypes = self.settings.value("countedTypes", self.countedTypes, type=str)
+            self.verifyBalance = self.settings.value("verifyBalance", True, type=bool)
+            self.additionShape = self.settings.value("additionShape", "uniform", type=str)
+            self.workingDaysSource = self.settings.value("workingDaysSource", "calendar", type=str)
+            self.holidayRegion = self.settings.value("holidayRegion", "none", type=str)
+            self.checkCalendar = self.settings.value("checkCalendar", True, type=bool)
 
         except:
             pass
 
     def loadBalanceConfiguration(self):
-        balance_config = config_path('balance.json')
-        if not os.path.isfile(balance_config):
-            with open(balance_config, 'w') as f:
-                json.dump(dict(), f)
-        else:
-            with open(balance_config, 'r') as f:
-                self.balance = json.load(f)
+        self.balance = self.store.load_balance()
+        if self.balance:
             key = f"{self.targetMonthSpin.value()}.{self.targetYearSpin.value()}"
             if key in self.balance:
+                h, m = hm_from_minutes(self.balance[key])
                 with QSignalBlocker(self.spinBoxBalanceHours):
-                    self.spinBoxBalanceHours.setValue(self.balance[key]['h'])
+                    self.spinBoxBalanceHours.setValue(h)
                 with QSignalBlocker(self.spinBoxBalanceMinutes):
-                    self.spinBoxBalanceMinutes.setValue(self.balance[key]['m'])
+                    self.spinBoxBalanceMinutes.setValue(m)
             else:
                 with QSignalBlocker(self.spinBoxBalanceHours):
                     self.spinBoxBalanceHours.setValue(0)
@@ -644,98 +532,193 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.saveSetting()
-        self.saveUsuals()
-        self.saveWorktimes()
-        self.saveBalance()
-        print("Exit")
+        self.cancelWorker()
+        self.workerPool.start(self.excelSession.shutdown)
+        self.workerPool.waitForDone()
+        self.compactJournal()
+        self.compactPool.start(self.closeCompactStore)
+        self.compactPool.waitForDone()
+        self.journal.close()
+        self.store.close()
+        self.workdayCache.close()
+        log.info("Exit")
 
     def balanceChanged(self):
-        h = self.spinBoxBalanceHours.value()
-        m = self.spinBoxBalanceMinutes.value()
-        key = f"{self.targetMonthSpin.value()}.{self.targetYearSpin.value()}"
-        self.balance[key] = dict({"h": h, "m": m})
-        print(f"balanceChanged {h}:{m}")
+        minutes = minutes_from_hm(self.spinBoxBalanceHours.value(), self.spinBoxBalanceMinutes.value())
+        self.setBalance(f"{self.targetMonthSpin.value()}.{self.targetYearSpin.value()}", minutes)
+        log.debug("balanceChanged %s", format_hm(minutes))
+
+    def setBalance(self, key, minutes):
+        self.balance[key] = minutes
+        month, year = key.split(".")
+        self.journalEdit("set_balance", int(month), int(year), minutes)
 
 
     def targetChanged(self, item):
         self.loadOCD()
 
-        print(f"targetChanged {item}")
-        print(f"\tbalance: {self.balance}")
         key = f"{self.targetMonthSpin.value()}.{self.targetYearSpin.value()}"
-        print(f"\tkey: {key}")
+        log.debug("targetChanged %s, balance %s", key, self.balance.get(key))
         if key in self.balance:
-            print(f"\ttargetChanged with key {self.balance[key]['h']}:{self.balance[key]['m']}")
+            h, m = hm_from_minutes(self.balance[key])
             with QSignalBlocker(self.spinBoxBalanceHours):
-                self.spinBoxBalanceHours.setValue(self.balance[key]['h'])
-            self.spinBoxBalanceMinutes.setValue(self.balance[key]['m'])
+                self.spinBoxBalanceHours.setValue(h)
+            self.spinBoxBalanceMinutes.setValue(m)
         else:
-            print(f"\ttargetChanged with key zero")
             with QSignalBlocker(self.spinBoxBalanceHours):
                 self.spinBoxBalanceHours.setValue(0)
             self.spinBoxBalanceMinutes.setValue(0)
 
-    def saveWorktimes(self):
+        # months known without opening the template are loaded right away, others still need an explicit update
+        if self.worker is None and self.knownWorkingDays(self.targetMonthSpin.value(), self.targetYearSpin.value()) is not None:
+            self.updateWorkdays()
+
+    def journalEdit(self, op, *args):
+        """Record an edit in the journal, it reaches the store with the next compaction."""
+        self.journal.append(op, *args)
+        self.compactTimer.start()
+        self.simulateTimer.start()
+
+    def compactJournal(self):
+        """Bring the store up to date right away, for a read of the store. Waits for a compaction in the background."""
+        self.compactTimer.stop()
         try:
-            with open(config_path(f'worktimes-{self.current_target_month}-{self.current_target_year}.json'), 'w') as f:
-                json.dump(self.workDaysModel.getData(), f)
-        except:
-            print("Worktimes not saved...")
-            pass
+            count = self.journal.compact(self.store)
+        except (OSError, sqlite3.Error) as e:
+            self.compactionFailed(str(e))
+            return
+        self.journalCompacted(count)
 
-    def saveOCD(self):
-        with open(config_path(f'ocd-{self.targetMonthSpin.value()}-{self.targetYearSpin.value()}.json'), 'w') as f:
-            json.dump(self.ocdModel.getEvents(), f)
-        print("Saving OCD")
+    def compactJournalInBackground(self):
+        if self.compactWorker is not None:
+            # the edits since it started are compacted once it is done
+            self.compactTimer.start()
+            return
+        self.compactWorker = Worker(lambda progress, is_cancelled: self.journal.compact(self.openCompactStore()))
+        for signal, slot in ((self.compactWorker.signals.finished, self.journalCompacted),
+                             (self.compactWorker.signals.failed, self.compactionFailed)):
+            signal.connect(slot)
+            signal.connect(self.compactWorkerDone)
+        self.compactPool.start(self.compactWorker)
+
+    def compactWorkerDone(self, _):
+        self.compactWorker = None
+
+    def openCompactStore(self):
+        """The store connection of the compaction thread, opened by its first compaction."""
+        if self.compactStore is None:
+            self.compactStore = Store(self.store.path)
+        return self.compactStore
+
+    def closeCompactStore(self):
+        if self.compactStore is not None:
+            self.compactStore.close()
+            self.compactStore = None
+
+    def journalCompacted(self, count):
+        if count:
+            log.debug("Compacted %d journal entries", count)
+            if self.yearOverviewDialog is not None:
+                self.yearOverviewDialog.model.refresh()
+
+    def compactionFailed(self, message):
+        # the journal is kept as it is and compacted again after the next edit or on the next start
+        log.warning("Compacting the journal failed: %s", message)
+        self.statusBar().showMessage(f'Saving failed: {message}')
+
+    def loadMonthSummary(self, month, year):
+        return summarize_month(self.store.load_workdays(month, year), self.store.load_ocd(month, year),
+                               self.usualsModel.getUsuals())
+
+    def showYearOverview(self):
+        """Show the year overview, created on first use and kept for the next one."""
+        # the overview reads the store, bring it up to date first
+        self.compactJournal()
+        if self.yearOverviewDialog is None:
+            self.yearOverviewDialog = YearOverviewDialog(self, self.loadMonthSummary, self.targetYearSpin.value())
+            self.yearOverviewDialog.tableView.doubleClicked.connect(self.openOverviewDay)
+        else:
+            self.yearOverviewDialog.model.refresh()
+        self.yearOverviewDialog.show()
+        self.yearOverviewDialog.raise_()
+
+    def openOverviewDay(self, index):
+        cell = self.yearOverviewDialog.model.data(index, Qt.ItemDataRole.UserRole)
+        if cell is None or self.worker is not None:
+            return
+        day = cell[0]
+
+        def loaded():
+            return self.workDaysModel is not None and \
+                (self.current_target_month, self.current_target_year) == (day.month, day.year)
+
+        if not loaded():
+            # a single targetChanged for both
+            with QSignalBlocker(self.targetMonthSpin), QSignalBlocker(self.targetYearSpin):
+                self.targetMonthSpin.setValue(day.month)
+                self.targetYearSpin.setValue(day.year)
+            self.targetChanged(None)
+            if self.worker is None and not loaded():
+                self.updateWorkdays()
+        if loaded():
+            row = self.workDaysModel.rowOf(day.day)
+            if row is not None:
+                self.workingDaysList.selectionModel().setCurrentIndex(self.workDaysModel.index(row),
+                                                                      QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        self.activateWindow()
+
+    def saveWorktimes(self):
+        if self.workDaysModel is None:
+            return
+        workdays = self.workDaysModel.getData()
+        self.journalEdit("save_workdays", self.current_target_month, self.current_target_year, workdays)
+        self.overlaps.set_workdays(self.current_target_month, self.current_target_year, workdays,
+                                   self.usualsModel.getUsuals())
+
+    def saveDayWorktimes(self):
+        index = self.workingDaysList.selectionModel().currentIndex()
+        day = self.workDaysModel.data(index, Qt.ItemDataRole.UserRole)
+        self.journalEdit("save_worktimes", self.current_target_month, self.current_target_year, day["dayOfMonth"],
+                         day["worktimes"])
+        self.indexWorkday(day)
+
+    def indexWorkday(self, day):
+        """Bring the planned worktimes of a day of the loaded month up to date in the overlap index."""
+        self.overlaps.set_workday(self.current_target_month, self.current_target_year,
+                                  day, self.usualsModel.getUsuals())
 
-    def saveBalance(self):
-        with open(config_path('balance.json'), 'w') as f:
-            json.dump(self.balance, f)
-        print("Saving balance")
+    def saveOCD(self):
+        events = self.ocdModel.getEvents()
+        self.journalEdit("save_ocd", self.targetMonthSpin.value(), self.targetYearSpin.value(), events)
+        self.overlaps.set_ocd(self.targetMonthSpin.value(), self.targetYearSpin.value(), events)
+        log.debug("Saving OCD")
 
     def saveUsuals(self):
-        with open(config_path('usuals.json'), 'w') as f:
-            json.dump(self.usualsModel.getUsuals(), f)
+        usuals = self.usualsModel.getUsuals()
+        self.journalEdit("save_usuals", usuals)
+        # the usuals are planned on every usual day of every month
+        self.overlaps.set_usuals(usuals)
 
     def loadOCD(self):
-        fn = config_path(f'ocd-{self.targetMonthSpin.value()}-{self.targetYearSpin.value()}.json')
-        print(fn)
-        if os.path.isfile(fn):
-            try:
-                with open(fn, 'r') as f:
-                    self.ocdModel.setEvents(json.load(f))
-                    print("Loaded OCD")
-            except Exception:
-                print("Error loading OCD")
-                pass
-        else:
-            self.ocdModel.clear()
+        self.compactJournal()
+        self.ocdModel.setEvents(self.store.load_ocd(self.targetMonthSpin.value(), self.targetYearSpin.value()))
+        log.debug("Loaded OCD")
 
     def loadUsuals(self):
-        try:
-            with open(config_path('usuals.json'), 'r') as f:
-                self.usualsModel.setUsuals(json.load(f))
-        except Exception:
-            pass
+        self.usualsModel.setUsuals(self.store.load_usuals())
 
     def loadWorktimes(self):
-        fn = config_path(f'worktimes-{self.targetMonthSpin.value()}-{self.targetYearSpin.value()}.json')
-        if os.path.isfile(fn):
-            try:
-                with open(fn, 'r') as f:
-                    return json.load(f)
-            except Exception:
-                return None
-        else:
-            return None
+        self.compactJournal()
+        return self.store.load_workdays(self.targetMonthSpin.value(), self.targetYearSpin.value())
 
     def addWorktimeUsual(self):
-        dialog = WorkTimeDialog(self)
+        dialog = self.worktimeDialog()
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            print("Adding usuals")
+            log.debug("Adding usuals")
             self.usualsModel.add_work_time(dialog.get_worktime())
+            self.saveUsuals()
         else:
-            print("Adding usuals cancelled")
+            log.debug("Adding usuals cancelled")
 
     def removeWorktimeUsual(self):
         reply = QMessageBox.question(self, "Message", "Really remove selected usual worktime?",
@@ -743,16 +726,17 @@ class MainWindow(QMainWindow):
                                      QMessageBox.StandardButton.Yes)
         if reply == QMessageBox.StandardButton.Yes:
             row = self.listViewWorktimeUsual.selectionModel().currentIndex().row()
-            print(f"Removing usuals {row}")
+            log.debug("Removing usuals %d", row)
             self.listViewWorktimeUsual.model().removeRow(row)
+            self.saveUsuals()
 
     def addOCD(self):
-        dialog = OnCallDutyDialog(self)
+        dialog = self.ocdDialog()
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            print(f"Adding OCD: {dialog.get_ocd()}")
+            log.debug("Adding OCD: %s", dialog.get_ocd())
             self.ocdModel.addEvent(dialog.get_ocd())
         else:
-            print("Adding OCD cancelled")
+            log.debug("Adding OCD cancelled")
 
     def removeOCD(self):
         reply = QMessageBox.question(self, "Message", "Really remove selected ocd?",
@@ -760,28 +744,26 @@ class MainWindow(QMainWindow):
                                      QMessageBox.StandardButton.Yes)
         if reply == QMessageBox.StandardButton.Yes:
             row = self.listViewOCD.selectionModel().currentIndex().row()
-            print(f"Removing OCD {row}")
+            log.debug("Removing OCD %d", row)
             self.listViewOCD.model().removeRow(row)
 
     def selectWorkingDir(self):
         working_path = QFileDialog.getExistingDirectory(self, 'Select Folder')
         self.workingPathEdit.setText(working_path)
-        print(working_path)
+        log.debug("Working path %s", working_path)
 
     def workingDayChanged(self, selected_item, deselected_item):
         if selected_item.indexes():
             item = self.workDaysModel.data(selected_item.indexes()[0], Qt.ItemDataRole.UserRole)
-            print(f"workingDayChanged: {selected_item.indexes()[0].row()} - {item}")
+            log.debug("workingDayChanged: %d - %s", selected_item.indexes()[0].row(), item)
             # action list view
             self.listViewActions.setEnabled(True)
             self.listViewActions.selectionModel().clear()
 
             # worktimes list view
-            self.listViewWorktimes.setModel(item["worktimes"])
-            self.listViewWorktimes.model().modelReset.connect(self.updateTotal)
-            self.listViewWorktimes.model().rowsInserted.connect(self.updateTotal)
-            self.listViewWorktimes.model().rowsRemoved.connect(self.updateTotal)
-            self.customWorktimesModel = item["worktimes"]
+            # the total follows the worktimes through workDaysModel.worktimesChanged
+            self.customWorktimesModel = self.workDaysModel.getWorktimeList(selected_item.indexes()[0])
+            set_view_model(self.listViewWorktimes, self.customWorktimesModel)
 
             self.listViewActions.selectionModel().setCurrentIndex(self.absence_items.index(item["action"]),
                                                           QItemSelectionModel.SelectionFlag.Select)
@@ -790,7 +772,12 @@ class MainWindow(QMainWindow):
     def actionChanged(self, selected_item, deselected_item):
         if selected_item.indexes():
             action_row = selected_item.indexes()[0].row()
-            self.workDaysModel.setAction(self.workingDaysList.selectionModel().currentIndex(), action_row)
+            index = self.workingDaysList.selectionModel().currentIndex()
+            self.workDaysModel.setAction(index, action_row)
+            day = self.workDaysModel.data(index, Qt.ItemDataRole.UserRole)
+            self.journalEdit("set_action", self.current_target_month, self.current_target_year, day["dayOfMonth"],
+                             action_row)
+            self.indexWorkday(day)
             # enable disable worktime recording
             if action_row == 0:
                 self.listViewWorktimes.setEnabled(False)
@@ -829,16 +816,17 @@ class MainWindow(QMainWindow):
                 self.updateTotal()
 
     def addWorktime(self):
-        dialog = WorkTimeDialog(self)
+        dialog = self.worktimeDialog(conflicts=self.dayWorktimeConflicts())
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            print(f"Adding work time: {dialog.get_worktime()}")
+            log.debug("Adding work time: %s", dialog.get_worktime())
             self.listViewWorktimes.model().addItem(dialog.get_worktime())
+            self.saveDayWorktimes()
         else:
-            print("Adding work time cancelled")
+            log.debug("Adding work time cancelled")
 
     def applyBalance(self):
         addition_per_day = int(self.spinBoxTargetBalanceHours.value() / self.workDaysModel.rowCount())
-        print(f"{self.spinBoxTargetBalanceHours.value()} {self.workDaysModel.rowCount()}")
+        log.debug("%d %d", self.spinBoxTargetBalanceHours.value(), self.workDaysModel.rowCount())
 
 
     def removeWorktime(self):
@@ -846,22 +834,38 @@ class MainWindow(QMainWindow):
                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.Yes)
         if reply == QMessageBox.StandardButton.Yes:
             row = self.listViewWorktimes.selectionModel().currentIndex().row()
-            print(f"Removing worktime {row}")
+            log.debug("Removing worktime %d", row)
             self.listViewWorktimes.model().removeRow(row)
+            self.saveDayWorktimes()
 
     def updateUsualsTotal(self):
-        total_seconds = self.usualsModel.get_total()
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, _ = divmod(remainder, 60)
+        hours, minutes = divmod(self.usualsModel.get_total(), 60)
         self.labelUsualTotalTime.setText(f"{int(hours):02}:{int(minutes):02}")
-        print("updateUsualsTotal")
+        if self.workDaysModel is not None and self.usualsModel.weekday is not None:
+            self.workDaysModel.updateUsualDays(self.usualsModel.weekday)
 
     def updateTotal(self):
-        total_seconds = self.customWorktimesModel.get_total()
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, _ = divmod(remainder, 60)
+        hours, minutes = divmod(self.customWorktimesModel.get_total(), 60)
         self.labelTotalTime.setText(f"{int(hours):02}:{int(minutes):02}")
-        print("updateTotal")
+
+    def updateMonthSummary(self):
+        """Show the planned time of the loaded month by worktype and week, and the balance it leads to."""
+        if self.workDaysModel is None:
+            return
+        totals = self.workDaysModel.totals()
+        rules = self.balanceRules()
+        counted = sum(totals.by_type(i) for i, name in enumerate(WORKTYPES) if name in rules.counted_types)
+        credited = round(sum(rules.credited_actions.get(action, 0.0) * self.workDaysModel.countOf(action)
+                             for action in range(len(ACTIONS))) * rules.daily_target_minutes)
+        ocd = round(self.ocdModel.total_minutes() * rules.ocd_factor)
+        target = len(self.workDaysModel) * rules.daily_target_minutes
+        carried = minutes_from_hm(self.spinBoxBalanceHours.value(), self.spinBoxBalanceMinutes.value())
+        expected = counted + credited + ocd
+        lines = [f"Expected {format_hm(expected)} of {format_hm(target)}",
+                 f"Balance {format_hm(carried + expected - target)} without the addition"]
+        lines += [f"{name}: {format_hm(totals.by_type(i))}" for i, name in enumerate(WORKTYPES) if totals.by_type(i)]
+        lines.append("Weeks " + ", ".join(f"{week}: {format_hm(minutes)}" for (_, week), minutes in totals.weeks()))
+        self.labelMonthSummary.setText("\n".join(lines))
 
     def usualsChanged(self, selected_item, deselected_item):
         if selected_item.indexes():
@@ -870,223 +874,326 @@ class MainWindow(QMainWindow):
             self.pushButtonAddWorktimeUsual.setEnabled(True)
             self.pushButtonRemoveWorktimeUsual.setEnabled(True)
             self.usualsModel.set_weekday(index)
-            print(WEEKDAYS[index])
+            log.debug("usuals of %s", WEEKDAYS[index])
+
 
 
+    def findTemplate(self):
+        return find_template(self.workingPathEdit.text())
 
-    def createSpreadsheet(self):
+    def createBackend(self):
+        return create_backend(self.backendOverride or self.backendName, transaction_mode=self.transactionMode,
+                              session=self.excelSession)
+
+    def balanceRules(self):
+        try:
+            return BalanceRules.from_settings(self.dailyTargetMinutes, self.ocdFactor, self.creditedActions,
+                                              self.countedTypes)
+        except (ValueError, AttributeError) as e:
+            log.warning("Invalid balance rules in the settings (%s), using the defaults", e)
+            return BalanceRules(daily_target_minutes=self.dailyTargetMinutes, ocd_factor=self.ocdFactor)
+
+    def snapshot(self, template_file):
+        return dataclasses.replace(self.profileSnapshot(template_file, self.current_target_month, self.current_target_year),
+                                   workdays=tuple(self.workDaysModel.getData()),
+                                   ocd=tuple(self.ocdModel.getEvents()))
+
+    def profileSnapshot(self, template_file, month, year):
+        """Snapshot of the settings and usuals, without any workdays or OCD."""
+        return MonthSnapshot(month=month,
+                             year=year,
+                             template_file=template_file,
+                             working_path=self.workingPathEdit.text(),
+                             first_name=self.firstNameEdit.text(),
+                             last_name=self.lastNameEdit.text(),
+                             group_name=self.groupNameEdit.text(),
+                             balance=minutes_from_hm(self.spinBoxBalanceHours.value(),
+                                                     self.spinBoxBalanceMinutes.value()),
+                             total_min=self.spinBoxTotalMin.value(),
+                             total_max=self.spinBoxTotalMax.value(),
+                             max_per_day=self.spinBoxMaxPerDay.value(),
+                             workdays=tuple(),
+                             usuals=self.usualsModel.getUsuals(),
+                             ocd=tuple(),
+                             rules=self.balanceRules(),
+                             verify_balance=self.verifyBalance,
+                             addition_shape=self.additionShape)
+
+    def simulateMonth(self):
+        """Show the spread of the records the current settings would generate for the loaded month."""
         if self.workDaysModel is None:
+            return
+        try:
+            from simulation import describe, simulate
+        except ImportError:
+            self.labelSimulation.setText("Install NumPy to see the expected outcome of a generation")
+            return
+        try:
+            # a fixed seed, so that the figures only move when the settings do
+            simulation = simulate([self.snapshot(None)], seed=0)[0]
+        except Exception as e:
+            self.labelSimulation.setText(str(e))
+            return
+        self.labelSimulation.setText(describe(simulation))
+
+    def startExcel(self):
+        worker = Worker(lambda progress, is_cancelled: self.excelSession.app())
+        worker.signals.finished.connect(lambda _: self.statusBar().showMessage('Excel is ready'))
+        worker.signals.failed.connect(lambda message: log.warning("Excel could not be started: %s", message))
+        self.prewarmWorker = worker
+        self.workerPool.start(worker)
+
+    def runWorker(self, fn, finished, label):
+        """Run fn(progress, is_cancelled) on the worker thread, finished(result) is called on the GUI thread."""
+        self.worker = Worker(fn)
+        self.worker.signals.progress.connect(lambda phase, percent: self.workerProgress(label, phase, percent))
+        self.worker.signals.finished.connect(finished)
+        self.worker.signals.failed.connect(self.workerFailed)
+        self.worker.signals.cancelled.connect(self.workerCancelled)
+        self.pushButtonUpdateWorkdays.setEnabled(False)
+        self.pushButtonCreateSpreadsheet.setEnabled(False)
+        self.pushButtonBatchGenerate.setEnabled(False)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.pushButtonCancel.show()
+        self.workerPool.start(self.worker)
+
+    def workerProgress(self, label, phase, percent):
+        self.progressBar.setValue(percent)
+        self.statusBar().showMessage(f"{label}: {phase}")
+
+    def workerDone(self):
+        self.worker = None
+        self.pushButtonUpdateWorkdays.setEnabled(True)
+        self.pushButtonCreateSpreadsheet.setEnabled(True)
+        self.pushButtonBatchGenerate.setEnabled(True)
+        self.progressBar.hide()
+        self.pushButtonCancel.hide()
+
+    def workerFailed(self, message):
+        self.workerDone()
+        self.statusBar().clearMessage()
+        QMessageBox.critical(None, "Error reading template", message)
+
+    def workerCancelled(self):
+        self.workerDone()
+        self.statusBar().showMessage("Cancelled")
+
+    def cancelWorker(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def createSpreadsheet(self, patch=False):
+        """Generate the record of the current month, with patch only the rows of the days changed since the last one."""
+        if self.workDaysModel is None or (self.current_target_month, self.current_target_year) != \
+                (self.targetMonthSpin.value(), self.targetYearSpin.value()):
             QMessageBox.information(None, "Warning!", "Update to get workdays!")
             return
-        search_pattern = os.path.join(self.workingPathEdit.text(), 'LastName_FirstName_*.xlsx')
-        matching_files = glob.glob(search_pattern)
-        if len(matching_files) != 1:
+        template_file = self.findTemplate()
+        if template_file is None:
             QMessageBox.information(None, "Warning!", "No templates found")
             return
-        template_file = matching_files[0]
+        if not self.confirmMonthConflicts([(self.current_target_month, self.current_target_year)]):
+            return
+        snapshot = self.snapshot(template_file)
+        previous = None
+        if patch:
+            # the last generation may still be in the journal
+            self.compactJournal()
+            record = self.store.load_generated(snapshot.month, snapshot.year)
+            previous = MonthPlan.from_json(record) if record is not None else None
+        backend = self.createBackend()
+        self.runWorker(lambda progress, is_cancelled: generate_record(snapshot, backend, progress, is_cancelled, previous),
+                       self.spreadsheetCreated, "Updating record" if previous is not None else "Generating")
+
+    def confirmMonthConflicts(self, months):
+        """Ask whether to generate months with overlapping OCD events or worktimes, True if there are none."""
+        pairs = [pair for month, year in months for pair in self.overlaps.month_conflicts(month, year)]
+        if not pairs:
+            return True
+        reply = QMessageBox.question(self, "Overlap", "Overlapping entries:\n"
+                                     + "\n".join(f"{a.describe()} and {b.describe()}" for a, b in pairs)
+                                     + "\n\nGenerate anyway?",
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                     QMessageBox.StandardButton.No)
+        return reply == QMessageBox.StandardButton.Yes
+
+    def spreadsheetCreated(self, result):
+        self.workerDone()
+        self.setBalance(result.balance_key, result.next_balance())
+        self.journalEdit("save_generated", result.plan.month, result.plan.year, result.plan.to_json())
+        self.statusBar().showMessage(f'Saved {result.filename}, balance {format_hm(result.next_balance())}')
+        if not result.verified:
+            QMessageBox.warning(None, "Balance mismatch",
+                                f"Calculated balance {format_hm(result.balance.balance)} differs from "
+                                f"the worktime record ({result.record_balance}), the balance of the record is kept")
+
+    def batchGenerate(self):
+        from batch import generate_batch, load_month, month_range
+        template_file = self.findTemplate()
+        if template_file is None:
+            QMessageBox.information(None, "Warning!", "No templates found")
+            return
+        month = self.targetMonthSpin.value()
+        year = self.targetYearSpin.value()
+        count, ok = QInputDialog.getInt(self, "Generate months", f"Number of months to generate, starting with {month}.{year}",
+                                        3, 1, 24)
+        if not ok:
+            return
+        if not self.confirmMonthConflicts(month_range(month, year, count)):
+            return
+        # the generation reads the saved months, bring them up to date first
+        self.compactJournal()
+        base = self.profileSnapshot(template_file, month, year)
         try:
-            workbook = xw.Book(template_file)
-            worksheet_profile = workbook.sheets['My Profile']
-            worksheet_plan = workbook.sheets['Monthly Plan and Absences']
-            worksheet_time = workbook.sheets['Enter Working Time']
-            worksheet_record = workbook.sheets['Work Time Record']
-
-            # Change the target month
-            worksheet_plan.range('C5').value = self.targetMonthSpin.value()
-            worksheet_plan.range('C6').value = self.targetYearSpin.value()
-
-            # Write Balance
-            worksheet_plan.range('E10').value = self.spinBoxBalanceHours.value()
-            worksheet_plan.range('G10').value = self.spinBoxBalanceMinutes.value()
-
-            # Profile
-            worksheet_profile.range('C3').value = f'{self.firstNameEdit.text()} {self.lastNameEdit.text()}'
-            worksheet_profile.range('C4').value = self.groupNameEdit.text()
-
-            usual_days_count = self.workDaysModel.numberOfUsuals()
-            if self.spinBoxMaxPerDay.value() > 0:
-                distributed_minutes = distribute_minutes(usual_days_count, self.spinBoxTotalMin.value(), self.spinBoxTotalMax.value(), self.spinBoxMaxPerDay.value())
-                print(distributed_minutes)
-            else:
-                distributed_minutes = None
-
-            # iterate through all days in target month
-            month_tuple = monthrange(self.targetYearSpin.value(), self.targetMonthSpin.value())
-            days_in_month = month_tuple[1]
-            temp_objects = []
-            for day_of_month in range(1, days_in_month + 1):
-                # try to find the day in workdays
-                workday = self.workDaysModel.find(day_of_month)
-                if workday is not None:
-                    action = workday['action']
-                    if action >= 2:
-                        # neither work nor ocd is possible here
-                        worksheet_plan.range(f'{PLAN_ABSENCE_COL}{PLAN_STARTING_ROW + day_of_month - 1}').value = ACTIONS[action]
-                    else:
-                        if action == 0:  # usuals
-                            day_of_week_index = WEEKDAYS.index(workday["dayOfWeek"])
-                            usuals_original = self.usualsModel.find(day_of_week_index)
-                            if len(usuals_original) == 0:
-                                raise Exception(f"No usuals found for {workday['dayOfWeek']}, terminating process")
-                            usuals = copy.deepcopy(usuals_original)
-
-                            # randomize all usual intervals together by a single ±RANDOM_OFFSET_MINUTES delta
-                            # choose a delta that keeps ALL intervals within 00:00..23:59 *without clamping*,
-                            # thereby preserving both durations (>= usuals) and gaps (no overlaps introduced)
-                            if RANDOM_OFFSET_MINUTES > 0:
-                                J = RANDOM_OFFSET_MINUTES * 60
-                                base = QTime(0, 0)
-                                max_secs = 23 * 3600 + 59 * 60
-                                # Collect starts/ends in seconds-from-midnight
-                                starts = [base.secsTo(u["start"]) for u in usuals]
-                                ends   = [base.secsTo(u["end"])   for u in usuals]
-                                # Feasible delta so that start >= 0 and end <= max_secs for ALL intervals
-                                lower_bound = -min(starts)                 # delta >= -min(start)
-                                upper_bound = max_secs - max(ends)         # delta <= max_secs - max(end)
-                                # Intersect with ±J
-                                lo = max(-J, lower_bound)
-                                hi = min(J,  upper_bound)
-                                if lo > hi:
-                                    # No feasible jitter range; fall back to zero shift
-                                    shared_delta = 0
-                                else:
-                                    shared_delta = random.randint(lo, hi)
-                                for u in usuals:
-                                    u["start"] = u["start"].addSecs(shared_delta)
-                                    u["end"]   = u["end"].addSecs(shared_delta)
-                                print(f"random offset for all usuals on day {day_of_month}: {int(shared_delta/60)} min (range {int(lo/60)}..{int(hi/60)})")
-
-                            # add some more hours
-                            if distributed_minutes is not None:
-                                eod_addition = distributed_minutes.pop() * 60
-                                usuals[-1]["end"] = usuals[-1]["end"].addSecs(eod_addition)
-                                print(f"eod addition for day {day_of_month}: {int(eod_addition/60)}")
-
-                            for u in usuals:
-                                temp_objects.append({'type':WORKTYPES[u['type']], 'start_day':day_of_month, 'start_time':u['start'], 'end_day':day_of_month, 'end_time':u['end']})
-                                # worksheet_time.range(f'{WORKTIME_TYPE_COL}{worktime_row}').value = WORKTYPES[u['type']]
-                                # worksheet_time.range(f'{WORKTIME_START_DAY_COL}{worktime_row}').value = day_of_month
-                                # worksheet_time.range(f'{WORKTIME_END_DAY_COL}{worktime_row}').value = day_of_month
-                                # worksheet_time.range(f'{WORKTIME_START_TIME_COL}{worktime_row}').value = u['start'].toString("HH:mm")
-                                # worksheet_time.range(f'{WORKTIME_END_TIME_COL}{worktime_row}').value = u['end'].toString("HH:mm")
-                                # worktime_row += 1
-                        else:  # custom times
-                            custom_times = workday["worktimes"].getWorkTimes()
-                            for c in custom_times:
-                                temp_objects.append(
-                                    {'type': WORKTYPES[c['type']], 'start_day': day_of_month, 'start_time': c['start'],
-                                     'end_day': day_of_month, 'end_time': c['end']})
-                                # worksheet_time.range(f'{WORKTIME_TYPE_COL}{worktime_row}').value = WORKTYPES[c['type']]
-                                # worksheet_time.range(f'{WORKTIME_START_DAY_COL}{worktime_row}').value = day_of_month
-                                # worksheet_time.range(f'{WORKTIME_END_DAY_COL}{worktime_row}').value = day_of_month
-                                # worksheet_time.range(f'{WORKTIME_START_TIME_COL}{worktime_row}').value = c['start'].toString("HH:mm")
-                                # worksheet_time.range(f'{WORKTIME_END_TIME_COL}{worktime_row}').value = c['end'].toString("HH:mm")
-                                # worktime_row += 1
-
-                # check if there is OCD on that day... make sure to sort it
-                ocd = self.ocdModel.find(day_of_month)
-                if ocd is not None:
-                    for o in ocd:
-                        temp_objects.append(
-                            {'type': 'OCD', 'start_day': o["start"].date().day(), 'start_time': o["start"].time(),
-                             'end_day': o["end"].date().day(), 'end_time': o["end"].time()})
-                        # worksheet_time.range(f'{WORKTIME_TYPE_COL}{worktime_row}').value = 'OCD'
-                        # worksheet_time.range(f'{WORKTIME_START_DAY_COL}{worktime_row}').value = o["start"].date().day()
-                        # worksheet_time.range(f'{WORKTIME_END_DAY_COL}{worktime_row}').value = o["end"].date().day()
-                        # worksheet_time.range(f'{WORKTIME_START_TIME_COL}{worktime_row}').value = o["start"].time().toString("HH:mm")
-                        # worksheet_time.range(f'{WORKTIME_END_TIME_COL}{worktime_row}').value = o["end"].time().toString("HH:mm")
-                        # worksheet_time.range(f'{WORKTIME_COMMENTS_COL}{worktime_row}').value = o["comments"]
-                        # worktime_row += 1
-
-            # write into file
-            temp_objects = sorted(temp_objects, key=lambda o: (o["start_day"], o["start_time"]))
-
-            worktime_row = WORKTIME_STARTING_ROW
-            for d in temp_objects:
-                worksheet_time.range(f'{WORKTIME_TYPE_COL}{worktime_row}').value = d["type"]
-                worksheet_time.range(f'{WORKTIME_START_DAY_COL}{worktime_row}').value = d["start_day"]
-                worksheet_time.range(f'{WORKTIME_END_DAY_COL}{worktime_row}').value = d["end_day"]
-                worksheet_time.range(f'{WORKTIME_START_TIME_COL}{worktime_row}').value = d["start_time"].toString("HH:mm")
-                worksheet_time.range(f'{WORKTIME_END_TIME_COL}{worktime_row}').value = d["end_time"].toString("HH:mm")
-                worktime_row += 1
-
-            # Save the workbook with a new name
-            fn = f'{self.lastNameEdit.text()}_{self.firstNameEdit.text()}_WorkTimeRecord_{self.targetYearSpin.value()}-{self.targetMonthSpin.value():02}.xlsx'
-            fn_with_path = os.path.join(self.workingPathEdit.text(), fn)
-
-            workbook.save(fn_with_path)
-
-            # find balance
-            for row in range(1, 50):
-                cell_value = worksheet_record.range(f'T{row}').value
-                if isinstance(cell_value, str) and "balance" in cell_value:
-                    balance_combined = worksheet_record.range(f'W{row}').value
-                    print(balance_combined)
-                    balance_h = int(balance_combined.split(":")[0])
-                    balance_m = int(balance_combined.split(":")[1])
-                    d = QDate(self.current_target_year, self.current_target_month, 1)
-                    d = d.addMonths(1)
-                    key = f"{d.month()}.{d.year()}"
-                    self.balance[key] = dict({"h": balance_h, "m": balance_m})
-                    break
-
-            workbook.app.quit()
-            # app = workbook.app
-            # workbook.close()
-            # app.kill()
-
-        except Exception as e:
-            QMessageBox.critical(None, "Error reading template", str(e))
+            snapshots = [load_month(self.store, base, m, y) for m, y in month_range(month, year, count)]
+        except ValueError as e:
+            QMessageBox.information(None, "Warning!", str(e))
+            return
+        backend_name = self.backendOverride or self.backendName
+        backend_options = dict(transaction_mode=self.transactionMode)
+        log_directory = config_dir()
+
+        def run(progress, is_cancelled):
+            results = []
+            for result in generate_batch(snapshots, backend_name, backend_options, is_cancelled=is_cancelled,
+                                         log_directory=log_directory):
+                results.append(result)
+                progress(result.filename, int(100 * len(results) / len(snapshots)))
+            return results
+        self.runWorker(run, self.batchGenerated, "Generated")
+
+    def batchGenerated(self, results):
+        self.workerDone()
+        for result in results:
+            self.setBalance(result.balance_key, result.next_balance())
+            self.journalEdit("save_generated", result.plan.month, result.plan.year, result.plan.to_json())
+        self.statusBar().showMessage(f'Saved {len(results)} records')
+        mismatches = [result.filename for result in results if not result.verified]
+        if mismatches:
+            QMessageBox.warning(None, "Balance mismatch", "Calculated balance differs from the worktime record in:\n"
+                                + "\n".join(mismatches)
+                                + "\n\nThe balances of the records are kept, the months after the first one "
+                                  "listed were generated with the calculated balance.")
+
+    def workCalendar(self):
+        try:
+            return WorkCalendar(load_rules(self.holidayRegion, config_path(HOLIDAYS_FILENAME)))
+        except ValueError as e:
+            log.warning("%s, using weekends only", e)
+            return WorkCalendar()
+
+    def usesCalendar(self):
+        return self.workingDaysSource == "calendar"
+
+    def knownWorkingDays(self, month, year):
+        """Working days of a month if they are known without opening the template, None otherwise.
+
+        The calendar is used once the template agreed with it on the month, or right away if it is not checked.
+        Where the template disagrees its working days are used.
+        """
+        if self.usesCalendar() and not self.checkCalendar:
+            return self.calendar.working_days(month, year)
+        template_file = self.findTemplate()
+        if template_file is None:
+            return None
+        with span("workday cache", log):
+            working_days = self.workdayCache.get(template_file, month, year)
+        if working_days is None or not self.usesCalendar():
+            return working_days
+        return self.checkedWorkingDays(working_days, month, year)
+
+    def checkedWorkingDays(self, template_days, month, year):
+        differences = compare_working_days(self.calendar.working_days(month, year), template_days)
+        if differences:
+            log.warning("The calendar differs from the template in %d.%d, using the template: %s",
+                        month, year, "; ".join(differences))
+            self.statusBar().showMessage(f"The holidays of the calendar differ from the template in {month}.{year}, "
+                                         f"using the template")
+            return template_days
+        return self.calendar.working_days(month, year)
 
     def updateWorkdays(self):
-        search_pattern = os.path.join(self.workingPathEdit.text(), 'LastName_FirstName_*.xlsx')
-        matching_files = glob.glob(search_pattern)
-        if len(matching_files) != 1:
-            print("No templates found")  # write in status bar
+        month = self.targetMonthSpin.value()
+        year = self.targetYearSpin.value()
+        working_days = self.knownWorkingDays(month, year)
+        if working_days is not None:
+            self.setWorkdays(working_days, month, year)
+            return
+        template_file = self.findTemplate()
+        if template_file is None:
+            self.statusBar().showMessage("No templates found")
             return
-        template_file = matching_files[0]
+        backend = self.createBackend()
+        uses_calendar = self.usesCalendar()
+
+        def read(progress, is_cancelled):
+            try:
+                return read_working_days(backend, template_file, month, year, progress)
+            except TemplateNotRecalculated as e:
+                if not uses_calendar:
+                    raise
+                log.warning("%s, using the calendar", e)
+                return None
+        self.runWorker(read, lambda working_days: self.workingDaysRead(template_file, month, year, working_days),
+                       "Updating")
+
+    def workingDaysRead(self, template_file, month, year, working_days):
+        """Working days read from the template, None if the backend could not recalculate it."""
+        self.workerDone()
+        self.statusBar().clearMessage()
+        if working_days is None:
+            self.statusBar().showMessage(f"The template cannot be recalculated for {month}.{year}, "
+                                         f"using the calendar")
+            working_days = self.calendar.working_days(month, year)
+        else:
+            self.workdayCache.put(template_file, month, year, working_days)
+            if self.usesCalendar():
+                working_days = self.checkedWorkingDays(working_days, month, year)
+        self.setWorkdays(working_days, month, year)
+
+    def setWorkdays(self, working_days, month, year):
+        # edits of the previous month are in the journal already
+        stored = self.loadWorktimes()
         try:
-            workbook = xw.Book(template_file)
-            worksheet_plan = workbook.sheets['Monthly Plan and Absences']
-            # Change the target month and year
-            worksheet_plan.range('C5').value = self.targetMonthSpin.value()
-            worksheet_plan.range('C6').value = self.targetYearSpin.value()
-            working_days = []
-            for row in range(PLAN_STARTING_ROW, PLAN_STARTING_ROW + 31):
-                day_type = worksheet_plan.range(f'{PLAN_DAYTYPE_COL}{row}').value
-                week_day = worksheet_plan.range(f'{PLAN_WEEKDAY_COL}{row}').value
-                if day_type == 'Working day':
-                    working_days.append({"dayOfMonth": int(worksheet_plan.range(f'{PLAN_DAYOFMONTH_COL}{row}').value),
-                                         "dayOfWeek": week_day})
-
-            self.workDaysModel = Workdays(working_days, self.loadWorktimes(), self.targetMonthSpin.value(), self.targetYearSpin.value())
-
-            self.workingDaysList.setModel(self.workDaysModel)
-            self.workingDaysList.selectionModel().selectionChanged.connect(self.workingDayChanged)
-
-            self.labelWorkdaysMonth.setText(f"{self.targetMonthSpin.value()}.{self.targetYearSpin.value()}")
-            self.current_target_month = self.targetMonthSpin.value()
-            self.current_target_year = self.targetYearSpin.value()
-
-            workbook.app.quit()
-            #app = workbook.app
-            #workbook.close()
-            #app.kill()
-        except Exception as e:
-            QMessageBox.critical(None, "Error reading template", str(e))
+            workdays = Workdays(working_days, stored, month, year, usuals=self.usualsModel)
+        except ValueError as e:
+            log.error("%s", e)
+            QMessageBox.warning(None, "Workdays", str(e))
+            return
+        self.workDaysModel = workdays
+        self.workDaysModel.totalsChanged.connect(self.updateMonthSummary)
+
+        self.workDaysModel.worktimesChanged.connect(self.updateTotal)
+
+        set_view_model(self.workingDaysList, self.workDaysModel)
+        self.workingDaysList.selectionModel().selectionChanged.connect(self.workingDayChanged)
 
+        self.labelWorkdaysMonth.setText(f"{month}.{year}")
+        self.current_target_month = month
+        self.current_target_year = year
+        # only a month new to the store or whose working days changed has to be saved, the index has the others
+        if self.workDaysModel.getData() != stored:
+            self.saveWorktimes()
+        self.updateMonthSummary()
 
 
 def main():
-    app = QApplication(sys.argv)
-    app.setApplicationName("wtr")
-    app.setApplicationVersion('1.0.0')
-    main_window = MainWindow()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=list(BACKENDS), help='workbook backend, overrides the backend setting')
+    parser.add_argument('--verbose', action='store_true', help='log every step to stderr')
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    app.setApplicationName(APP_NAME)
+    app.setApplicationVersion(APP_VERSION)
+    setup_logging(config_dir(), logging.DEBUG if args.verbose else logging.INFO)
+    main_window = MainWindow(backend=args.backend)
     main_window.show()
     app.exec()
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     # dir_path = os.path.dirname(os.path.realpath(__file__))
     # print(dir_path)
     # input()
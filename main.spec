@@ -1,12 +1,18 @@
 # -*- mode: python ; coding: utf-8 -*-
+import sys
 
+sys.path.insert(0, SPECPATH)
+from build_ui import FORMS, compile_forms
+
+# the forms are compiled at every build, main.py falls back to the .ui files when they are missing
+compile_forms(SPECPATH)
 
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
     datas=[('*.py', '.'), ('*.ui', '.')],
-    hiddenimports=[],
+    hiddenimports=[f'ui_{name}' for name in FORMS],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -36,3 +42,39 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+cli = Analysis(
+    ['cli.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=['PyQt6.QtWidgets', 'PyQt6.QtGui', 'PyQt6.uic'],
+    noarchive=False,
+    optimize=0,
+)
+cli_pyz = PYZ(cli.pure)
+
+cli_exe = EXE(
+    cli_pyz,
+    cli.scripts,
+    cli.binaries,
+    cli.datas,
+    [],
+    name='wtr-cli',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    runtime_tmpdir=None,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
@@ -0,0 +1,445 @@
+import bisect
+from collections import Counter
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt, pyqtSignal
+
+from generator import WEEKDAYS, WORKTYPES
+from instrumentation import get_logger
+from intervals import Interval, OcdEvent, format_minutes
+from totals import MonthTotals
+
+log = get_logger("models")
+
+
+def interval_text(interval):
+    return f"{format_minutes(interval.start)} - {format_minutes(interval.end)} {WORKTYPES[interval.type]}"
+
+
+def minutes_by_type(intervals):
+    totals = Counter()
+    for interval in intervals:
+        totals[interval.type] += interval.duration
+    return totals
+
+
+def insert_sorted(model, items, item):
+    """Insert item into the sorted items of a list model, signalling just the new row. Returns the row."""
+    row = bisect.bisect_right(items, item)
+    model.beginInsertRows(QModelIndex(), row, row)
+    items.insert(row, item)
+    model.endInsertRows()
+    return row
+
+
+def replace_sorted(model, items, row, item):
+    """Replace the item of a row of the sorted items of a list model, moving the row only if its position changes.
+
+    Views keep their selection, they see a rowsMoved and a dataChanged instead of a reset. Returns the new row.
+    """
+    if row > 0 and item < items[row - 1]:
+        new_row = destination = bisect.bisect_right(items, item, 0, row)
+    elif row + 1 < len(items) and items[row + 1] < item:
+        destination = bisect.bisect_right(items, item, row + 1)
+        new_row = destination - 1
+    else:
+        new_row = destination = row
+    if new_row != row:
+        model.beginMoveRows(QModelIndex(), row, row, QModelIndex(), destination)
+        del items[row]
+        items.insert(new_row, item)
+        model.endMoveRows()
+    else:
+        items[row] = item
+    model.dataChanged.emit(model.index(new_row), model.index(new_row))
+    return new_row
+
+
+class WeekdayUsualsList(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._work_times = dict()  # 0 = Monday, 1 = Tuesday, etc
+        self._totals = dict()  # minutes per worktype index of every weekday
+        self._weekday = None
+
+    def set_weekday(self, weekday):
+        self.beginResetModel()
+        self._weekday = str(weekday)
+        if self._weekday not in self._work_times:
+            log.debug("no usuals for weekday %s yet", self._weekday)
+            self._work_times[self._weekday] = list()
+            self._totals[self._weekday] = Counter()
+        self.endResetModel()
+
+    @property
+    def weekday(self):
+        """Index of the selected weekday, None if there is none."""
+        return None if self._weekday is None else int(self._weekday)
+
+    def get_total(self):
+        """Total minutes of the selected weekday."""
+        if self._weekday is None:
+            return 0
+        return sum(self._totals[self._weekday].values())
+
+    def minutes_by_type(self, weekday):
+        """Minutes per worktype index of the usuals of a weekday index."""
+        return self._totals.get(str(weekday), Counter())
+
+
+    def __iter__(self):
+        return iter(self._work_times[self._weekday])
+
+    def __getitem__(self, i):
+        return self._work_times[self._weekday][i]
+
+    def __len__(self):
+        if self._weekday is None:
+            return 0
+        return len(self._work_times[self._weekday])
+
+    def rowCount(self, parent=None):
+        if self._weekday is None:
+            return 0
+        return len(self._work_times[self._weekday])
+
+    def data(self, index, role):
+        data = self._work_times[self._weekday][index.row()]
+        if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
+            return interval_text(data)
+        elif role == Qt.ItemDataRole.UserRole:
+            return data
+
+    def removeRow(self, index):
+        self.beginRemoveRows(QModelIndex(), index, index)
+        removed = self._work_times[self._weekday].pop(index)
+        self._totals[self._weekday][removed.type] -= removed.duration
+        self.endRemoveRows()
+
+    def find(self, day_of_week_index):
+        return self._work_times[str(day_of_week_index)]
+
+    def add_work_time(self, work_time):
+        self._totals[self._weekday][work_time.type] += work_time.duration
+        insert_sorted(self, self._work_times[self._weekday], work_time)
+
+    def modify_work_time(self, index, work_time):
+        old = self._work_times[self._weekday][index.row()]
+        self._totals[self._weekday][old.type] -= old.duration
+        self._totals[self._weekday][work_time.type] += work_time.duration
+        replace_sorted(self, self._work_times[self._weekday], index.row(), work_time)
+
+    def getUsuals(self):
+        return {key: [t.to_json() for t in value_list] for key, value_list in self._work_times.items()}
+
+    def setUsuals(self, data):
+        self.beginResetModel()
+        self._work_times = {key: sorted(Interval.from_json(t) for t in value_list) for key, value_list in data.items()}
+        self._totals = {key: minutes_by_type(value_list) for key, value_list in self._work_times.items()}
+        if self._weekday is not None and self._weekday not in self._work_times:
+            self._work_times[self._weekday] = list()
+            self._totals[self._weekday] = Counter()
+        self.endResetModel()
+
+
+class WorktimeListModel(QAbstractListModel):
+    def __init__(self, work_times=None, parent=None):
+        super().__init__(parent)
+        if work_times is None:
+            self._work_times = list()
+        else:
+            self._work_times = sorted(Interval.from_json(x) for x in work_times)
+        self._totals = minutes_by_type(self._work_times)
+
+    def __iter__(self):
+        return iter(self._work_times)
+
+    def __getitem__(self, i):
+        return self._work_times[i]
+
+    def __len__(self):
+        return len(self._work_times)
+
+    def rowCount(self, parent=None):
+        return len(self._work_times)
+
+    def data(self, index, role):
+        if 0 <= index.row() < len(self._work_times):
+            data = self._work_times[index.row()]
+            if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
+                return interval_text(data)
+            elif role == Qt.ItemDataRole.UserRole:
+                return data
+        else:
+            log.warning("no worktime in row %d", index.row())
+
+    def get_total(self):
+        """Total minutes of the day."""
+        return sum(self._totals.values())
+
+    def minutes_by_type(self):
+        """Minutes per worktype index of the day."""
+        return self._totals
+
+    def removeRow(self, index):
+        self.beginRemoveRows(QModelIndex(), index, index)
+        removed = self._work_times.pop(index)
+        self._totals[removed.type] -= removed.duration
+        self.endRemoveRows()
+
+    def getData(self):
+        return [x.to_json() for x in self._work_times]
+
+    def getWorkTimes(self):
+        return self._work_times
+
+    def addItem(self, data):
+        self._totals[data.type] += data.duration
+        insert_sorted(self, self._work_times, data)
+
+    def modifyItem(self, index, data):
+        old = self._work_times[index.row()]
+        self._totals[old.type] -= old.duration
+        self._totals[data.type] += data.duration
+        replace_sorted(self, self._work_times, index.row(), data)
+
+class OnCallDutyList(QAbstractListModel):
+    """OCD events sorted by start, bucketed by the day of month they start on.
+
+    The buckets are kept up to date by every mutation, so find is a dict lookup. A bucket holds the events of that
+    day of month of every loaded month, events_on picks the ones of a single date.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._events = list()
+        self._by_day = dict()
+        self._seconds = 0
+
+    def _index(self, event):
+        self._seconds += event.end - event.start
+        bisect.insort(self._by_day.setdefault(event.start_datetime().day, list()), event)
+
+    def _unindex(self, event):
+        self._seconds -= event.end - event.start
+        day = event.start_datetime().day
+        bucket = self._by_day[day]
+        del bucket[bisect.bisect_left(bucket, event)]
+        if not bucket:
+            del self._by_day[day]
+
+    def _reindex(self):
+        self._by_day = dict()
+        self._seconds = sum(event.end - event.start for event in self._events)
+        for event in self._events:
+            self._by_day.setdefault(event.start_datetime().day, list()).append(event)
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def __getitem__(self, i):
+        return self._events[i]
+
+    def __len__(self):
+        return len(self._events)
+
+    def rowCount(self, parent=None):
+        return len(self._events)
+
+    def data(self, index, role):
+        event = self._events[index.row()]
+        if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
+            return f"{event.start_datetime():%d.%m %H:%M} - {event.end_datetime():%d.%m %H:%M}\t{event.comments}"
+        elif role == Qt.ItemDataRole.UserRole:
+            return event
+
+    def removeRow(self, index):
+        self.beginRemoveRows(QModelIndex(), index, index)
+        self._unindex(self._events.pop(index))
+        self.endRemoveRows()
+
+    def find(self, day_of_month):
+        """Events starting on a day of month, sorted by start, or None."""
+        return self._by_day.get(day_of_month)
+
+    def total_minutes(self):
+        """Duration of all events in minutes."""
+        return self._seconds // 60
+
+    def events_on(self, date):
+        """Events starting on a date, sorted by start."""
+        return [e for e in self._by_day.get(date.day, ()) if e.start_datetime().date() == date]
+
+    def clear(self):
+        self.beginResetModel()
+        self._events.clear()
+        self._by_day.clear()
+        self._seconds = 0
+        self.endResetModel()
+
+    def addEvent(self, event):
+        self._index(event)
+        insert_sorted(self, self._events, event)
+
+    def modifyEvent(self, index, data):
+        self._unindex(self._events[index.row()])
+        self._index(data)
+        replace_sorted(self, self._events, index.row(), data)
+
+    def setEvents(self, data):
+        self.beginResetModel()
+        self._events = sorted(OcdEvent.from_json(item) for item in data)
+        self._reindex()
+        self.endResetModel()
+
+    def getEvents(self):
+        return [item.to_json() for item in self._events]
+
+
+class Workdays(QAbstractListModel):
+    """The working days of a month in spreadsheet order.
+
+    Days are plain records in the JSON encoding of getData, the worktimes of a day get a WorktimeListModel only
+    once getWorktimeList asks for it. From then on the record follows the model, so getData never walks the models.
+    Rows are indexed by day of month and the days per action are counted, both are kept up to date by setAction.
+    worktimesChanged is emitted for a change of the worktimes of any day, so views connect once per month.
+    The planned minutes are totalled in a MonthTotals, usual days count the usuals of their weekday if a
+    WeekdayUsualsList is given. totalsChanged is emitted whenever they change.
+    """
+    worktimesChanged = pyqtSignal()
+    totalsChanged = pyqtSignal()
+
+    def __init__(self, workdays_spreadsheet, workdays_saved, month, year, parent=None, usuals=None):
+        super().__init__(parent)
+        self._workdays = list()
+        self._models = dict()  # row -> WorktimeListModel of the days asked for
+        saved_by_day = None if workdays_saved is None else {item.get('dayOfMonth'): item for item in workdays_saved}
+        for i, value in enumerate(workdays_spreadsheet):
+            if saved_by_day is None:
+                dict_item = {
+                    "dayOfMonth": value["dayOfMonth"],
+                    "dayOfWeek": value["dayOfWeek"],
+                    "action": 0,  # working...vacation, sick, etc
+                    "worktimes": []
+                }
+            else:
+                value_from_saved = saved_by_day.get(value["dayOfMonth"])
+                if value_from_saved is None or value["dayOfWeek"] != value_from_saved["dayOfWeek"]:
+                    raise ValueError(f"The saved workdays of {month}.{year} do not match the template on day "
+                                     f"{value['dayOfMonth']}")
+                dict_item = {
+                    "dayOfMonth": value["dayOfMonth"],
+                    "dayOfWeek": value["dayOfWeek"],
+                    "action": value_from_saved['action'],  # working...vacation, sick, etc
+                    "worktimes": value_from_saved['worktimes']
+                }
+            self._workdays.append(dict_item)
+
+        self._month = month
+        self._year = year
+        self._usuals = usuals
+        self._totals = MonthTotals(month, year)
+        self._rows_by_day = dict()
+        self._rows_by_weekday = dict()
+        for row, item in enumerate(self._workdays):
+            self._rows_by_day[item["dayOfMonth"]] = row
+            self._rows_by_weekday.setdefault(item["dayOfWeek"], list()).append(row)
+            self._totals.set_day(item["dayOfMonth"], self._day_minutes(item))
+        self._action_counts = Counter(item["action"] for item in self._workdays)
+
+    def _connect_worktimes(self, model, row):
+        for signal in (model.rowsInserted, model.rowsRemoved, model.rowsMoved, model.dataChanged, model.modelReset):
+            signal.connect(lambda *args: self._worktimesChanged(row))
+
+    def _worktimesChanged(self, row):
+        self._workdays[row]["worktimes"] = self._models[row].getData()
+        self._update_totals(row)
+        self.worktimesChanged.emit()
+
+    def _day_minutes(self, item):
+        if item["action"] == 0:
+            if self._usuals is None:
+                return Counter()
+            return self._usuals.minutes_by_type(WEEKDAYS.index(item["dayOfWeek"]))
+        if item["action"] == 1:
+            row = self._rows_by_day.get(item["dayOfMonth"])
+            if row in self._models:
+                return self._models[row].minutes_by_type()
+            return minutes_by_type(Interval.from_json(w) for w in item["worktimes"])
+        return Counter()
+
+    def _update_totals(self, row):
+        item = self._workdays[row]
+        self._totals.set_day(item["dayOfMonth"], self._day_minutes(item))
+        self.totalsChanged.emit()
+
+    def totals(self):
+        return self._totals
+
+    def updateUsualDays(self, weekday):
+        """Total the usual days of a weekday index again after its usuals changed."""
+        for row in self._rows_by_weekday.get(WEEKDAYS[weekday], ()):
+            if self._workdays[row]["action"] == 0:
+                self._totals.set_day(self._workdays[row]["dayOfMonth"], self._day_minutes(self._workdays[row]))
+        self.totalsChanged.emit()
+
+    def __iter__(self):
+        return iter(self._workdays)
+
+    def __getitem__(self, i):
+        return self._workdays[i]
+
+    def __len__(self):
+        return len(self._workdays)
+
+    def rowCount(self, parent=None):
+        return len(self._workdays)
+
+    def data(self, index, role):
+        day = self._workdays[index.row()]
+        if role == Qt.ItemDataRole.ToolTipRole or role == Qt.ItemDataRole.DisplayRole:
+            return f"{day['dayOfMonth']}\t{day['dayOfWeek']}"
+        elif role == Qt.ItemDataRole.UserRole:
+            return day
+
+    def setAction(self, index, action):
+        item = self._workdays[index.row()]
+        self._action_counts[item["action"]] -= 1
+        self._action_counts[action] += 1
+        item["action"] = action
+        self._update_totals(index.row())
+        log.debug("action of day %d: %d", item["dayOfMonth"], action)
+
+    def getWorktimeList(self, index):
+        """The worktimes of a day as a list model, created on first use."""
+        row = index.row()
+        model = self._models.get(row)
+        if model is None:
+            model = WorktimeListModel(self._workdays[row]["worktimes"])
+            self._connect_worktimes(model, row)
+            self._models[row] = model
+        return model
+
+    def find(self, day_of_month):
+        row = self._rows_by_day.get(day_of_month)
+        return None if row is None else self._workdays[row]
+
+    def rowOf(self, day_of_month):
+        """Row of a day of month, None if it is not a working day."""
+        return self._rows_by_day.get(day_of_month)
+
+    def countOf(self, action):
+        """Number of days with an action, an index into ACTIONS."""
+        return self._action_counts[action]
+
+    def numberOfUsuals(self):
+        return self._action_counts[0]
+
+    def getData(self):
+        items = [
+            {
+                'dayOfMonth': x['dayOfMonth'],
+                'dayOfWeek': x['dayOfWeek'],
+                'action': x['action'],
+                'worktimes': list(x['worktimes'])
+            } for x in self._workdays]
+        return items
@@ -0,0 +1,130 @@
+"""Index of OCD events and planned worktimes across months, to find everything that overlaps a period.
+
+Entries are half-open periods [start, end) in seconds since the epoch, sorted by start. No entry is longer than the
+longest one ever added, so everything overlapping [a, b) starts within [a - longest, b) and is found by bisection.
+Entries are grouped by key, ("ocd", month, year) for the events of a month and ("day", date) for the worktimes of a
+day, and a group is replaced as a whole, the way the store saves them. The usual days are remembered by weekday, so
+that changed usuals re-plan only the days of the weekdays they changed.
+"""
+import bisect
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from generator import WEEKDAYS, WORKTYPES
+from intervals import Interval, OcdEvent
+
+
+class Entry(NamedTuple):
+    start: int
+    end: int
+    key: tuple
+    item: tuple
+
+    def describe(self):
+        if self.key[0] == "ocd":
+            return f"OCD {self.item.start_datetime():%d.%m.%Y %H:%M} - {self.item.end_datetime():%d.%m.%Y %H:%M}"
+        start = datetime.fromtimestamp(self.start)
+        end = datetime.fromtimestamp(self.end)
+        return f"{WORKTYPES[self.item.type]} {start:%d.%m.%Y %H:%M} - {end:%H:%M}"
+
+
+def day_period(day, interval):
+    """Period of the interval of a worktime on a date, an end before the start is on the next day."""
+    midnight = datetime(day.year, day.month, day.day)
+    start = midnight + timedelta(minutes=interval.start)
+    end = midnight + timedelta(minutes=interval.end)
+    if end < start:
+        end += timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def workday_intervals(workday, usuals):
+    """Planned worktimes of a workday: the usuals of its weekday, its custom times or none for an absence."""
+    if workday['action'] == 0:
+        return [Interval.from_json(u) for u in usuals.get(str(WEEKDAYS.index(workday['dayOfWeek'])), [])]
+    if workday['action'] == 1:
+        return [Interval.from_json(w) for w in workday['worktimes']]
+    return []
+
+
+class OverlapIndex:
+    def __init__(self):
+        self._entries = []
+        self._groups = dict()
+        self._longest = 0
+        # usuals the usual days were planned with, and the usual days by date with their weekday
+        self._usuals = dict()
+        self._usual_days = dict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def replace(self, key, periods):
+        """Replace the entries of a group by (start, end, item) periods."""
+        for entry in self._groups.pop(key, ()):
+            del self._entries[bisect.bisect_left(self._entries, entry)]
+        group = [Entry(start, end, key, item) for start, end, item in periods]
+        for entry in group:
+            bisect.insort(self._entries, entry)
+            self._longest = max(self._longest, entry.end - entry.start)
+        if group:
+            self._groups[key] = group
+
+    def set_ocd(self, month, year, events):
+        """Replace the OCD events of a month, events as in OnCallDutyList.getEvents."""
+        self.replace(("ocd", month, year), [(e.start, e.end, e) for e in map(OcdEvent.from_json, events)])
+
+    def set_workday(self, month, year, workday, usuals):
+        day = date(year, month, workday['dayOfMonth'])
+        if workday['action'] == 0:
+            self._usual_days[day] = str(WEEKDAYS.index(workday['dayOfWeek']))
+        else:
+            self._usual_days.pop(day, None)
+        self.replace(("day", day), [(*day_period(day, i), i) for i in workday_intervals(workday, usuals)])
+
+    def set_workdays(self, month, year, workdays, usuals):
+        """Replace the worktimes of the workdays of a month, workdays as in Workdays.getData."""
+        for workday in workdays:
+            self.set_workday(month, year, workday, usuals)
+
+    def set_usuals(self, usuals):
+        """Re-plan the usual days of the weekdays whose usuals differ from the ones they were planned with."""
+        changed = {weekday for weekday in set(self._usuals) | set(usuals)
+                   if self._usuals.get(weekday) != usuals.get(weekday)}
+        self._usuals = usuals
+        for day, weekday in self._usual_days.items():
+            if weekday in changed:
+                self.replace(("day", day), [(*day_period(day, i), i)
+                                            for i in map(Interval.from_json, usuals.get(weekday, []))])
+
+    def overlapping(self, start, end, exclude=None):
+        """Entries overlapping [start, end) sorted by start, except the ones of exclude, a (key, item) pair."""
+        lo = bisect.bisect_left(self._entries, (start - self._longest,))
+        hi = bisect.bisect_left(self._entries, (end,))
+        return [e for e in self._entries[lo:hi] if e.end > start and (e.key, e.item) != exclude]
+
+    def month_conflicts(self, month, year):
+        """Pairs of overlapping entries of which at least one is in the month."""
+        month_start = int(datetime(year, month, 1).timestamp())
+        next_month = datetime(year + month // 12, month % 12 + 1, 1)
+        entries = self.overlapping(month_start, int(next_month.timestamp()))
+        in_month = set(entries)
+        pairs = []
+        for entry in entries:
+            for other in self.overlapping(entry.start, entry.end, exclude=(entry.key, entry.item)):
+                # every pair once, the later one reports pairs within the month
+                if other not in in_month or other < entry:
+                    pairs.append((other, entry))
+        return pairs
+
+
+def build_index(store):
+    """Index of the OCD events and planned worktimes of all months in the store."""
+    index = OverlapIndex()
+    usuals = store.load_usuals()
+    index.set_usuals(usuals)
+    for month, year in store.ocd_months():
+        index.set_ocd(month, year, store.load_ocd(month, year))
+    for month, year in store.workday_months():
+        index.set_workdays(month, year, store.load_workdays(month, year), usuals)
+    return index
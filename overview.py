@@ -0,0 +1,174 @@
+"""Year overview: a table of the months of a year by day of month, loaded from the store as the view asks for them.
+
+A month is summarized once into the action, planned minutes and OCD minutes of its days. Summaries are kept in a
+bounded cache, least recently used first out. Loading a month queues its neighbours, which are loaded one per turn
+of the event loop while the view is idle, so scrolling on and switching years hit the cache.
+"""
+from calendar import monthrange
+from collections import OrderedDict
+from datetime import date
+from typing import NamedTuple
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
+from PyQt6.QtGui import QBrush, QColor
+
+from generator import ACTIONS
+from instrumentation import get_logger
+from intervals import OcdEvent, format_hm
+from overlaps import workday_intervals
+
+log = get_logger("overview")
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# Short labels of ACTIONS for the cells
+ACTION_CODES = ["W", "C", "V", "½V", "S", "SC", "FT"]
+ACTION_COLORS = ["#e8f5e9", "#fff8e1", "#e3f2fd", "#e3f2fd", "#fce4ec", "#f3e5f5", "#f3e5f5"]
+DAY_OFF_COLOR = "#eeeeee"
+OCD_MARKER = "●"
+# Months kept in memory, three years
+MONTH_CACHE_SIZE = 36
+
+
+class DaySummary(NamedTuple):
+    action: int = None  # None on a day without a workday
+    minutes: int = 0
+    ocd_minutes: int = 0
+
+
+def summarize_month(workdays, ocd, usuals):
+    """Summaries by day of month of the saved workdays and OCD events of a month, None if it was never saved."""
+    if workdays is None and not ocd:
+        return None
+    days = dict()
+    for workday in workdays or ():
+        minutes = sum(interval.duration for interval in workday_intervals(workday, usuals))
+        days[workday['dayOfMonth']] = DaySummary(workday['action'], minutes)
+    for event in map(OcdEvent.from_json, ocd):
+        day = event.start_datetime().day
+        summary = days.get(day, DaySummary())
+        days[day] = summary._replace(ocd_minutes=summary.ocd_minutes + (event.end - event.start) // 60)
+    return days
+
+
+class YearOverviewModel(QAbstractTableModel):
+    """Months of a year as rows and days of month as columns.
+
+    load_month(month, year) returns the summaries of a month as summarize_month does.
+    """
+
+    def __init__(self, load_month, year, parent=None, cache_size=MONTH_CACHE_SIZE):
+        super().__init__(parent)
+        self._load_month = load_month
+        self._year = year
+        self._cache_size = cache_size
+        self._cache = OrderedDict()  # (month, year) -> summaries, None for a month never saved
+        self._prefetch = list()
+        self._prefetchTimer = QTimer(self)
+        self._prefetchTimer.setInterval(0)
+        self._prefetchTimer.timeout.connect(self._prefetchNext)
+
+    @property
+    def year(self):
+        return self._year
+
+    def setYear(self, year):
+        self.beginResetModel()
+        self._year = year
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 12
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 31
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return str(section + 1)
+        return MONTH_NAMES[section]
+
+    def month(self, month, year):
+        """Summaries of a month, loaded on first use. Queues the neighbouring months."""
+        key = (month, year)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        summaries = self._store(key, self._load_month(month, year))
+        for m, y in ((month - 1, year) if month > 1 else (12, year - 1), (month + 1, year) if month < 12 else (1, year + 1)):
+            if (m, y) not in self._cache and (m, y) not in self._prefetch:
+                self._prefetch.append((m, y))
+        if self._prefetch:
+            self._prefetchTimer.start()
+        return summaries
+
+    def _store(self, key, summaries):
+        self._cache[key] = summaries
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return summaries
+
+    def _prefetchNext(self):
+        if not self._prefetch:
+            self._prefetchTimer.stop()
+            return
+        key = self._prefetch.pop(0)
+        if key not in self._cache:
+            self._store(key, self._load_month(*key))
+            log.debug("prefetched %d.%d", *key)
+
+    def isLoaded(self, month, year):
+        return (month, year) in self._cache
+
+    def refresh(self):
+        """Forget all months, after the store changed."""
+        self._cache.clear()
+        self._prefetch.clear()
+        self.dataChanged.emit(self.index(0, 0), self.index(11, 30))
+
+    def day(self, index):
+        """(date, DaySummary or None) of a cell, None for a cell past the end of its month."""
+        month = index.row() + 1
+        day_of_month = index.column() + 1
+        if day_of_month > monthrange(self._year, month)[1]:
+            return None
+        summaries = self.month(month, self._year)
+        return date(self._year, month, day_of_month), None if summaries is None else summaries.get(day_of_month)
+
+    def flags(self, index):
+        if not index.isValid() or index.column() + 1 > monthrange(self._year, index.row() + 1)[1]:
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole, Qt.ItemDataRole.BackgroundRole,
+                        Qt.ItemDataRole.TextAlignmentRole, Qt.ItemDataRole.UserRole):
+            return None
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        cell = self.day(index)
+        if cell is None:
+            return None
+        day, summary = cell
+        if role == Qt.ItemDataRole.UserRole:
+            return cell
+        if role == Qt.ItemDataRole.BackgroundRole:
+            if summary is None or summary.action is None:
+                return QBrush(QColor(DAY_OFF_COLOR))
+            return QBrush(QColor(ACTION_COLORS[summary.action]))
+        if summary is None:
+            return None if role == Qt.ItemDataRole.DisplayRole else f"{DAY_NAMES[day.weekday()]} {day:%d.%m.%Y}"
+        marker = f" {OCD_MARKER}" if summary.ocd_minutes else ""
+        if role == Qt.ItemDataRole.DisplayRole:
+            if summary.action is None:
+                return marker.strip() or None
+            return f"{ACTION_CODES[summary.action]}{marker}\n{format_hm(summary.minutes)}" if summary.minutes else \
+                f"{ACTION_CODES[summary.action]}{marker}"
+        text = f"{DAY_NAMES[day.weekday()]} {day:%d.%m.%Y}"
+        if summary.action is not None:
+            text += f": {ACTIONS[summary.action]}, {format_hm(summary.minutes)} planned"
+        if summary.ocd_minutes:
+            text += f", OCD {format_hm(summary.ocd_minutes)}"
+        return text
@@ -0,0 +1,154 @@
+"""Monte-Carlo simulation of generated months, to see the spread of the outcomes before a record is generated.
+
+What makes a generated month random is the shared jitter of the usual worktimes of a day and the monthly addition
+spread over the usual days by distribute_minutes, added to the end of each day. Both are drawn here for all
+realizations at once as NumPy arrays, everything else of a month is computed once with the generator's helpers.
+"""
+from calendar import monthrange
+from dataclasses import dataclass
+
+import numpy as np
+
+from balance import compute_balance
+from generator import (MINUTES_PER_DAY, RANDOM_OFFSET_MINUTES, WEEKDAYS, WORKTYPES, addition_weights, jitter_range,
+                       ocd_rows, usual_intervals)
+from intervals import Interval, format_hm
+
+DEFAULT_RUNS = 10000
+PERCENTILES = (5, 50, 95)
+
+
+@dataclass
+class MonthSimulation:
+    """Outcomes of all realizations of a month, realizations whose addition could not be distributed are not valid.
+
+    end_times holds the end of the last worktime of every usual day (columns in the order of days), totals the
+    worked minutes and balances the balance at the end of the month.
+    """
+    month: int
+    year: int
+    days: list
+    end_times: np.ndarray
+    totals: np.ndarray
+    balances: np.ndarray
+    valid: np.ndarray
+
+    @property
+    def failure_rate(self):
+        return 1.0 - self.valid.mean()
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """Percentiles of the valid realizations, None when there are none."""
+        if not self.valid.any():
+            return None
+        end_times = np.percentile(self.end_times[self.valid], percentiles, axis=0) if self.days else None
+        return {
+            "end_times": {day: end_times[:, i].round().astype(int).tolist() for i, day in enumerate(self.days)}
+            if end_times is not None else dict(),
+            "total": np.percentile(self.totals[self.valid], percentiles).round().astype(int).tolist(),
+            "balance": np.percentile(self.balances[self.valid], percentiles).round().astype(int).tolist(),
+        }
+
+
+def distribute_minutes(rng, runs, size, total_min, total_max, max_value, weights):
+    """distribute_minutes of the generator for all realizations, returns the additions and the valid realizations."""
+    if total_min > total_max:
+        raise ValueError("total_min cannot be greater than total_max.")
+    total = rng.integers(total_min, total_max + 1, size=runs)
+    # the generator gives up on totals that do not fit into the working days
+    valid = total <= size * max_value
+    remaining = np.where(valid, total, 0)
+    result = np.zeros((runs, size), dtype=np.int64)
+    remaining_weights = np.cumsum(np.asarray(weights, dtype=float)[::-1])[::-1]
+    for i in range(size):
+        left = size - i - 1
+        lo = np.maximum(0, remaining - left * max_value)
+        hi = np.minimum(max_value, remaining)
+        if remaining_weights[i] > 0:
+            share = remaining * weights[i] / remaining_weights[i]
+        else:
+            share = remaining / (left + 1)
+        center = np.clip(np.rint(share).astype(np.int64), lo, hi)
+        spread = np.minimum(center - lo, hi - center)
+        result[:, i] = center - spread + np.floor(rng.random(runs) * (2 * spread + 1)).astype(np.int64)
+        remaining -= result[:, i]
+    return result, valid
+
+
+def simulate_month(snapshot, carried, rng, runs):
+    """Simulate the month of a snapshot, carried is the balance at its start per realization."""
+    days_in_month = monthrange(snapshot.year, snapshot.month)[1]
+    counted = set(snapshot.rules.counted_types)
+    ocd_by_day = ocd_rows(snapshot)
+
+    # the month without the random parts, durations do not depend on the jitter
+    entries = [(o['type'], o['start_day'], o['start'], o['end_day'], o['end']) for rows in ocd_by_day.values() for o in rows]
+    days = []
+    last_ends = []
+    last_counted = []
+    delta_ranges = []
+    weekdays = []
+    for workday in sorted(snapshot.workdays, key=lambda w: w['dayOfMonth']):
+        day = workday['dayOfMonth']
+        if workday['action'] == 0:
+            usuals = usual_intervals(snapshot, workday)
+            entries.extend((WORKTYPES[u.type], day, u.start, day, u.end) for u in usuals)
+            days.append(day)
+            weekdays.append(WEEKDAYS.index(workday['dayOfWeek']))
+            last_ends.append(usuals[-1].end)
+            last_counted.append(WORKTYPES[usuals[-1].type] in counted)
+            delta_range = jitter_range(usuals) if RANDOM_OFFSET_MINUTES > 0 else None
+            delta_ranges.append(delta_range or (0, 0))
+        elif workday['action'] == 1:
+            entries.extend((WORKTYPES[w.type], day, w.start, day, w.end) for w in map(Interval.from_json, workday['worktimes']))
+    base = compute_balance(0, [w['action'] for w in snapshot.workdays], entries, days_in_month, snapshot.rules)
+
+    lo = np.array([r[0] for r in delta_ranges], dtype=np.int64)
+    hi = np.array([r[1] for r in delta_ranges], dtype=np.int64)
+    delta = lo + np.floor(rng.random((runs, len(days))) * (hi - lo + 1)).astype(np.int64)
+    ends = np.array(last_ends, dtype=np.int64) + delta
+
+    if snapshot.max_per_day > 0:
+        additions, valid = distribute_minutes(rng, runs, len(days), snapshot.total_min, snapshot.total_max,
+                                              snapshot.max_per_day, addition_weights(snapshot.addition_shape, weekdays))
+    else:
+        additions = np.zeros((runs, len(days)), dtype=np.int64)
+        valid = np.ones(runs, dtype=bool)
+    end_times = (ends + additions) % MINUTES_PER_DAY
+    extra = ((end_times - ends) * np.array(last_counted, dtype=np.int64)).sum(axis=1)
+
+    return MonthSimulation(month=snapshot.month,
+                           year=snapshot.year,
+                           days=days,
+                           end_times=end_times,
+                           totals=base.worked + extra,
+                           balances=carried + base.balance + extra,
+                           valid=valid)
+
+
+def simulate(snapshots, runs=DEFAULT_RUNS, seed=None):
+    """Simulate consecutive months, every month carries the simulated balance of the month before like generate_batch."""
+    rng = np.random.default_rng(seed)
+    carried = np.full(runs, snapshots[0].balance, dtype=np.int64)
+    simulations = []
+    for snapshot in snapshots:
+        simulation = simulate_month(snapshot, carried, rng, runs)
+        carried = simulation.balances
+        simulations.append(simulation)
+    return simulations
+
+
+def describe(simulation, percentiles=PERCENTILES):
+    """One line summary of a simulated month, the median followed by the outer percentiles."""
+    p = simulation.percentiles(percentiles)
+    if p is None:
+        return f"{simulation.month}.{simulation.year}: the monthly addition never fits into the working days"
+    mid = len(percentiles) // 2
+    text = (f"{simulation.month}.{simulation.year}: total {format_hm(p['total'][mid])} "
+            f"({format_hm(p['total'][0])}..{format_hm(p['total'][-1])}), "
+            f"balance {format_hm(p['balance'][mid])} ({format_hm(p['balance'][0])}..{format_hm(p['balance'][-1])})")
+    if p['end_times']:
+        text += f", latest end {format_hm(max(end[-1] for end in p['end_times'].values()))} (p{percentiles[-1]})"
+    if simulation.failure_rate > 0:
+        text += f", {simulation.failure_rate:.0%} of generations fail"
+    return text
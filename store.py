@@ -0,0 +1,296 @@
+"""SQLite store of the workdays, worktime intervals, OCD events, usual worktimes, the balance ledger and the
+generated records.
+
+The load/save methods exchange the JSON encoding of the models (Workdays.getData, OnCallDutyList.getEvents,
+WeekdayUsualsList.getUsuals and the balance ledger in signed minutes), see intervals.py, and of generator.MonthPlan. Every write runs in
+its own transaction.
+"""
+import os
+import re
+import json
+import sqlite3
+from contextlib import contextmanager
+
+from balance import minutes_from_hm
+from instrumentation import get_logger, span
+from intervals import Interval, OcdEvent
+from journal import JOURNAL_FILENAME, Journal
+
+log = get_logger("store")
+
+STORE_FILENAME = 'wtr.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workdays (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    weekday TEXT NOT NULL,
+    action INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (year, month, day)
+);
+CREATE TABLE IF NOT EXISTS worktimes (
+    id INTEGER PRIMARY KEY,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    type INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS worktimes_day ON worktimes (year, month, day, start);
+CREATE TABLE IF NOT EXISTS ocd (
+    id INTEGER PRIMARY KEY,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    comments TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS ocd_month ON ocd (year, month, start);
+CREATE TABLE IF NOT EXISTS usuals (
+    id INTEGER PRIMARY KEY,
+    weekday TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    type INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS balance (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    minutes INTEGER NOT NULL,
+    PRIMARY KEY (year, month)
+);
+CREATE TABLE IF NOT EXISTS generated (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    absences TEXT NOT NULL,
+    PRIMARY KEY (year, month)
+);
+CREATE TABLE IF NOT EXISTS generated_days (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    addition INTEGER NOT NULL,
+    rows TEXT NOT NULL,
+    first_row INTEGER,
+    PRIMARY KEY (year, month, day)
+);
+"""
+
+# PRAGMA user_version after the schema was created and the JSON files were migrated
+SCHEMA_VERSION = 1
+
+
+class Store:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        if "first_row" not in {column[1] for column in self.connection.execute("PRAGMA table_info(generated_days)")}:
+            # stores created before the rows of generated days had places of their own
+            self.connection.execute("ALTER TABLE generated_days ADD COLUMN first_row INTEGER")
+        self._transaction_depth = 0
+
+    @contextmanager
+    def transaction(self):
+        """Commit on exit, or roll back on an exception. Nested transactions join the outermost one."""
+        if self._transaction_depth:
+            yield
+            return
+        self._transaction_depth += 1
+        try:
+            with self.connection:
+                yield
+        finally:
+            self._transaction_depth -= 1
+
+    @property
+    def version(self):
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    # workdays and their worktime intervals
+
+    def load_workdays(self, month, year):
+        """Saved workdays of a month, None if the month was never saved."""
+        days = self.connection.execute("SELECT day, weekday, action FROM workdays WHERE year = ? AND month = ? "
+                                       "ORDER BY day", (year, month)).fetchall()
+        if not days:
+            return None
+        worktimes = {day: [] for day, _, _ in days}
+        for day, start, end, work_type in self.connection.execute(
+                "SELECT day, start, end, type FROM worktimes WHERE year = ? AND month = ? ORDER BY day, start, id",
+                (year, month)):
+            worktimes.setdefault(day, []).append(Interval(start, end, work_type).to_json())
+        return [{'dayOfMonth': day, 'dayOfWeek': weekday, 'action': action, 'worktimes': worktimes[day]}
+                for day, weekday, action in days]
+
+    def save_workdays(self, month, year, workdays):
+        with self.transaction():
+            self.connection.execute("DELETE FROM workdays WHERE year = ? AND month = ?", (year, month))
+            self.connection.execute("DELETE FROM worktimes WHERE year = ? AND month = ?", (year, month))
+            self.connection.executemany("INSERT INTO workdays (year, month, day, weekday, action) VALUES (?, ?, ?, ?, ?)",
+                                        [(year, month, x['dayOfMonth'], x['dayOfWeek'], x['action']) for x in workdays])
+            self.connection.executemany("INSERT INTO worktimes (year, month, day, start, end, type) VALUES (?, ?, ?, ?, ?, ?)",
+                                        [(year, month, x['dayOfMonth'], *Interval.from_json(w))
+                                         for x in workdays for w in x['worktimes']])
+
+    def set_action(self, month, year, day, action):
+        with self.transaction():
+            self.connection.execute("UPDATE workdays SET action = ? WHERE year = ? AND month = ? AND day = ?",
+                                    (action, year, month, day))
+
+    def save_worktimes(self, month, year, day, worktimes):
+        """Replace the worktime intervals of a single day, worktimes as in WorktimeListModel.getData."""
+        with self.transaction():
+            self.connection.execute("DELETE FROM worktimes WHERE year = ? AND month = ? AND day = ?", (year, month, day))
+            self.connection.executemany("INSERT INTO worktimes (year, month, day, start, end, type) VALUES (?, ?, ?, ?, ?, ?)",
+                                        [(year, month, day, *Interval.from_json(w)) for w in worktimes])
+
+    def workday_months(self):
+        return self.connection.execute("SELECT DISTINCT month, year FROM workdays ORDER BY year, month").fetchall()
+
+    # on call duty events, start and end in seconds since the epoch
+
+    def load_ocd(self, month, year):
+        return [{'start': start, 'end': end, 'comments': comments} for start, end, comments in self.connection.execute(
+            "SELECT start, end, comments FROM ocd WHERE year = ? AND month = ? ORDER BY start, id", (year, month))]
+
+    def save_ocd(self, month, year, events):
+        with self.transaction():
+            self.connection.execute("DELETE FROM ocd WHERE year = ? AND month = ?", (year, month))
+            self.connection.executemany("INSERT INTO ocd (year, month, start, end, comments) VALUES (?, ?, ?, ?, ?)",
+                                        [(year, month, *OcdEvent.from_json(x)) for x in events])
+
+    def ocd_months(self):
+        return self.connection.execute("SELECT DISTINCT month, year FROM ocd ORDER BY year, month").fetchall()
+
+    # usual worktimes per weekday, keyed by the weekday index as a string
+
+    def load_usuals(self):
+        usuals = dict()
+        for weekday, start, end, work_type in self.connection.execute(
+                "SELECT weekday, start, end, type FROM usuals ORDER BY weekday, start, id"):
+            usuals.setdefault(weekday, []).append(Interval(start, end, work_type).to_json())
+        return usuals
+
+    def save_usuals(self, usuals):
+        with self.transaction():
+            self.connection.execute("DELETE FROM usuals")
+            self.connection.executemany("INSERT INTO usuals (weekday, start, end, type) VALUES (?, ?, ?, ?)",
+                                        [(weekday, *Interval.from_json(x)) for weekday, items in usuals.items() for x in items])
+
+    # balance ledger, the balance carried into a month
+
+    def load_balance(self):
+        """The ledger as a "M.Y" -> signed minutes dict."""
+        return {f"{month}.{year}": minutes
+                for month, year, minutes in self.connection.execute("SELECT month, year, minutes FROM balance")}
+
+    def set_balance(self, month, year, minutes):
+        with self.transaction():
+            self.connection.execute("INSERT INTO balance (year, month, minutes) VALUES (?, ?, ?) "
+                                    "ON CONFLICT (year, month) DO UPDATE SET minutes = excluded.minutes",
+                                    (year, month, minutes))
+
+    def save_balance(self, balance):
+        """Save a "M.Y" -> signed minutes dict, balance.json and older exports have {"h", "m"} dicts instead."""
+        with self.transaction():
+            for key, value in balance.items():
+                month, year = key.split(".")
+                if isinstance(value, dict):
+                    value = minutes_from_hm(value["h"], value["m"])
+                self.connection.execute("INSERT INTO balance (year, month, minutes) VALUES (?, ?, ?) "
+                                        "ON CONFLICT (year, month) DO UPDATE SET minutes = excluded.minutes",
+                                        (int(year), int(month), value))
+
+    # generated records, the rows of every day with the digest of what they were generated from
+
+    def load_generated(self, month, year):
+        """The MonthPlan JSON of the record last generated for a month, None if there is none."""
+        record = self.connection.execute("SELECT filename, absences FROM generated WHERE year = ? AND month = ?",
+                                         (year, month)).fetchone()
+        if record is None:
+            return None
+        days = [{'dayOfMonth': day, 'digest': digest, 'delta': delta, 'addition': addition, 'rows': json.loads(rows),
+                 'first_row': first_row}
+                for day, digest, delta, addition, rows, first_row in self.connection.execute(
+                    "SELECT day, digest, delta, addition, rows, first_row FROM generated_days "
+                    "WHERE year = ? AND month = ? ORDER BY day", (year, month))]
+        return {'month': month, 'year': year, 'filename': record[0], 'absences': json.loads(record[1]), 'days': days}
+
+    def save_generated(self, month, year, plan):
+        with self.transaction():
+            self.connection.execute("DELETE FROM generated_days WHERE year = ? AND month = ?", (year, month))
+            self.connection.execute("INSERT INTO generated (year, month, filename, absences) VALUES (?, ?, ?, ?) "
+                                    "ON CONFLICT (year, month) DO UPDATE SET filename = excluded.filename, "
+                                    "absences = excluded.absences",
+                                    (year, month, plan['filename'], json.dumps(plan['absences'])))
+            self.connection.executemany("INSERT INTO generated_days (year, month, day, digest, delta, addition, rows, "
+                                        "first_row) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                        [(year, month, d['dayOfMonth'], d['digest'], d['delta'], d['addition'],
+                                          json.dumps(d['rows']), d.get('first_row')) for d in plan['days']])
+
+    # migration
+
+    def migrate_json(self, directory):
+        """Import balance.json, usuals.json, worktimes-M-Y.json and ocd-M-Y.json from directory, once.
+
+        The JSON files are left in place, they are simply not read anymore.
+        """
+        if self.version >= SCHEMA_VERSION:
+            return
+        log.info("Migrating JSON files from %s", directory)
+
+        def load(fn):
+            try:
+                with open(os.path.join(directory, fn), 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("Skipping %s: %s", fn, e)
+                return None
+
+        files = os.listdir(directory) if os.path.isdir(directory) else []
+        balance = load('balance.json') if 'balance.json' in files else None
+        if balance:
+            self.save_balance(balance)
+        usuals = load('usuals.json') if 'usuals.json' in files else None
+        if usuals:
+            self.save_usuals(usuals)
+        for fn in files:
+            match = re.fullmatch(r'(worktimes|ocd)-(\d+)-(\d+)\.json', fn)
+            data = load(fn) if match is not None else None
+            if not data:
+                continue
+            kind, month, year = match.group(1), int(match.group(2)), int(match.group(3))
+            if kind == 'worktimes':
+                self.save_workdays(month, year, data)
+            else:
+                self.save_ocd(month, year, data)
+        with self.transaction():
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def open_store(directory=None):
+    """Open the store in directory, the config dir by default.
+
+    The JSON files are migrated on first use and edits left in the journal by an unfinished session are replayed.
+    """
+    if directory is None:
+        from config import config_dir
+        directory = config_dir()
+    store = Store(os.path.join(directory, STORE_FILENAME))
+    store.migrate_json(directory)
+    journal = Journal(os.path.join(directory, JOURNAL_FILENAME))
+    with span("journal replay", log):
+        replayed = journal.compact(store)
+    journal.close()
+    if replayed:
+        log.info("Replayed %d journal entries", replayed)
+    return store
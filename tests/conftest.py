@@ -0,0 +1,20 @@
+"""Tests and benchmarks, run with python -m pytest from the repository root. The benchmarks need pytest-benchmark.
+
+Everything runs headless: Qt on its offscreen platform, the settings and stores in a temporary config dir and Excel
+replaced by fake_excel.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(autouse=True)
+def config_home(tmp_path, monkeypatch):
+    """A config dir of its own for every test, so the settings and store of the user are never touched."""
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    return tmp_path / "config"
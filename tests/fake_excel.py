@@ -0,0 +1,113 @@
+"""A stand-in for the part of xlwings that XlwingsBackend uses: app.books, book.sheets[...].range(...).value, save and
+calculate. It is handed to XlwingsBackend as its ExcelSession, so the Excel code path runs without Excel.
+
+Workbooks are dicts of sheet -> {(row, column): value} like the ones of MemoryBackend. Every call that would cross to
+Excel is counted in FakeSession.io.
+"""
+from collections import Counter
+
+from backends import _cell, _cell_range
+
+
+class FakeRange:
+    def __init__(self, book, sheet, address, ndim=None):
+        self.book = book
+        self.sheet = sheet
+        self.address = address
+        self.ndim = ndim
+
+    def options(self, ndim=None):
+        return FakeRange(self.book, self.sheet, self.address, ndim)
+
+    @property
+    def value(self):
+        self.book.app.io["read"] += 1
+        cells = self.book.cells.get(self.sheet, dict())
+        if ':' not in self.address:
+            value = cells.get(_cell(self.address))
+            return [[value]] if self.ndim == 2 else value
+        first_row, first_column, last_row, last_column = _cell_range(self.address)
+        return [[cells.get((row, column)) for column in range(first_column, last_column + 1)]
+                for row in range(first_row, last_row + 1)]
+
+    @value.setter
+    def value(self, values):
+        self.book.app.io["write"] += 1
+        cells = self.book.cells.setdefault(self.sheet, dict())
+        row, column = _cell(self.address.split(':')[0])
+        if not isinstance(values, (list, tuple)):
+            cells[(row, column)] = values
+        elif values and not isinstance(values[0], (list, tuple)):
+            # a flat list is a row, like xlwings writes it
+            for c, value in enumerate(values):
+                cells[(row, column + c)] = value
+        else:
+            for r, values_of_row in enumerate(values):
+                for c, value in enumerate(values_of_row):
+                    cells[(row + r, column + c)] = value
+        if self.book.app.calculation == 'automatic':
+            self.book.app.recalculate(self.book)
+
+
+class FakeSheet:
+    def __init__(self, book, name):
+        self.book = book
+        self.name = name
+
+    def range(self, address):
+        return FakeRange(self.book, self.name, address)
+
+
+class FakeSheets:
+    def __init__(self, book):
+        self.book = book
+
+    def __getitem__(self, name):
+        return FakeSheet(self.book, name)
+
+
+class FakeBook:
+    def __init__(self, app, cells):
+        self.app = app
+        self.cells = cells
+        self.sheets = FakeSheets(self)
+
+    def save(self, path):
+        self.app.io["save"] += 1
+        self.app.saved[path] = {sheet: dict(cells) for sheet, cells in self.cells.items()}
+
+
+class FakeSession:
+    """An ExcelSession that is its own app: it opens copies of templates[path] and computes their formulas with
+    formulas(workbook), after every write while calculation is automatic and on calculate()."""
+
+    def __init__(self, templates=None, formulas=None):
+        self.templates = templates if templates is not None else dict()
+        self.formulas = formulas
+        self.screen_updating = True
+        self.calculation = 'automatic'
+        self.io = Counter()
+        self.saved = dict()
+        self.books = list()
+
+    def book(self, path):
+        self.io["open"] += 1
+        template = self.templates.get(path, dict())
+        book = FakeBook(self, {sheet: dict(cells) for sheet, cells in template.items()})
+        self.books.append(book)
+        return book
+
+    def release(self, path):
+        self.books = list()
+
+    def recalculate(self, book):
+        if self.formulas is not None:
+            self.formulas(book.cells)
+
+    def calculate(self):
+        self.io["calculate"] += 1
+        for book in self.books:
+            self.recalculate(book)
+
+    def shutdown(self):
+        self.books = list()
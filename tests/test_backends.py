@@ -0,0 +1,104 @@
+"""The cells a record gets have to be the same whichever backend writes it.
+
+Excel converts what it is given like a typed-in value: the fake Excel keeps the raw values, which are converted here
+the way Excel does it, independently of backends.excel_value.
+"""
+import os
+from datetime import time
+
+import openpyxl
+import pytest
+
+from backends import OpenpyxlBackend, XlwingsBackend
+from bench import USUALS, fixture_ocd, fixture_workdays
+from fake_excel import FakeSession
+from generator import (ACTIONS, PLAN_ABSENCE_COL, PLAN_SHEET, PLAN_STARTING_ROW, PROFILE_SHEET, RECORD_SHEET,
+                       WORKTIME_SHEET, WORKTIME_STARTING_ROW, MonthSnapshot, generate_record)
+from workcalendar import WorkCalendar
+
+SHEETS = [PROFILE_SHEET, PLAN_SHEET, WORKTIME_SHEET, RECORD_SHEET]
+
+
+def stored(value):
+    """A cell value as the number or text Excel keeps: a time is the fraction of its day."""
+    if isinstance(value, time):
+        return (value.hour * 3600 + value.minute * 60 + value.second) / 86400
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def typed_in(value):
+    """What Excel keeps of a value assigned to a cell: strings of times of day and numbers are converted."""
+    if isinstance(value, str):
+        try:
+            hours, minutes = value.split(':')
+            return (int(hours) * 60 + int(minutes)) / 1440
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return stored(value)
+
+
+@pytest.fixture
+def template(tmp_path):
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    for name in SHEETS:
+        book.create_sheet(name)
+    path = tmp_path / "LastName_FirstName_template.xlsx"
+    book.save(path)
+    return str(path)
+
+
+def snapshot(template_file, working_path):
+    month, year = 3, 2024
+    return MonthSnapshot(month=month, year=year, template_file=template_file, working_path=working_path,
+                         first_name="First", last_name="Last", group_name="Group", balance=-165,
+                         total_min=120, total_max=240, max_per_day=30,
+                         workdays=fixture_workdays(WorkCalendar().working_days(month, year)), usuals=USUALS,
+                         ocd=fixture_ocd(month, year), seed=7)
+
+
+def test_openpyxl_writes_times_and_numbers(template, tmp_path):
+    result = generate_record(snapshot(template, str(tmp_path)), OpenpyxlBackend())
+    sheet = openpyxl.load_workbook(tmp_path / result.filename)[WORKTIME_SHEET]
+    for row in sheet.iter_rows(min_row=WORKTIME_STARTING_ROW):
+        work_type, start_day, start, end_day, end = (cell for cell in row if cell.value is not None)
+        assert work_type.data_type == 's'
+        assert isinstance(start_day.value, int) and isinstance(end_day.value, int)
+        assert isinstance(start.value, time) and isinstance(end.value, time)
+        assert start.number_format == end.number_format == 'h:mm'
+
+
+def test_absences_leave_the_other_days_alone(template, tmp_path):
+    book = openpyxl.load_workbook(template)
+    for row in range(PLAN_STARTING_ROW, PLAN_STARTING_ROW + 31):
+        book[PLAN_SHEET][f"{PLAN_ABSENCE_COL}{row}"] = "template"
+    book.save(template)
+    month = snapshot(template, str(tmp_path))
+    result = generate_record(month, OpenpyxlBackend())
+    sheet = openpyxl.load_workbook(tmp_path / result.filename)[PLAN_SHEET]
+    absences = {w['dayOfMonth']: ACTIONS[w['action']] for w in month.workdays if w['action'] >= 2}
+    assert absences
+    for day in range(1, 32):
+        assert sheet[f"{PLAN_ABSENCE_COL}{PLAN_STARTING_ROW + day - 1}"].value == absences.get(day, "template")
+
+
+def test_backends_write_the_same_cells(template, tmp_path):
+    openpyxl_result = generate_record(snapshot(template, str(tmp_path)), OpenpyxlBackend())
+    written = openpyxl.load_workbook(tmp_path / openpyxl_result.filename)
+
+    session = FakeSession()
+    excel_result = generate_record(snapshot(template, "excel"), XlwingsBackend(session=session))
+    excel = session.saved[os.path.join("excel", excel_result.filename)]
+
+    for name in SHEETS:
+        expected = {address: typed_in(value) for address, value in excel.get(name, dict()).items()
+                    if value is not None}
+        actual = {(cell.row, cell.column): stored(cell.value) for row in written[name].iter_rows()
+                  for cell in row if cell.value is not None}
+        assert actual == expected, name
@@ -0,0 +1,27 @@
+"""A balance keeps its sign through every form it takes: minutes, (h, m) and the 'h:mm' text of the record."""
+import pytest
+
+from balance import MonthBalance, hm_from_minutes, minutes_from_hm, parse_hm
+from generator import GenerationResult
+from intervals import format_hm
+
+BALANCES = [-90, -60, -30, -1, 0, 1, 30, 60, 90]
+
+
+@pytest.mark.parametrize("minutes", BALANCES)
+def test_round_trip(minutes):
+    assert minutes_from_hm(*hm_from_minutes(minutes)) == minutes
+    assert parse_hm(format_hm(minutes)) == minutes
+
+
+def test_negative_hours_apply_to_the_minutes():
+    assert minutes_from_hm(-1, 30) == minutes_from_hm(-1, -30) == -90
+    assert minutes_from_hm(0, -30) == -30
+
+
+@pytest.mark.parametrize("minutes", BALANCES)
+def test_next_balance(minutes):
+    computed = MonthBalance(carried=minutes, worked=0, ocd=0, credited=0, target=0)
+    assert GenerationResult("record.xlsx", "2.2024", computed).next_balance() == minutes
+    recorded = GenerationResult("record.xlsx", "2.2024", computed, record_balance=format_hm(minutes))
+    assert recorded.verified and recorded.next_balance() == minutes
@@ -0,0 +1,47 @@
+"""Every month of a batch carries the signed balance the month before ended with, also a deficit under an hour."""
+import dataclasses
+
+import openpyxl
+import pytest
+
+from batch import generate_batch, month_range
+from bench import USUALS, fixture_workdays
+from generator import PLAN_SHEET, PROFILE_SHEET, RECORD_SHEET, WORKTIME_SHEET, MonthSnapshot, plan_balance, plan_days
+from workcalendar import WorkCalendar
+
+MONTHS = month_range(11, 2024, 3)
+
+
+@pytest.fixture
+def template(tmp_path):
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    for name in [PROFILE_SHEET, PLAN_SHEET, WORKTIME_SHEET, RECORD_SHEET]:
+        book.create_sheet(name)
+    path = tmp_path / "LastName_FirstName_template.xlsx"
+    book.save(path)
+    return str(path)
+
+
+def snapshots(template_file, working_path):
+    base = MonthSnapshot(month=0, year=0, template_file=template_file, working_path=working_path, first_name="First",
+                         last_name="Last", group_name="Group", balance=0, total_min=120, total_max=240, max_per_day=30,
+                         workdays=(), usuals=USUALS, ocd=(), seed=5)
+    return [dataclasses.replace(base, month=month, year=year,
+                                workdays=fixture_workdays(WorkCalendar().working_days(month, year)))
+            for month, year in MONTHS]
+
+
+def test_chain_carries_a_deficit_under_an_hour(template, tmp_path):
+    months = snapshots(template, str(tmp_path))
+    # the first month ends 30 minutes short
+    first = months[0]
+    months[0] = dataclasses.replace(first, balance=-30 - plan_balance(first, plan_days(first).rows).balance)
+
+    results = sorted(generate_batch(months, "openpyxl", max_workers=1), key=lambda r: (r.plan.year, r.plan.month))
+    assert [(r.plan.month, r.plan.year) for r in results] == MONTHS
+    assert results[0].next_balance() == -30
+    for before, after in zip(results, results[1:]):
+        assert after.balance.carried == before.balance.balance
+    record = openpyxl.load_workbook(tmp_path / results[1].filename)[PLAN_SHEET]
+    assert (record["E10"].value, record["G10"].value) == (0, -30)
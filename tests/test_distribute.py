@@ -0,0 +1,35 @@
+"""distribute_minutes has to hit its total exactly within the caps, in time linear in the days."""
+import random
+
+import pytest
+
+from bench import DISTRIBUTE_CASES, distribute_budget
+from generator import addition_weights, distribute_minutes
+
+
+@pytest.mark.parametrize("shape", ["uniform", "front-loaded", "weekday"])
+@pytest.mark.parametrize("size, max_value", DISTRIBUTE_CASES)
+def test_bounded_total(size, max_value, shape):
+    rng = random.Random(size * max_value)
+    total_max = size * max_value
+    total_min = total_max * 3 // 4
+    weights = addition_weights(shape, [day % 5 for day in range(size)])
+    for _ in range(20):
+        values = distribute_minutes(size, total_min, total_max, max_value, rng, weights)
+        assert len(values) == size
+        assert total_min <= sum(values) <= total_max
+        assert 0 <= min(values) and max(values) <= max_value
+
+
+def test_seeded_runs_repeat():
+    first = distribute_minutes(23, 100, 400, 30, random.Random(1))
+    assert distribute_minutes(23, 100, 400, 30, random.Random(1)) == first
+
+
+@pytest.mark.parametrize("size, max_value", DISTRIBUTE_CASES)
+def test_wall_time(benchmark, size, max_value):
+    rng = random.Random(0)
+    total_max = size * max_value
+    benchmark(distribute_minutes, size, total_max * 3 // 4, total_max, max_value, rng)
+    if not benchmark.disabled:
+        assert benchmark.stats.stats.median <= distribute_budget(size)
@@ -0,0 +1,67 @@
+"""Generation of synthetic months through the Excel code path, with Excel replaced by fake_excel.
+
+The rows written have to match the golden digests of bench.py, the calls to the workbook their count exactly, and
+the wall time and peak memory of a scenario have to stay within the budgets of bench.py.
+"""
+import hashlib
+import tracemalloc
+
+import pytest
+
+from backends import MemoryBackend, XlwingsBackend
+from bench import (GENERATE_BUDGETS, GENERATE_GOLDEN, GENERATE_REPEAT, GENERATE_SCENARIOS, plan_formulas,
+                   run_scenario, worktime_digest)
+from fake_excel import FakeSession
+
+# Calls to Excel per month: reading the working days opens the template, writes the month and reads the plan,
+# generating opens it again, writes the month, balance, profile, the absences of the fixture in two runs and the
+# worktimes as a single block, recalculates once, saves and reads the balance of the record
+CALLS_PER_MONTH = {"open": 2, "read": 2, "write": 8, "calculate": 1, "save": 1}
+
+
+def excel_backend():
+    return XlwingsBackend(session=FakeSession(formulas=plan_formulas))
+
+
+def rows_digest(saved):
+    digest = hashlib.sha256()
+    for book in saved.values():
+        worktime_digest(book, digest)
+    return digest.hexdigest()[:16]
+
+
+@pytest.mark.parametrize("scenario", GENERATE_SCENARIOS)
+def test_excel_rows_and_calls(scenario):
+    months, dense_ocd, seed = GENERATE_SCENARIOS[scenario]
+    backend = run_scenario(months, dense_ocd, seed, excel_backend())
+    assert rows_digest(backend.session.saved) == GENERATE_GOLDEN[scenario]
+    assert backend.session.io == {op: count * len(months) for op, count in CALLS_PER_MONTH.items()}
+
+
+@pytest.mark.parametrize("scenario", GENERATE_SCENARIOS)
+def test_memory_rows_and_calls(scenario):
+    months, dense_ocd, seed = GENERATE_SCENARIOS[scenario]
+    backend = run_scenario(months, dense_ocd, seed, MemoryBackend(calculate=plan_formulas))
+    assert rows_digest(backend.saved) == GENERATE_GOLDEN[scenario]
+    assert sum(backend.io.values()) == GENERATE_BUDGETS[scenario][1]
+
+
+@pytest.mark.parametrize("scenario", GENERATE_SCENARIOS)
+def test_peak_memory(scenario):
+    months, dense_ocd, seed = GENERATE_SCENARIOS[scenario]
+    tracemalloc.start()
+    try:
+        run_scenario(months, dense_ocd, seed, excel_backend())
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+    assert peak <= GENERATE_BUDGETS[scenario][2]
+
+
+@pytest.mark.parametrize("scenario", GENERATE_SCENARIOS)
+def test_wall_time(benchmark, scenario):
+    months, dense_ocd, seed = GENERATE_SCENARIOS[scenario]
+    benchmark.pedantic(run_scenario, setup=lambda: ((months, dense_ocd, seed, excel_backend()), {}),
+                       rounds=GENERATE_REPEAT)
+    if not benchmark.disabled:
+        assert benchmark.stats.stats.min <= GENERATE_BUDGETS[scenario][0]
@@ -0,0 +1,25 @@
+"""Changed usuals re-plan the usual days in the overlap index the way rebuilding it from the store would."""
+from bench import USUALS, fixture_workdays
+from intervals import Interval
+from overlaps import build_index
+from store import Store
+from workcalendar import WorkCalendar
+
+MONTHS = [(3, 2024), (4, 2024)]
+
+
+def entries(index):
+    return sorted(index.overlapping(0, 2 ** 40))
+
+
+def test_set_usuals_matches_a_rebuilt_index(tmp_path):
+    store = Store(str(tmp_path / "store.sqlite"))
+    store.save_usuals(USUALS)
+    for month, year in MONTHS:
+        store.save_workdays(month, year, fixture_workdays(WorkCalendar().working_days(month, year)))
+    index = build_index(store)
+
+    usuals = dict(USUALS, **{"2": [Interval(9 * 60, 13 * 60, 0).to_json()], "4": []})
+    index.set_usuals(usuals)
+    store.save_usuals(usuals)
+    assert entries(index) == entries(build_index(store))
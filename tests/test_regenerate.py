@@ -0,0 +1,103 @@
+"""Patching a record rewrites only the rows of the days that changed and keeps the total addition of the month."""
+import dataclasses
+import os
+import sqlite3
+
+import pytest
+
+from backends import MemoryBackend
+from bench import TEMPLATE, USUALS, fixture_workdays, plan_formulas
+from generator import (WORKTIME_SHEET, WORKTIME_STARTING_ROW, MonthPlan, MonthSnapshot, generate_record,
+                       read_working_days)
+from intervals import Interval
+from store import Store
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend(calculate=plan_formulas)
+
+
+@pytest.fixture
+def generated(backend, tmp_path):
+    """(snapshot, result) of a generated month whose record can be patched."""
+    month, year = 4, 2024
+    snapshot = MonthSnapshot(month=month, year=year, template_file=TEMPLATE, working_path=str(tmp_path),
+                             first_name="First", last_name="Last", group_name="Group", balance=0,
+                             total_min=120, total_max=240, max_per_day=30,
+                             workdays=fixture_workdays(read_working_days(backend, TEMPLATE, month, year)),
+                             usuals=USUALS, ocd=(), seed=3)
+    return snapshot, generate(backend, snapshot)
+
+
+def generate(backend, snapshot, previous=None):
+    result = generate_record(snapshot, backend, previous=previous)
+    # the record is opened from the workbook saved by the backend
+    path = os.path.join(snapshot.working_path, result.filename)
+    open(path, 'w').close()
+    backend.templates[path] = backend.saved[path]
+    return result
+
+
+def with_workday(snapshot, day, **changes):
+    return dataclasses.replace(snapshot, workdays=tuple(dict(w, **changes) if w['dayOfMonth'] == day else w
+                                                        for w in snapshot.workdays))
+
+
+def total_addition(plan):
+    return sum(day.addition for day in plan.days.values())
+
+
+def sheet(backend, result, snapshot):
+    cells = backend.saved[os.path.join(snapshot.working_path, result.filename)][WORKTIME_SHEET]
+    return {address: value for address, value in cells.items() if value is not None}
+
+
+def test_addition_kept_when_only_an_absence_changed(backend, generated):
+    snapshot, result = generated
+    day = next(day for day, plan in result.plan.days.items() if plan.addition)
+    patched = generate(backend, with_workday(snapshot, day, action=2), result.plan)
+    assert total_addition(patched.plan) == total_addition(result.plan)
+
+
+def test_a_day_gaining_a_row_moves_no_other_day(backend, generated):
+    snapshot, result = generated
+    workday = next(w for w in snapshot.workdays if w['action'] == 1)
+    day = workday['dayOfMonth']
+    worktimes = [Interval(6 * 60, 7 * 60, 0).to_json()] + workday['worktimes']
+    before = sheet(backend, result, snapshot)
+    writes = backend.io["write"]
+    patched = generate(backend, with_workday(snapshot, day, worktimes=worktimes), result.plan)
+    after = sheet(backend, patched, snapshot)
+
+    old, new = result.plan.days[day], patched.plan.days[day]
+    assert len(new.rows) == len(old.rows) + 1
+    day_rows = {WORKTIME_STARTING_ROW + plan.first_row + i for plan in (old, new) for i in range(len(plan.rows))}
+    assert {row for (row, column), _ in set(before.items()) ^ set(after.items())} <= day_rows
+    for other, plan in patched.plan.days.items():
+        if other != day:
+            assert plan.first_row == result.plan.days[other].first_row
+    # month, balance, profile, the rows cleared and the rows written
+    assert backend.io["write"] - writes <= 6
+
+
+def test_plans_saved_without_places_are_read_in_order(generated):
+    _, result = generated
+    data = result.plan.to_json()
+    for day in data['days']:
+        del day['first_row']
+    plan = MonthPlan.from_json(data)
+    assert plan.sheet_rows() == plan.rows == result.plan.rows
+
+
+def test_store_adds_the_places_to_an_older_store(generated, tmp_path):
+    _, result = generated
+    path = str(tmp_path / "old.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE generated_days (year INTEGER NOT NULL, month INTEGER NOT NULL, "
+                       "day INTEGER NOT NULL, digest TEXT NOT NULL, delta INTEGER NOT NULL, addition INTEGER NOT NULL, "
+                       "rows TEXT NOT NULL, PRIMARY KEY (year, month, day))")
+    connection.close()
+    store = Store(path)
+    store.save_generated(result.plan.month, result.plan.year, result.plan.to_json())
+    assert MonthPlan.from_json(store.load_generated(result.plan.month, result.plan.year)) == result.plan
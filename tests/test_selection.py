@@ -0,0 +1,20 @@
+"""Editing the worktimes of a day costs the same after hundreds of day selections as after the first one.
+
+The updateTotal calls per edit are exact, the time of an edit is only compared with the one of the first round.
+"""
+from bench import (SELECTION_SLOWDOWN, SELECTION_UPDATES_BUDGET, counted_update_total, measure_selections,
+                   selection_window)
+
+
+def test_edit_cost_stays_constant():
+    with counted_update_total() as updates:
+        app, window = selection_window()  # the window lives as long as app
+        try:
+            rounds = list(measure_selections(window, updates))
+        finally:
+            window.close()
+    baseline_selections, baseline_elapsed, baseline_updates = rounds[0]
+    assert baseline_selections >= 1 and baseline_updates > 0
+    for selections, elapsed, per_edit in rounds:
+        assert per_edit == baseline_updates <= SELECTION_UPDATES_BUDGET, f"after {selections} selections"
+        assert elapsed <= SELECTION_SLOWDOWN * baseline_elapsed, f"after {selections} selections"
@@ -0,0 +1,23 @@
+"""Startup of the CLI and the GUI from the sources, against the budgets of cli.py."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+
+
+@pytest.mark.parametrize("name", sorted(cli.STARTUP_BUDGETS))
+def test_startup_time(name):
+    # the best of a few runs, the first one also compiles the sources
+    assert min(cli.startup_time(name) for _ in range(3)) <= cli.STARTUP_BUDGETS[name]
+
+
+def test_cli_does_not_load_the_gui_or_excel():
+    probe = ("import sys, cli; cli.main(['dump', '--month', '1', '--year', '2000']); "
+             "print(sorted(m for m in ('PyQt6.QtWidgets', 'PyQt6.QtGui', 'xlwings', 'openpyxl') if m in sys.modules), "
+             "file=sys.stderr)")
+    run = subprocess.run([sys.executable, '-c', probe], cwd=os.path.dirname(cli.__file__), capture_output=True,
+                         text=True, check=True)
+    assert run.stderr.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,55 @@
+"""The balance ledger keeps signed minutes through the store, the journal and the older {"h", "m"} form."""
+import json
+
+import pytest
+
+from journal import Journal
+from store import Store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return Store(str(tmp_path / "store.sqlite"))
+
+
+@pytest.mark.parametrize("minutes", [-90, -60, -30, 0, 30])
+def test_balance_round_trip(store, minutes):
+    store.set_balance(2, 2024, minutes)
+    assert store.load_balance() == {"2.2024": minutes}
+    store.save_balance(store.load_balance())
+    assert store.load_balance() == {"2.2024": minutes}
+
+
+def test_older_balances_in_hours_and_minutes(store):
+    store.save_balance({"1.2024": {"h": -1, "m": 30}, "2.2024": {"h": 0, "m": -30}, "3.2024": {"h": 2, "m": 15}})
+    assert store.load_balance() == {"1.2024": -90, "2.2024": -30, "3.2024": 135}
+
+
+def test_journal_replays_older_balance_entries(store, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text(json.dumps({"op": "set_balance", "args": [1, 2024, -1, 30]}) + "\n")
+    journal = Journal(str(path))
+    journal.append("set_balance", 2, 2024, -30)
+    assert journal.compact(store) == 2
+    journal.close()
+    assert store.load_balance() == {"1.2024": -90, "2.2024": -30}
+
+
+def test_entries_appended_while_compacting_are_kept(store, tmp_path):
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    journal.append("set_balance", 1, 2024, 30)
+    save_usuals = store.save_usuals
+
+    def append_meanwhile(usuals):
+        # an edit on the GUI thread while another thread compacts
+        journal.append("set_balance", 2, 2024, -30)
+        save_usuals(usuals)
+
+    store.save_usuals = append_meanwhile
+    journal.append("save_usuals", {})
+    assert journal.compact(store) == 2
+    assert [entry["args"] for entry in journal.entries()] == [[2, 2024, -30]]
+    store.save_usuals = save_usuals
+    assert journal.compact(store) == 1
+    journal.close()
+    assert store.load_balance() == {"1.2024": 30, "2.2024": -30}
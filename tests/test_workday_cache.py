@@ -0,0 +1,25 @@
+"""A cache hit only moves the entry in memory, the order of use reaches the file with the next put or on close."""
+import os
+
+from workday_cache import WorkdayCache
+
+WORKING_DAYS = [{'dayOfMonth': 1, 'dayOfWeek': "Monday"}]
+
+
+def test_hits_are_saved_on_close(tmp_path):
+    template = tmp_path / "template.xlsx"
+    template.write_text("template")
+    path = str(tmp_path / "cache.json")
+    cache = WorkdayCache(path, max_entries=2)
+    cache.put(template, 1, 2024, WORKING_DAYS)
+    cache.put(template, 2, 2024, WORKING_DAYS)
+    saved = os.stat(path).st_mtime_ns
+
+    assert cache.get(template, 1, 2024) == WORKING_DAYS
+    assert os.stat(path).st_mtime_ns == saved
+    cache.close()
+    # January was used last, February goes first
+    reopened = WorkdayCache(path, max_entries=2)
+    reopened.put(template, 3, 2024, WORKING_DAYS)
+    assert reopened.get(template, 1, 2024) == WORKING_DAYS
+    assert reopened.get(template, 2, 2024) is None
@@ -0,0 +1,49 @@
+"""Running totals of the planned worktimes of a month by day, ISO week, worktype and for the whole month.
+
+Every day contributes its minutes per worktype. Replacing the contribution of a day updates the totals by the
+difference only, so an edit costs the same however many days and entries the month has.
+"""
+from collections import Counter
+from datetime import date
+
+
+class MonthTotals:
+    def __init__(self, month, year):
+        self.month = month
+        self.year = year
+        self._days = dict()  # day of month -> Counter of minutes per worktype index
+        self._by_week = Counter()  # (ISO year, ISO week) -> minutes
+        self._by_type = Counter()  # worktype index -> minutes
+        self._total = 0
+
+    def set_day(self, day_of_month, minutes_by_type):
+        """Replace the minutes per worktype index a day contributes."""
+        old = self._days.get(day_of_month, Counter())
+        new = Counter(minutes_by_type)
+        delta = sum(new.values()) - sum(old.values())
+        self._by_type.subtract(old)
+        self._by_type.update(new)
+        self._by_week[self.week_of(day_of_month)] += delta
+        self._total += delta
+        self._days[day_of_month] = new
+
+    def week_of(self, day_of_month):
+        return date(self.year, self.month, day_of_month).isocalendar()[:2]
+
+    def day(self, day_of_month):
+        return sum(self._days.get(day_of_month, Counter()).values())
+
+    def week(self, iso_week):
+        """Minutes of the days of the month in an (ISO year, ISO week)."""
+        return self._by_week[iso_week]
+
+    def weeks(self):
+        """(ISO week, minutes) of the weeks of the month in order."""
+        return sorted(self._by_week.items())
+
+    def by_type(self, work_type):
+        return self._by_type[work_type]
+
+    @property
+    def total(self):
+        return self._total
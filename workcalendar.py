@@ -0,0 +1,116 @@
+"""Working days of any month computed from holiday rules, without opening the template.
+
+A day is a working day unless it is on a weekend, a public holiday or a company closure. Holidays are given by
+rules: fixed dates (month, day, name), dates relative to Easter Sunday (offset in days, name) and closures
+(first ISO date, last ISO date, name). The rules of a region in REGIONS can be extended by a holidays.json in the
+config dir with the same keys. Every year is computed once and kept.
+"""
+import json
+from calendar import monthrange
+from datetime import date, timedelta
+
+from generator import WEEKDAYS
+
+HOLIDAYS_FILENAME = 'holidays.json'
+
+# Public holidays per region, "none" has weekends only
+REGIONS = {
+    "none": {},
+    "at": {
+        "fixed": [(1, 1, "New Year's Day"), (1, 6, "Epiphany"), (5, 1, "Labour Day"), (8, 15, "Assumption Day"),
+                  (10, 26, "National Day"), (11, 1, "All Saints' Day"), (12, 8, "Immaculate Conception"),
+                  (12, 25, "Christmas Day"), (12, 26, "St. Stephen's Day")],
+        "easter": [(1, "Easter Monday"), (39, "Ascension Day"), (50, "Whit Monday"), (60, "Corpus Christi")],
+    },
+    "de": {
+        "fixed": [(1, 1, "New Year's Day"), (5, 1, "Labour Day"), (10, 3, "German Unity Day"),
+                  (12, 25, "Christmas Day"), (12, 26, "Second Day of Christmas")],
+        "easter": [(-2, "Good Friday"), (1, "Easter Monday"), (39, "Ascension Day"), (50, "Whit Monday")],
+    },
+    "ch": {
+        "fixed": [(1, 1, "New Year's Day"), (8, 1, "National Day"), (12, 25, "Christmas Day"),
+                  (12, 26, "St. Stephen's Day")],
+        "easter": [(-2, "Good Friday"), (1, "Easter Monday"), (39, "Ascension Day"), (50, "Whit Monday")],
+    },
+}
+
+
+def easter_sunday(year):
+    """Easter Sunday of the Gregorian calendar (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def load_rules(region, path=None):
+    """Rules of a region extended by the ones of a holidays.json, a missing file adds nothing."""
+    if region not in REGIONS:
+        raise ValueError(f"Unknown holiday region '{region}', choose one of: {', '.join(REGIONS)}")
+    rules = {key: list(REGIONS[region].get(key, [])) for key in ("fixed", "easter", "closures")}
+    if path is not None:
+        try:
+            with open(path, 'r') as f:
+                extra = json.load(f)
+        except FileNotFoundError:
+            extra = dict()
+        for key in rules:
+            rules[key].extend(tuple(rule) for rule in extra.get(key, []))
+    return rules
+
+
+class WorkCalendar:
+    """Holidays and working days per year, a year is computed as a whole when one of its months is asked for."""
+
+    def __init__(self, rules=None):
+        self.rules = rules or dict()
+        self._holidays = dict()  # year -> {date: holiday name}
+        self._working_days = dict()  # (month, year) -> working days
+
+    def holidays(self, year):
+        """Holidays and closures of a year by date."""
+        holidays = self._holidays.get(year)
+        if holidays is None:
+            holidays = dict()
+            for month, day, name in self.rules.get("fixed", []):
+                holidays[date(year, month, day)] = name
+            easter = easter_sunday(year)
+            for offset, name in self.rules.get("easter", []):
+                holidays[easter + timedelta(days=offset)] = name
+            for first, last, name in self.rules.get("closures", []):
+                day = max(date.fromisoformat(first), date(year, 1, 1))
+                last = min(date.fromisoformat(last), date(year, 12, 31))
+                while day <= last:
+                    holidays.setdefault(day, name)
+                    day += timedelta(days=1)
+            self._holidays[year] = holidays
+        return holidays
+
+    def working_days(self, month, year):
+        """Working days of a month like parse_working_days reads them from the template, not to be modified."""
+        if (month, year) not in self._working_days:
+            holidays = self.holidays(year)
+            for m in range(1, 13):
+                working_days = []
+                for day_of_month in range(1, monthrange(year, m)[1] + 1):
+                    day = date(year, m, day_of_month)
+                    if day.weekday() < len(WEEKDAYS) and day not in holidays:
+                        working_days.append({"dayOfMonth": day_of_month, "dayOfWeek": WEEKDAYS[day.weekday()]})
+                self._working_days[(m, year)] = working_days
+        return self._working_days[(month, year)]
+
+
+def compare_working_days(calendar_days, template_days):
+    """Describe where the calendar differs from the template, an empty list when they agree."""
+    calendar_set = {(d["dayOfMonth"], d["dayOfWeek"]) for d in calendar_days}
+    template_set = {(d["dayOfMonth"], d["dayOfWeek"]) for d in template_days}
+    differences = [(day, weekday, "template") for day, weekday in template_set - calendar_set]
+    differences += [(day, weekday, "calendar") for day, weekday in calendar_set - template_set]
+    return [f"{day} ({weekday}) is a working day in the {source} only" for day, weekday, source in sorted(differences)]
@@ -0,0 +1,74 @@
+import os
+import json
+from collections import OrderedDict
+
+
+class WorkdayCache:
+    """Working days parsed from the template, stored on disk per template file and target month.
+
+    Entries are keyed by the template fingerprint (path, size, mtime), so they go stale as soon as the template
+    changes. The least recently used entries are evicted once more than max_entries are stored. The order of use is
+    kept in memory and written with the next put or by close.
+    """
+
+    def __init__(self, path, max_entries=120):
+        self._path = path
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        # the order of use changed since the last save
+        self._dirty = False
+        self.load()
+
+    @staticmethod
+    def fingerprint(template_file):
+        stat = os.stat(template_file)
+        return f"{os.path.abspath(template_file)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    @staticmethod
+    def key(fingerprint, month, year):
+        return f"{fingerprint}|{month}.{year}"
+
+    def load(self):
+        try:
+            with open(self._path, 'r') as f:
+                self._entries = OrderedDict(json.load(f))
+        except Exception:
+            self._entries = OrderedDict()
+
+    def save(self):
+        # write to a temporary file first, a crash while writing must not leave a truncated cache behind
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(list(self._entries.items()), f)
+        os.replace(tmp_path, self._path)
+        self._dirty = False
+
+    def get(self, template_file, month, year):
+        key = self.key(self.fingerprint(template_file), month, year)
+        working_days = self._entries.get(key)
+        if working_days is not None:
+            self._entries.move_to_end(key)
+            self._dirty = True
+        return working_days
+
+    def put(self, template_file, month, year, working_days):
+        fingerprint = self.fingerprint(template_file)
+        # drop everything parsed from an older version of the same template
+        path = fingerprint.rsplit('|', 2)[0]
+        for key in [k for k in self._entries if k.startswith(f"{path}|") and not k.startswith(f"{fingerprint}|")]:
+            del self._entries[key]
+        key = self.key(fingerprint, month, year)
+        self._entries[key] = working_days
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        self.save()
+
+    def close(self):
+        """Save the order of use if a get changed it."""
+        if self._dirty:
+            self.save()
+
+    def clear(self):
+        self._entries.clear()
+        self.save()